@@ -0,0 +1,136 @@
+#!/usr/bin/env python2
+"""Benchmark FITS characterization: a command per file vs. a FITS server.
+
+Writes a corpus of small files (text, CSV, XML, HTML, PNG and PDF, like the
+ordinary documents and images of a typical transfer) and times:
+
+  * command: running FITS for each file, as characterize_file does without a
+    FITS server.  A JVM per file is slow, so only a sample of the corpus is
+    run and the time for the whole corpus extrapolated from it;
+  * server: asking a FITS server (see fits_server) to examine every file, from
+    as many processes as characterize_file would run with
+    `fits_server_connections` set to --connections.
+
+The FITS server must see the corpus at the same paths; use --corpus to put it
+in a directory they share.
+
+Usage:
+
+    DJANGO_SETTINGS_MODULE=settings.test \\
+    PYTHONPATH=src/MCPClient/lib:src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/MCPClient/benchmarks/bench_characterization.py \\
+            --files 10000 --connections 4 --server-url http://localhost:8080/fits/
+"""
+
+from __future__ import print_function
+
+import argparse
+import base64
+import multiprocessing
+import os
+import shlex
+import shutil
+import tempfile
+import time
+
+import django
+django.setup()
+from django.conf import settings
+
+from executeOrRunSubProcess import executeOrRun
+import fits_server
+
+# A 1x1 PNG
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+PDF = (b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+       b'2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n'
+       b'3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj\n'
+       b'trailer << /Root 1 0 R >>\n%%EOF\n')
+
+CONTENTS = (
+    ('txt', lambda i: b'Document %d\n' % i * 20),
+    ('csv', lambda i: b'id,name\n' + b''.join(b'%d,row %d\n' % (i, row) for row in range(20))),
+    ('xml', lambda i: b'<?xml version="1.0"?><document id="%d"><title>Document</title></document>' % i),
+    ('html', lambda i: b'<!DOCTYPE html><html><head><title>%d</title></head><body></body></html>' % i),
+    ('png', lambda i: PNG),
+    ('pdf', lambda i: PDF),
+)
+
+
+def make_corpus(directory, count):
+    paths = []
+    for i in range(count):
+        extension, content = CONTENTS[i % len(CONTENTS)]
+        path = os.path.join(directory, 'file-%05d.%s' % (i, extension))
+        with open(path, 'wb') as file_:
+            file_.write(content(i))
+        paths.append(path)
+    return paths
+
+
+def run_command(command, path):
+    exitcode, _, _ = executeOrRun('command', shlex.split(command) + [path], printing=False, capture_output=True)
+    return exitcode == 0
+
+
+class _Command(object):
+    # A picklable run_command for the pool
+
+    def __init__(self, command):
+        self.command = command
+
+    def __call__(self, path):
+        return run_command(self.command, path)
+
+
+def examine(path):
+    try:
+        fits_server.examine(path)
+    except fits_server.FITSServerError:
+        return False
+    return True
+
+
+def timed(fn, paths, processes):
+    """Seconds to run `fn` on each of `paths` in `processes` processes, and how many succeeded."""
+    pool = multiprocessing.Pool(processes)
+    try:
+        started = time.time()
+        succeeded = sum(pool.map(fn, paths, chunksize=max(1, len(paths) // (processes * 16))))
+        return time.time() - started, succeeded
+    finally:
+        pool.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=10000)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--server-url', required=True)
+    parser.add_argument('--command', default='fits.sh -i', help='FITS command, run with each file appended')
+    parser.add_argument('--command-sample', type=int, default=100, help='files to run the command on')
+    parser.add_argument('--corpus', help='directory to write the corpus in (default: a temporary one)')
+    args = parser.parse_args()
+
+    settings.FITS_SERVER_URL = args.server_url
+    directory = tempfile.mkdtemp(dir=args.corpus)
+    try:
+        paths = make_corpus(directory, args.files)
+        sample = paths[:args.command_sample]
+        processes = multiprocessing.cpu_count()
+
+        print('%d files; command on %d of them in %d processes; server with %d connections' % (
+            len(paths), len(sample), processes, args.connections))
+        print('%-10s %10s %10s %16s' % ('mode', 'files', 'ok', 'seconds (all)'))
+        seconds, succeeded = timed(_Command(args.command), sample, processes)
+        print('%-10s %10d %10d %16.1f' % ('command', len(sample), succeeded, seconds * len(paths) / len(sample)))
+        seconds, succeeded = timed(examine, paths, args.connections)
+        print('%-10s %10d %10d %16.1f' % ('server', len(paths), succeeded, seconds))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
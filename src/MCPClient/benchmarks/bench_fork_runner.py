@@ -0,0 +1,105 @@
+#!/usr/bin/env python2
+"""Benchmark fork_runner load balancing on a batch of skewed job sizes.
+
+Runs a throwaway client script whose jobs sleep in proportion to the "size" of
+their file, with sizes drawn from a Pareto distribution (a few huge files and
+lots of small ones, like a typical transfer).  The same batch is run with:
+
+  * static: one chunk of consecutive jobs per worker, as fork_runner used to
+    split batches;
+  * dynamic: smaller chunks, balanced by job size and handed to whichever
+    worker is free, biggest first.
+
+Usage:
+
+    DJANGO_SETTINGS_MODULE=settings.test \\
+    PYTHONPATH=src/MCPClient/lib:src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/MCPClient/benchmarks/bench_fork_runner.py --jobs 128 --workers 4
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import django
+django.setup()
+
+import fork_runner
+from job import Job
+
+
+BENCH_MODULE = 'bench_fork_runner_script'
+
+BENCH_MODULE_SOURCE = '''
+import time
+
+
+def call(jobs):
+    for job in jobs:
+        time.sleep(float(job.args[1]))
+        job.set_status(0)
+'''
+
+
+def make_jobs(count, alpha, seconds_per_unit, seed):
+    rng = random.Random(seed)
+    return [Job(BENCH_MODULE, str(uuid.uuid4()),
+                [str(rng.paretovariate(alpha) * seconds_per_unit)])
+            for _ in range(count)]
+
+
+def job_size(job):
+    return float(job.args[1])
+
+
+def timed_call(jobs, workers, chunks_per_worker, size_fn):
+    fork_runner.CHUNKS_PER_WORKER = chunks_per_worker
+    started = time.time()
+    fork_runner.call(BENCH_MODULE, jobs, task_count=workers, job_size=size_fn)
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--alpha', type=float, default=1.2,
+                        help='Pareto shape; smaller is more skewed')
+    parser.add_argument('--seconds-per-unit', type=float, default=0.01,
+                        help='how long the smallest job takes')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    module_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(module_dir, BENCH_MODULE + '.py'), 'w') as f:
+            f.write(BENCH_MODULE_SOURCE)
+        # Our workers are started with our sys.path
+        sys.path.insert(0, module_dir)
+
+        total = sum(job_size(job) for job in make_jobs(args.jobs, args.alpha, args.seconds_per_unit, args.seed))
+        print('%d jobs, %d workers; %.2fs of work (ideal %.2fs)' % (
+            args.jobs, args.workers, total, total / args.workers))
+
+        # Warm the pool up so neither run pays for starting workers
+        timed_call(make_jobs(args.workers, args.alpha, 0, args.seed), args.workers, 1, None)
+
+        print('%-10s %10s %12s' % ('mode', 'seconds', 'efficiency'))
+        for mode, chunks_per_worker, size_fn in [('static', 1, None),
+                                                 ('dynamic', fork_runner.CHUNKS_PER_WORKER, job_size)]:
+            jobs = make_jobs(args.jobs, args.alpha, args.seconds_per_unit, args.seed)
+            elapsed = timed_call(jobs, args.workers, chunks_per_worker, size_fn)
+            print('%-10s %10.2f %11.0f%%' % (mode, elapsed, 100 * total / (args.workers * elapsed)))
+    finally:
+        shutil.rmtree(module_dir)
+
+
+if __name__ == '__main__':
+    main()
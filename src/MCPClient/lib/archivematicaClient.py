@@ -21,10 +21,20 @@ MCP Server side.  These jobs are sent in batches to the `call()` function of the
 Python module configured to handle the registered task type.
 
 The Python modules doing the work receive the list of jobs and set an exit code,
-standard out and standard error for each job.  Only one set of jobs executes at
-a time, so each Python module is free to assume it has the whole machine at its
-disposal, giving it the option of running subprocesses or multiple threads if
-desired.
+standard out and standard error for each job.
+
+Several sets of jobs can execute at once, one in each of the client's batch
+slots.  Every slot is a thread with its own Gearman worker.  Slots come in two
+classes: "cpu" slots run the commands that keep the machine busy (normalization,
+characterization, virus scanning...), and "io" slots run everything else (moving
+files around, talking to the database or the Storage Service).  Cheap tasks
+therefore don't queue behind a long normalization batch.  How many slots of each
+class we run comes from the ``CONCURRENT_CPU_BATCHES`` and
+``CONCURRENT_IO_BATCHES`` settings.  The modules config file says which class
+each command belongs to and, optionally, how many batches of it may run at
+once.  A command limited to N batches is only registered by the first N slots of
+its class, so Gearman never hands us more than that.  Every batch runs in
+worker processes of its own (see fork_runner), never in the slot's thread.
 
 When a set of jobs is complete, the standard output and error of each is written
 back to the database.  The exit code of each job is returned to Gearman and
@@ -54,11 +64,11 @@ task to run next).
 # @author Joseph Perry <joseph@artefactual.com>
 
 import ConfigParser
-import cPickle
 from functools import partial
 import logging
 import os
 from socket import gethostname
+import threading
 import time
 
 import django
@@ -67,13 +77,14 @@ from django.conf import settings as django_settings
 import gearman
 
 from main.models import Task
-from databaseFunctions import getUTCDate, retryOnFailure
+from databaseFunctions import getUTCDate, logTaskResultsSQL, retryOnFailure
 
 from django.db import transaction
 from django.utils import six
 import shlex
 import importlib
 
+import batch_payload
 from databaseFunctions import auto_close_db
 import fork_runner
 from job import Job
@@ -87,6 +98,11 @@ replacement_dict = {
 }
 
 
+# Slot classes: which slots run a command (see the module docstring).
+CPU_SLOT = 'cpu'
+IO_SLOT = 'io'
+
+
 def get_supported_modules(file_):
     """Create and return the ``supported_modules`` dict by parsing the MCPClient
     modules config file (typically MCPClient/lib/archivematicaClientModules).
@@ -99,15 +115,47 @@ def get_supported_modules(file_):
     return supported_modules
 
 
+def get_batch_slots(file_, supported_modules, cpu_slots, io_slots):
+    """Work out which client scripts each of our batch slots will register.
+
+    Reads the slot class (``batchCommandClasses`` section, defaulting to
+    "io") and concurrency limit (``batchCommandLimits`` section, defaulting to
+    no limit) of each command from the MCPClient modules config file.  Returns
+    a list with a ``(slot_name, client_scripts)`` tuple per slot.  Raises
+    ValueError if either number of slots is less than 1.
+    """
+    config = ConfigParser.RawConfigParser()
+    config.read(file_)
+
+    def section(name):
+        if not config.has_section(name):
+            return {}
+        return dict(config.items(name))
+
+    classes = section('batchCommandClasses')
+    limits = section('batchCommandLimits')
+
+    slots = []
+    for slot_class, slot_count in ((CPU_SLOT, cpu_slots), (IO_SLOT, io_slots)):
+        if slot_count < 1:
+            raise ValueError('The number of concurrent {} batches must be at least 1, not {}'.format(slot_class, slot_count))
+        for index in range(slot_count):
+            client_scripts = [client_script for client_script in supported_modules
+                              if classes.get(client_script, IO_SLOT) == slot_class and
+                              (client_script not in limits or index < int(limits[client_script]))]
+            if client_scripts:
+                slots.append(('{}{}'.format(slot_class, index), client_scripts))
+    return slots
+
+
 @auto_close_db
-def handle_batch_task(gearman_job, supported_modules):
+def handle_batch_task(gearman_job, tasks, supported_modules):
     module_name = supported_modules.get(gearman_job.task)
-    gearman_data = cPickle.loads(gearman_job.data)
 
     utc_date = getUTCDate()
     jobs = []
-    for task_uuid in gearman_data['tasks']:
-        task_data = gearman_data['tasks'][task_uuid]
+    for task_data in tasks:
+        task_uuid = task_data['uuid']
         arguments = task_data['arguments']
         if isinstance(arguments, six.text_type):
             arguments = arguments.encode('utf-8')
@@ -123,7 +171,9 @@ def handle_batch_task(gearman_job, supported_modules):
         job = Job(gearman_job.task,
                   task_data['uuid'],
                   _parse_command_line(arguments),
-                  caller_wants_output=task_data['wants_output'])
+                  caller_wants_output=task_data['wants_output'],
+                  output_memory_limit=django_settings.CLIENT_SCRIPT_OUTPUT_MEMORY_LIMIT,
+                  output_directory=os.path.join(django_settings.TEMP_DIRECTORY, 'clientScriptOutput'))
         jobs.append(job)
 
     # Set their start times.  If we collide with the MCP Server inserting new
@@ -136,11 +186,23 @@ def handle_batch_task(gearman_job, supported_modules):
 
     module = importlib.import_module("clientScripts." + module_name)
 
-    # Our module can indicate that it should be run concurrently...
-    if hasattr(module, 'concurrent_instances'):
-        fork_runner.call("clientScripts." + module_name, jobs, task_count=module.concurrent_instances())
-    else:
-        module.call(jobs)
+    # Our module can indicate that it should be run concurrently (and how big
+    # each job is, so the biggest can be started first)...  Other modules get
+    # a single worker process.  They can't run in this process: our batch
+    # slots are threads, and client scripts change the working directory and
+    # attach log handlers to module-level loggers, so two batches running
+    # side by side here would trip over each other.
+    try:
+        if hasattr(module, 'concurrent_instances'):
+            fork_runner.call("clientScripts." + module_name, jobs,
+                             task_count=module.concurrent_instances(),
+                             job_size=getattr(module, 'job_size', None))
+        else:
+            fork_runner.call("clientScripts." + module_name, jobs, task_count=1)
+    except Exception:
+        for job in jobs:
+            job.discard_output()
+        raise
 
     return jobs
 
@@ -157,7 +219,8 @@ def _shlex_unescape(s):
 
 
 def fail_all_tasks(gearman_job, reason):
-    gearman_data = cPickle.loads(gearman_job.data)
+    version, tasks = batch_payload.decode_batch(gearman_job.data)
+    task_uuids = [task['uuid'] for task in tasks]
 
     result = {}
 
@@ -166,79 +229,95 @@ def fail_all_tasks(gearman_job, reason):
     # work...
     try:
         def fail_all_tasks_callback():
-            for task_uuid in gearman_data['tasks']:
-                Task.objects.filter(taskuuid=task_uuid).update(stderror=str(reason),
-                                                               exitcode=1,
-                                                               endtime=getUTCDate())
+            logTaskResultsSQL([(task_uuid, 1, None, str(reason))
+                               for task_uuid in task_uuids])
 
-            retryOnFailure("Fail all tasks", fail_all_tasks_callback)
+        retryOnFailure("Fail all tasks", fail_all_tasks_callback)
 
     except Exception as e:
         logger.exception("Failed to update tasks in DB: %s", e)
 
     # But we can at least send an exit code back to Gearman
-    for task_uuid in gearman_data['tasks']:
+    for task_uuid in task_uuids:
         result[task_uuid] = {'exitCode': 1}
 
-    return cPickle.dumps({'task_results': result})
+    return batch_payload.encode_results(result, django_settings.SHARED_DIRECTORY, version)
 
 
 @auto_close_db
 def execute_command(supported_modules, gearman_worker, gearman_job):
     """Execute the command encoded in ``gearman_job`` and return its exit code,
-    standard output and standard error as a pickled dict.
+    standard output and standard error, encoded by batch_payload in the
+    version the job was sent in.
     """
     logger.info("\n\n*** RUNNING TASK: %s", gearman_job.task)
 
+    jobs = []
     try:
-        jobs = handle_batch_task(gearman_job, supported_modules)
+        version, tasks = batch_payload.decode_batch(gearman_job.data)
+        jobs = handle_batch_task(gearman_job, tasks, supported_modules)
         results = {}
 
+        # Output too long to record in full stays on disk, and what we record
+        # points to it
+        for job in jobs:
+            job.keep_output(os.path.join(django_settings.SHARED_DIRECTORY, 'clientScriptOutput'))
+
+        for job in jobs:
+            logger.info("\n\n*** Completed job: %s", job.dump())
+
+            results[job.UUID] = {'exitCode': job.get_exit_code()}
+
+            if job.caller_wants_output:
+                # Send back all of stdout/stderr so it can be written to files.
+                # Most cases don't require this (logging to the database is
+                # enough), but the ones that do are coordinated through the
+                # MCP Server so that multiple MCP Client instances don't try
+                # to write the same file at the same time.
+                results[job.UUID]['stdout'] = job.get_full_stdout()
+                results[job.UUID]['stderror'] = job.get_full_stderr()
+
+        # Write every job's results back in a handful of statements, rather
+        # than one UPDATE per job.
+        if django_settings.CAPTURE_CLIENT_SCRIPT_OUTPUT:
+            task_results = [(job.UUID, job.get_exit_code(), job.get_stdout(), job.get_stderr())
+                            for job in jobs]
+        else:
+            task_results = [(job.UUID, job.get_exit_code(), None, None)
+                            for job in jobs]
+
         def write_task_results_callback():
             with transaction.atomic():
-                for job in jobs:
-                    logger.info("\n\n*** Completed job: %s", job.dump())
-
-                    kwargs = {
-                        'exitcode': job.get_exit_code(),
-                        'endtime': getUTCDate(),
-                    }
-                    if django_settings.CAPTURE_CLIENT_SCRIPT_OUTPUT:
-                        kwargs.update({
-                            'stdout': job.get_stdout(),
-                            'stderror': job.get_stderr(),
-                        })
-                    Task.objects.filter(taskuuid=job.UUID).update(**kwargs)
-
-                    results[job.UUID] = {'exitCode': job.get_exit_code()}
-
-                    if job.caller_wants_output:
-                        # Send back stdout/stderr so it can be written to files.
-                        # Most cases don't require this (logging to the database is
-                        # enough), but the ones that do are coordinated through the
-                        # MCP Server so that multiple MCP Client instances don't try
-                        # to write the same file at the same time.
-                        results[job.UUID]['stdout'] = job.get_stdout()
-                        results[job.UUID]['stderror'] = job.get_stderr()
+                logTaskResultsSQL(task_results)
 
         retryOnFailure("Write task results", write_task_results_callback)
 
-        return cPickle.dumps({'task_results': results})
-    except SystemExit:
+        return batch_payload.encode_results(results, django_settings.SHARED_DIRECTORY, version)
+    except fork_runner.ModuleExited:
         logger.error("IMPORTANT: Task %s attempted to call exit()/quit()/sys.exit(). This module should be fixed!", gearman_job.task)
+        for job in jobs:
+            job.discard_output()
         return fail_all_tasks(gearman_job, "Module attempted exit")
     except Exception as e:
         logger.exception("Exception while processing task %s: %s", gearman_job.task, e)
+        for job in jobs:
+            job.discard_output()
         return fail_all_tasks(gearman_job, e)
 
 
-def start_gearman_worker(supported_modules):
-    """Setup a gearman client, for the thread."""
+def start_gearman_worker(supported_modules, client_scripts=None, slot_name=None):
+    """Setup a gearman client, for the thread.
+
+    The worker registers ``client_scripts`` (all of ``supported_modules`` by
+    default) and runs one batch of jobs at a time.
+    """
     gm_worker = gearman.GearmanWorker([django_settings.GEARMAN_SERVER])
     host_id = '{}_{}'.format(gethostname(), os.getpid())
+    if slot_name is not None:
+        host_id = '{}_{}'.format(host_id, slot_name)
     gm_worker.set_client_id(host_id)
     task_handler = partial(execute_command, supported_modules)
-    for client_script in supported_modules:
+    for client_script in client_scripts or supported_modules:
         logger.info('Registering: %s', client_script)
         gm_worker.register_task(client_script, task_handler)
     fail_max_sleep = 30
@@ -264,9 +343,32 @@ def start_gearman_worker(supported_modules):
                 fail_sleep += fail_sleep_incrementor
 
 
+def start_batch_slots(supported_modules, slots):
+    """Run a Gearman worker thread for each of our batch ``slots``."""
+    threads = []
+    for slot_name, client_scripts in slots:
+        logger.info('Starting batch slot %s', slot_name)
+        thread = threading.Thread(target=start_gearman_worker,
+                                  args=(supported_modules, client_scripts, slot_name),
+                                  name='slot-{}'.format(slot_name))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    # Join with a timeout so we still get KeyboardInterrupt
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(1)
+
+
 if __name__ == '__main__':
     try:
-        start_gearman_worker(
-            get_supported_modules(django_settings.CLIENT_MODULES_FILE))
+        supported_modules = get_supported_modules(django_settings.CLIENT_MODULES_FILE)
+        start_batch_slots(
+            supported_modules,
+            get_batch_slots(django_settings.CLIENT_MODULES_FILE,
+                            supported_modules,
+                            django_settings.CONCURRENT_CPU_BATCHES,
+                            django_settings.CONCURRENT_IO_BATCHES))
     except (KeyboardInterrupt, SystemExit):
         logger.info('Received keyboard interrupt, quitting.')
@@ -27,9 +27,6 @@ import sys
 import uuid
 import lxml.etree as etree
 
-# dashboard
-from main.models import RightsStatement
-
 # archivematicaCommon
 from countryCodes import getCodeForCountry
 import namespaces as ns
@@ -48,10 +45,7 @@ def archivematicaGetRights(job, metadataAppliesToList, fileUUID, state):
     """[(fileUUID, fileUUIDTYPE), (sipUUID, sipUUIDTYPE), (transferUUID, transferUUIDType)]"""
     ret = []
     for metadataAppliesToidentifier, metadataAppliesToType in metadataAppliesToList:
-        statements = RightsStatement.objects.filter(
-            metadataappliestoidentifier=metadataAppliesToidentifier,
-            metadataappliestotype_id=metadataAppliesToType
-        )
+        statements = state.file_metadata.rights_statements(metadataAppliesToidentifier, metadataAppliesToType)
         for statement in statements:
             rightsStatement = createRightsStatement(job, statement, fileUUID, state)
             ret.append(rightsStatement)
@@ -22,7 +22,9 @@ import argparse
 import os
 import re
 import multiprocessing
+from multiprocessing.pool import ThreadPool
 import subprocess
+import threading
 import uuid
 import errno
 
@@ -34,15 +36,25 @@ from django.conf import settings as mcpclient_settings
 from clamd import ClamdUnixSocket, ClamdNetworkSocket, BufferTooLongError, ConnectionError
 from custom_handlers import get_script_logger
 from databaseFunctions import insertIntoEvents
+import fswalk
 from main.models import Event, File
 
 logger = get_script_logger("archivematica.mcp.client.clamscan")
 
 
 def concurrent_instances():
+    # When the files of a batch are scanned together, one instance gets the
+    # whole batch, and the scans run in parallel from there
+    if mcpclient_settings.CLAMAV_CLIENT_MULTISCAN:
+        return 1
     return multiprocessing.cpu_count()
 
 
+def job_size(job):
+    """Size of the file to scan, so the biggest can be started first."""
+    return os.path.getsize(job.args[2])
+
+
 def clamav_version_parts(ver):
     """Both clamscan and clamd return a version string that looks like the
     following::
@@ -99,6 +111,10 @@ class ScannerBase(object):
 class ClamdScanner(ScannerBase):
     PROGRAM = "ClamAV (clamd)"
 
+    # clamd's default MaxDirectoryRecursion; MULTISCAN silently skips the
+    # files in directories nested deeper than it
+    MAX_DIRECTORY_RECURSION = 15
+
     def __init__(self):
         self.addr = mcpclient_settings.CLAMAV_SERVER
         self.timeout = mcpclient_settings.CLAMAV_CLIENT_TIMEOUT
@@ -176,6 +192,46 @@ class ClamdScanner(ScannerBase):
         logger.info("File contents being streamed to Clamdscan.")
         return self.client.instream(open(path))
 
+    def scan_directory(self, path, files):
+        """Scan the directory at `path` with MULTISCAN, which clamd works
+        through with several threads, and return the results for `files`, the
+        files under it, as a dict of the tuples `scan` returns.
+
+        clamd only reports the files with a virus or an error, and says
+        nothing of the files it skips: symlinks, and files in directories
+        nested deeper than MAX_DIRECTORY_RECURSION.  So only the other files
+        that aren't reported have passed; the skipped ones are left out, to be
+        scanned one at a time.  Files clamd's ExcludePath matches can't be
+        told apart, so MULTISCAN must not be used with it.  If the directory
+        can't be scanned, an empty dict is returned.
+        """
+        logger.info("Directory %s being scanned by Clamdscan with MULTISCAN.", path)
+        try:
+            results = self.client.multiscan(path)
+        except Exception as err:
+            logger.warning('Unable to scan directory %s: %s', path, err)
+            return {}
+        if results.get(path, ('OK', None))[0] != 'OK':
+            logger.warning('Unable to scan directory %s: %s', path, results[path])
+            return {}
+        real_path = os.path.realpath(path)
+        scanned = {}
+        for file_path in files:
+            if file_path in results:
+                state, details = results[file_path]
+                scanned[file_path] = (state == 'OK', state, details)
+                continue
+            relative_path = os.path.relpath(file_path, path)
+            # Erring on the shallow side, in case clamd counts the top
+            # directory as a level
+            if relative_path.count(os.sep) >= self.MAX_DIRECTORY_RECURSION - 1:
+                continue
+            # Through a symlink, to the file or a directory on the way
+            if os.path.realpath(file_path) != os.path.join(real_path, relative_path):
+                continue
+            scanned[file_path] = (True, 'OK', None)
+        return scanned
+
 
 class ClamScanner(ScannerBase):
     PROGRAM = 'ClamAV (clamscan)'
@@ -301,7 +357,86 @@ def get_size(file_uuid, path):
         return None
 
 
-def scan_file(event_queue, file_uuid, path, date, task_uuid):
+def covered_directories(paths):
+    """The directories, none of them inside another, all of whose files are
+    among `paths` (normalized absolute paths)."""
+    paths = set(paths)
+    covered = []
+    # Sorted, so directories come before the directories inside them
+    for directory in sorted(set(os.path.dirname(path) for path in paths)):
+        if any(directory.startswith(parent + os.sep) for parent in covered):
+            continue
+        if all(entry.path in paths for entry in fswalk.iter_files(directory)):
+            covered.append(directory)
+    return covered
+
+
+def scan_batch(scanner, jobs):
+    """Scan the files of all the jobs together, and return the results by
+    path, as a dict of the tuples `scanner.scan` returns.
+
+    With clamd reading files by reference, each directory all of whose files
+    are in the batch is scanned with one MULTISCAN.  The other files are
+    scanned concurrently, each thread with its own scanner.  Files already
+    scanned, and files over the size limits, are left for `scan_file` to
+    skip.
+    """
+    parser = get_parser()
+    jobs_args = []
+    for job in jobs:
+        try:
+            jobs_args.append(parser.parse_args(job.args[1:]))
+        except SystemExit:
+            continue
+    already_scanned = set(Event.objects.filter(
+        file_uuid_id__in=[args.file_uuid for args in jobs_args if args.file_uuid != 'None'],
+        event_type='virus check').values_list('file_uuid_id', flat=True))
+    max_size = min(mcpclient_settings.CLAMAV_CLIENT_MAX_FILE_SIZE,
+                   mcpclient_settings.CLAMAV_CLIENT_MAX_SCAN_SIZE) * 1024 * 1024
+    paths = {}
+    for args in jobs_args:
+        if args.file_uuid in already_scanned:
+            continue
+        try:
+            if os.path.getsize(args.path) > max_size:
+                continue
+        except OSError:
+            continue
+        paths[os.path.normpath(args.path)] = args.path
+
+    results = {}
+    if isinstance(scanner, ClamdScanner) and not scanner.stream:
+        for directory in covered_directories(paths):
+            files = [path for path in paths if path.startswith(directory + os.sep)]
+            for path, result in scanner.scan_directory(directory, files).items():
+                results[paths[path]] = result
+
+    remaining = [path for path in paths.values() if path not in results]
+    if remaining:
+        # A clamd client keeps the socket of the command it's running, so
+        # each thread scans with a scanner of its own
+        local = threading.local()
+
+        def scan(path):
+            if not hasattr(local, 'scanner'):
+                local.scanner = type(scanner)()
+            return local.scanner.scan(path)
+
+        pool = ThreadPool(multiprocessing.cpu_count())
+        try:
+            results.update(zip(remaining, pool.map(scan, remaining)))
+        finally:
+            pool.terminate()
+    return results
+
+
+def scan_file(event_queue, file_uuid, path, date, task_uuid, shared_scanner=None, scanned=None):
+    """Scan the file at `path` and queue its event.
+
+    `shared_scanner` is the scanner shared by the jobs of a batch; one is
+    created if it isn't given.  `scanned` holds the results of `scan_batch`,
+    used instead of scanning the file again.
+    """
     if file_already_scanned(file_uuid):
         logger.info('Virus scan already performed, not running scan again')
         return 0
@@ -333,14 +468,17 @@ def scan_file(event_queue, file_uuid, path, date, task_uuid):
             valid_scan = False
 
         if valid_scan:
-            scanner = get_scanner()
+            scanner = shared_scanner or get_scanner()
             logger.info(
                 'Using scanner %s (%s - %s)',
                 scanner.program(),
                 scanner.version(),
                 scanner.virus_definitions())
 
-            passed, state, details = scanner.scan(path)
+            if scanned and path in scanned:
+                passed, state, details = scanned[path]
+            else:
+                passed, state, details = scanner.scan(path)
         else:
             passed, state, details = None, None, None
 
@@ -365,9 +503,19 @@ def scan_file(event_queue, file_uuid, path, date, task_uuid):
 def call(jobs):
     event_queue = []
 
+    # One scanner for the batch, so the version of ClamAV and its virus
+    # definitions are only looked up once
+    scanner = get_scanner()
+    scanned = None
+    if mcpclient_settings.CLAMAV_CLIENT_MULTISCAN:
+        try:
+            scanned = scan_batch(scanner, jobs)
+        except Exception:
+            logger.warning('Unable to scan the files of the batch together', exc_info=True)
+
     for job in jobs:
         with job.JobContext(logger=logger):
-            job.set_status(scan_file(event_queue, *job.args[1:]))
+            job.set_status(scan_file(event_queue, *job.args[1:], shared_scanner=scanner, scanned=scanned))
 
     with transaction.atomic():
         for e in event_queue:
@@ -6,9 +6,13 @@
 #
 # If a tool has no defined characterization commands, then the default
 # will be run instead (currently FITS).
+#
+# If a FITS server is configured, FITS commands are run by asking it to
+# examine the file instead, falling back to running the command if it can't.
 
 from lxml import etree
 import multiprocessing
+import os
 
 import django
 django.setup()
@@ -17,20 +21,38 @@ from django.conf import settings as mcpclient_settings
 
 # dashboard
 from main.models import FPCommandOutput
-from fpr.models import FPRule, FormatVersion
+from fpr.models import FormatVersion
 
 # archivematicaCommon
 from executeOrRunSubProcess import executeOrRun
 from databaseFunctions import insertIntoFPCommandOutput
 from dicts import replace_string_values, ReplacementDict
+import fits_server
+import fpr_cache
 
 from lib import setup_dicts
 
 
 def concurrent_instances():
+    # With a FITS server, each instance keeps a connection to it open
+    if fits_server.enabled():
+        return mcpclient_settings.FITS_SERVER_CONNECTIONS
     return multiprocessing.cpu_count()
 
 
+def job_size(job):
+    """Size of the file to characterize, so the biggest can be started first."""
+    return os.path.getsize(job.args[1])
+
+
+def uses_fits_server(rule):
+    """Whether to run `rule`'s command with the FITS server."""
+    return (fits_server.enabled() and
+            rule.command.tool.description.lower() == 'fits' and
+            rule.command.output_format is not None and
+            rule.command.output_format.pronom_id == 'fmt/101')
+
+
 def main(job, file_path, file_uuid, sip_uuid):
     setup_dicts(mcpclient_settings)
 
@@ -42,42 +64,49 @@ def main(job, file_path, file_uuid, sip_uuid):
         return 0
 
     try:
-        format = FormatVersion.active.get(fileformatversion__file_uuid=file_uuid)
+        format = fpr_cache.file_format_version(file_uuid)
     except FormatVersion.DoesNotExist:
         rules = format = None
 
     if format:
-        rules = FPRule.active.filter(format=format.uuid,
-                                     purpose='characterization')
+        rules = fpr_cache.rules('characterization', format.uuid)
 
     # Characterization always occurs - if nothing is specified, get one or more
     # defaults specified in the FPR.
     if not rules:
-        rules = FPRule.active.filter(purpose='default_characterization')
+        rules = fpr_cache.rules('default_characterization')
 
     for rule in rules:
-        if rule.command.script_type == 'bashScript' or rule.command.script_type == 'command':
-            args = []
-            command_to_execute = replace_string_values(rule.command.command,
-                                                       file_=file_uuid, sip=sip_uuid, type_='file')
-        else:
-            rd = ReplacementDict.frommodel(file_=file_uuid,
-                                           sip=sip_uuid, type_='file')
-            args = rd.to_gnu_options()
-            command_to_execute = rule.command.command
-
-        exitstatus, stdout, stderr = executeOrRun(rule.command.script_type,
-                                                  command_to_execute,
-                                                  arguments=args,
-                                                  capture_output=True)
-
-        job.write_output(stdout)
-        job.write_error(stderr)
-
-        if exitstatus != 0:
-            job.write_error('Command {} failed with exit status {}; stderr:'.format(rule.command.description, exitstatus))
-            failed = True
-            continue
+        stdout = None
+        if uses_fits_server(rule):
+            try:
+                stdout = fits_server.examine(file_path)
+            except fits_server.FITSServerError as err:
+                job.write_error('{}; running command {} instead'.format(err, rule.command.description))
+
+        if stdout is None:
+            if rule.command.script_type == 'bashScript' or rule.command.script_type == 'command':
+                args = []
+                command_to_execute = replace_string_values(rule.command.command,
+                                                           file_=file_uuid, sip=sip_uuid, type_='file')
+            else:
+                rd = ReplacementDict.frommodel(file_=file_uuid,
+                                               sip=sip_uuid, type_='file')
+                args = rd.to_gnu_options()
+                command_to_execute = rule.command.command
+
+            exitstatus, stdout, stderr = executeOrRun(rule.command.script_type,
+                                                      command_to_execute,
+                                                      arguments=args,
+                                                      capture_output=True)
+
+            job.write_output(stdout)
+            job.write_error(stderr)
+
+            if exitstatus != 0:
+                job.write_error('Command {} failed with exit status {}; stderr:'.format(rule.command.description, exitstatus))
+                failed = True
+                continue
         # fmt/101 is XML - we want to collect and package any XML output, while
         # allowing other commands to execute without actually collecting their
         # output in the event that they are writing their output to disk.
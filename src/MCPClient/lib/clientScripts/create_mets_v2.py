@@ -37,8 +37,10 @@ from uuid import uuid4
 import django
 django.setup()
 # dashboard
+from django.db.models import Q
 from django.utils import timezone
-from main.models import Agent, Derivation, Directory, DublinCore, Event, File, FileID, FPCommandOutput, SIP, SIPArrange
+from main.models import (Agent, Derivation, Directory, DublinCore, Event, File, FileID, FPCommandOutput, RightsStatement, SIP,
+                         SIPArrange)
 
 import archivematicaCreateMETSReingest
 from archivematicaCreateMETSMetadataCSV import parseMetadata
@@ -54,6 +56,7 @@ from archivematicaFunctions import strToUnicode
 from archivematicaFunctions import normalizeNonDcElementName
 from create_mets_dataverse_v2 import create_dataverse_sip_dmdsec, create_dataverse_tabfile_dmdsec
 from custom_handlers import get_script_logger
+import fswalk
 import namespaces as ns
 
 from bagit import Bag, BagError
@@ -96,6 +99,7 @@ class MetsState(object):
 
         self.CSV_METADATA = {}
         self.error_accumulator = ErrorAccumulator()
+        self.file_metadata = FileMetadata()
 
 
 logger = get_script_logger("archivematica.mcp.client.createMETS2")
@@ -121,6 +125,186 @@ SIPMetadataAppliesToType = '3e48343d-e2d2-4956-aaa3-b54d26eb9761'
 TransferMetadataAppliesToType = '45696327-44c5-4e78-849b-e027a189bf4d'
 FileMetadataAppliesToType = '7f04d9d4-92c2-44a5-93dc-b7bfdf0c1f17'
 
+# How many files' characterization outputs FileMetadata holds at once
+CHARACTERIZATION_CHUNK_SIZE = 100
+
+
+class FileMetadata(object):
+    """
+    The database records that go in the METS for each file: the file, its
+    format identifications, characterization outputs, derivations, events
+    and agents, and the rights statements that apply to it.
+
+    They're queried for each file as its amdSec is created, unless prefetch
+    has loaded them for all the files of the unit in a few queries.  Records
+    of files outside the prefetched unit are still queried.
+
+    Characterization outputs can be big, so prefetch only notes which files
+    have them.  They're loaded CHARACTERIZATION_CHUNK_SIZE files at a time
+    (in the order of the files' locations) when first asked for, and dropped
+    once used.
+    """
+
+    # Related records createRightsStatement uses
+    RIGHTS_STATEMENT_RELATED = (
+        'rightsstatementcopyright_set__rightsstatementcopyrightnote_set',
+        'rightsstatementcopyright_set__rightsstatementcopyrightdocumentationidentifier_set',
+        'rightsstatementlicense_set__rightsstatementlicensedocumentationidentifier_set',
+        'rightsstatementlicense_set__rightsstatementlicensenote_set',
+        'rightsstatementstatuteinformation_set__rightsstatementstatuteinformationnote_set',
+        'rightsstatementstatuteinformation_set__rightsstatementstatutedocumentationidentifier_set',
+        'rightsstatementotherrightsinformation_set__rightsstatementotherrightsdocumentationidentifier_set',
+        'rightsstatementotherrightsinformation_set__rightsstatementotherrightsinformationnote_set',
+        'rightsstatementrightsgranted_set__restrictions',
+        'rightsstatementrightsgranted_set__notes',
+    )
+
+    def __init__(self):
+        self.unit = None
+        self._files = {}
+        self._current_files = {}
+        self._formats = collections.defaultdict(list)
+        self._characterized_files = []
+        self._characterized_file_positions = {}
+        self._characterization_documents = {}
+        self._derivations_from = collections.defaultdict(list)
+        self._derivations_of = collections.defaultdict(list)
+        self._events = collections.defaultdict(list)
+        self._agents = collections.defaultdict(list)
+        self._rights_identifiers = set()
+        self._rights_statements = collections.defaultdict(list)
+
+    def prefetch(self, unit_field, unit_uuid):
+        """
+        Load the records of all the files whose `unit_field` (e.g. sip_id) is
+        `unit_uuid`, and the rights statements of the unit and the transfers
+        its files came from.
+        """
+        self.__init__()
+        self.unit = (unit_field, unit_uuid)
+        in_unit = {unit_field: unit_uuid}
+
+        files = File.objects.filter(**in_unit).select_related('transfer').prefetch_related('identifiers')
+        for f in files:
+            self._files[f.uuid] = f
+            if f.removedtime is None:
+                self._current_files[f.currentlocation] = f
+
+        for row in FileID.objects.filter(**{'file__' + unit_field: unit_uuid}).order_by('pk').values_list(
+                'file_id', 'format_name', 'format_version', 'format_registry_name', 'format_registry_key'):
+            self._formats[row[0]].append(row[1:])
+
+        outputs = FPCommandOutput.objects.filter(
+            rule__purpose__in=['characterization', 'default_characterization'],
+            **{'file__' + unit_field: unit_uuid})
+        self._characterized_files = sorted(set(outputs.values_list('file_id', flat=True)),
+                                           key=lambda file_uuid: self._files[file_uuid].currentlocation)
+        for position, file_uuid in enumerate(self._characterized_files):
+            self._characterized_file_positions[file_uuid] = position
+
+        derivations = Derivation.objects.filter(
+            Q(**{'source_file__' + unit_field: unit_uuid}) | Q(**{'derived_file__' + unit_field: unit_uuid}))
+        for derivation in derivations.order_by('pk'):
+            self._derivations_from[derivation.source_file_id].append(derivation)
+            self._derivations_of[derivation.derived_file_id].append(derivation)
+
+        events = Event.objects.filter(**{'file_uuid__' + unit_field: unit_uuid}).prefetch_related('agents')
+        agents = collections.defaultdict(dict)
+        for event in events.order_by('pk'):
+            self._events[event.file_uuid_id].append(event)
+            for agent in event.agents.all():
+                agents[event.file_uuid_id][agent.pk] = agent
+        for file_uuid, file_agents in agents.items():
+            self._agents[file_uuid] = [file_agents[pk] for pk in sorted(file_agents)]
+
+        transfer_uuids = {f.transfer_id for f in self._files.values() if f.transfer_id}
+        statements = RightsStatement.objects.filter(
+            Q(metadataappliestotype_id=FileMetadataAppliesToType,
+              metadataappliestoidentifier__in=files.values('uuid')) |
+            Q(metadataappliestotype_id=SIPMetadataAppliesToType, metadataappliestoidentifier=unit_uuid) |
+            Q(metadataappliestotype_id=TransferMetadataAppliesToType,
+              metadataappliestoidentifier__in=transfer_uuids))
+        for statement in statements.prefetch_related(*self.RIGHTS_STATEMENT_RELATED).order_by('pk'):
+            self._rights_statements[(statement.metadataappliestoidentifier, statement.metadataappliestotype_id)].append(
+                statement)
+        self._rights_identifiers = set(self._files) | transfer_uuids | {unit_uuid}
+
+    def file(self, file_uuid):
+        """The File with `file_uuid`."""
+        if file_uuid in self._files:
+            return self._files[file_uuid]
+        return File.objects.get(uuid=file_uuid)
+
+    def current_file(self, unit_field, unit_uuid, currentlocation):
+        """The File at `currentlocation` in the unit, which hasn't been removed."""
+        if self.unit == (unit_field, unit_uuid):
+            try:
+                return self._current_files[currentlocation]
+            except KeyError:
+                raise File.DoesNotExist('No file at {}'.format(currentlocation))
+        return File.objects.get(removedtime__isnull=True, currentlocation=currentlocation, **{unit_field: unit_uuid})
+
+    def formats(self, file_uuid):
+        """(name, version, registry name, registry key) of the file's FileIDs."""
+        if file_uuid in self._files:
+            return self._formats.get(file_uuid, [])
+        return list(FileID.objects.filter(file_id=file_uuid).values_list(
+            'format_name', 'format_version', 'format_registry_name', 'format_registry_key'))
+
+    def characterization_documents(self, file_uuid):
+        """The XML output of the file's characterization commands."""
+        if file_uuid in self._files:
+            if file_uuid not in self._characterized_file_positions:
+                return []
+            if file_uuid not in self._characterization_documents:
+                self._load_characterization_documents(file_uuid)
+            return self._characterization_documents.pop(file_uuid)
+        return [content for content, in FPCommandOutput.objects.filter(
+            file_id=file_uuid,
+            rule__purpose__in=['characterization', 'default_characterization']).values_list('content')]
+
+    def _load_characterization_documents(self, file_uuid):
+        """Load the characterization outputs of the chunk of files starting with `file_uuid`."""
+        position = self._characterized_file_positions[file_uuid]
+        file_uuids = self._characterized_files[position:position + CHARACTERIZATION_CHUNK_SIZE]
+        self._characterization_documents = {chunk_file_uuid: [] for chunk_file_uuid in file_uuids}
+        outputs = FPCommandOutput.objects.filter(
+            file_id__in=file_uuids, rule__purpose__in=['characterization', 'default_characterization'])
+        for output_file_uuid, content in outputs.order_by('pk').values_list('file_id', 'content'):
+            self._characterization_documents[output_file_uuid].append(content)
+
+    def derivations_from(self, file_uuid):
+        """The Derivations of which the file is the source."""
+        if file_uuid in self._files:
+            return self._derivations_from.get(file_uuid, [])
+        return list(Derivation.objects.filter(source_file_id=file_uuid))
+
+    def derivations_of(self, file_uuid):
+        """The Derivations of which the file is the derived file."""
+        if file_uuid in self._files:
+            return self._derivations_of.get(file_uuid, [])
+        return list(Derivation.objects.filter(derived_file_id=file_uuid))
+
+    def events(self, file_uuid):
+        """The file's Events."""
+        if file_uuid in self._files:
+            return self._events.get(file_uuid, [])
+        return list(Event.objects.filter(file_uuid_id=file_uuid))
+
+    def agents(self, file_uuid):
+        """The Agents linked to the file's Events."""
+        if file_uuid in self._files:
+            return self._agents.get(file_uuid, [])
+        return list(Agent.objects.filter(event__file_uuid_id=file_uuid).distinct())
+
+    def rights_statements(self, identifier, applies_to_type):
+        """The RightsStatements about the file, SIP or transfer `identifier`."""
+        if identifier in self._rights_identifiers:
+            return self._rights_statements.get((identifier, applies_to_type), [])
+        return list(RightsStatement.objects.filter(
+            metadataappliestoidentifier=identifier,
+            metadataappliestotype_id=applies_to_type))
+
 
 def getDublinCore(unit, id_):
     db_field_mapping = collections.OrderedDict([
@@ -408,21 +592,23 @@ def createTechMD(fileUUID, state):
     mdWrap.set("MDTYPE", "PREMIS:OBJECT")
     xmlData = etree.SubElement(mdWrap, ns.metsBNS + "xmlData")
 
-    premis_object = create_premis_object(fileUUID)
+    premis_object = create_premis_object(fileUUID, state.file_metadata)
     xmlData.append(premis_object)
     return ret
 
 
-def create_premis_object(fileUUID):
+def create_premis_object(fileUUID, metadata=None):
     """
     Create a PREMIS:OBJECT for fileUUID.
 
     Access the models for File, FileID, FPCommandOutput, Derivation
 
     :param str fileUUID: UUID of the File to create an object for
+    :param FileMetadata metadata: Where to get the models from
     :return: premis:object Element, suitable for inserting into mets:xmlData
     """
-    f = File.objects.get(uuid=fileUUID)
+    metadata = metadata or FileMetadata()
+    f = metadata.file(fileUUID)
     # PREMIS:OBJECT
     object_elem = etree.Element(ns.premisBNS + "object", nsmap={'premis': ns.premisNS})
     object_elem.set(ns.xsiBNS + "type", "premis:file")
@@ -443,33 +629,33 @@ def create_premis_object(fileUUID):
 
     etree.SubElement(objectCharacteristics, ns.premisBNS + "size").text = str(f.size)
 
-    for elem in create_premis_object_formats(fileUUID):
+    for elem in create_premis_object_formats(fileUUID, metadata):
         objectCharacteristics.append(elem)
 
     creatingApplication = etree.Element(ns.premisBNS + "creatingApplication")
     etree.SubElement(creatingApplication, ns.premisBNS + "dateCreatedByApplication").text = f.modificationtime.strftime("%Y-%m-%d")
     objectCharacteristics.append(creatingApplication)
 
-    for elem in create_premis_object_characteristics_extensions(fileUUID):
+    for elem in create_premis_object_characteristics_extensions(fileUUID, metadata):
         objectCharacteristics.append(elem)
 
     etree.SubElement(object_elem, ns.premisBNS + "originalName").text = escape(f.originallocation)
 
-    for elem in create_premis_object_derivations(fileUUID):
+    for elem in create_premis_object_derivations(fileUUID, metadata):
         object_elem.append(elem)
 
     return object_elem
 
 
-def create_premis_object_formats(fileUUID):
-    files = FileID.objects.filter(file_id=fileUUID)
+def create_premis_object_formats(fileUUID, metadata=None):
+    formats = (metadata or FileMetadata()).formats(fileUUID)
     elements = []
-    if not files.exists():
+    if not formats:
         fmt = etree.Element(ns.premisBNS + "format")
         formatDesignation = etree.SubElement(fmt, ns.premisBNS + "formatDesignation")
         etree.SubElement(formatDesignation, ns.premisBNS + "formatName").text = "Unknown"
         elements.append(fmt)
-    for row in files.values_list('format_name', 'format_version', 'format_registry_name', 'format_registry_key'):
+    for row in formats:
         fmt = etree.Element(ns.premisBNS + "format")
 
         formatDesignation = etree.SubElement(fmt, ns.premisBNS + "formatDesignation")
@@ -484,13 +670,12 @@ def create_premis_object_formats(fileUUID):
     return elements
 
 
-def create_premis_object_characteristics_extensions(fileUUID):
+def create_premis_object_characteristics_extensions(fileUUID, metadata=None):
     objectCharacteristicsExtension = etree.Element(ns.premisBNS + "objectCharacteristicsExtension")
     elements = [objectCharacteristicsExtension]
 
     parser = etree.XMLParser(remove_blank_text=True)
-    documents = FPCommandOutput.objects.filter(file_id=fileUUID, rule__purpose__in=['characterization', 'default_characterization']).values_list('content')
-    for document, in documents:
+    for document in (metadata or FileMetadata()).characterization_documents(fileUUID):
         # This needs to be converted into an str because lxml doesn't accept
         # XML documents in unicode strings if the document contains an
         # encoding declaration.
@@ -500,11 +685,13 @@ def create_premis_object_characteristics_extensions(fileUUID):
     return elements
 
 
-def create_premis_object_derivations(fileUUID):
+def create_premis_object_derivations(fileUUID, metadata=None):
+    metadata = metadata or FileMetadata()
     elements = []
     # Derivations
-    derivations = Derivation.objects.filter(source_file_id=fileUUID, event__isnull=False)
-    for derivation in derivations:
+    for derivation in metadata.derivations_from(fileUUID):
+        if derivation.event_id is None:
+            continue
         relationship = etree.Element(ns.premisBNS + "relationship")
         etree.SubElement(relationship, ns.premisBNS + "relationshipType").text = "derivation"
         etree.SubElement(relationship, ns.premisBNS + "relationshipSubType").text = "is source of"
@@ -519,8 +706,9 @@ def create_premis_object_derivations(fileUUID):
 
         elements.append(relationship)
 
-    derivations = Derivation.objects.filter(derived_file_id=fileUUID, event__isnull=False)
-    for derivation in derivations:
+    for derivation in metadata.derivations_of(fileUUID):
+        if derivation.event_id is None:
+            continue
         relationship = etree.Element(ns.premisBNS + "relationship")
         etree.SubElement(relationship, ns.premisBNS + "relationshipType").text = "derivation"
         etree.SubElement(relationship, ns.premisBNS + "relationshipSubType").text = "has source"
@@ -544,8 +732,7 @@ def createDigiprovMD(fileUUID, state):
     """
     ret = []
 
-    events = Event.objects.filter(file_uuid_id=fileUUID)
-    for event_record in events:
+    for event_record in state.file_metadata.events(fileUUID):
         state.globalDigiprovMDCounter += 1
         digiprovMD = etree.Element(ns.metsBNS + "digiprovMD", ID='digiprovMD_' + str(state.globalDigiprovMDCounter))
         ret.append(digiprovMD)
@@ -554,8 +741,7 @@ def createDigiprovMD(fileUUID, state):
         xmlData = etree.SubElement(mdWrap, ns.metsBNS + "xmlData")
         xmlData.append(createEvent(event_record))
 
-    agents = Agent.objects.filter(event__file_uuid_id=fileUUID).distinct()
-    for agent in agents:
+    for agent in state.file_metadata.agents(fileUUID):
         state.globalDigiprovMDCounter += 1
         digiprovMD = etree.Element(ns.metsBNS + "digiprovMD", ID='digiprovMD_' + str(state.globalDigiprovMDCounter))
         ret.append(digiprovMD)
@@ -769,13 +955,8 @@ def createFileSec(job,
             DMDIDS = ""
             directoryPathSTR = itemdirectoryPath.replace(baseDirectoryPath, baseDirectoryName, 1)
 
-            kwargs = {
-                "removedtime__isnull": True,
-                fileGroupType: fileGroupIdentifier,
-                "currentlocation": directoryPathSTR
-            }
             try:
-                f = File.objects.get(**kwargs)
+                f = state.file_metadata.current_file(fileGroupType, fileGroupIdentifier, directoryPathSTR)
             except File.DoesNotExist:
                 job.pyprint('No uuid for file: "', directoryPathSTR, '"',
                             file=sys.stderr)
@@ -867,13 +1048,14 @@ def createFileSec(job,
 
             elif use in ("preservation", "text/ocr", "derivative"):
                 # Derived files should be in the original file's group
-                try:
-                    d = Derivation.objects.get(derived_file_id=f.uuid)
-                except Derivation.DoesNotExist:
+                derivations = state.file_metadata.derivations_of(f.uuid)
+                if not derivations:
                     job.pyprint('Fatal error: unable to locate a Derivation object'
                                 ' where the derived file is {}'.format(f.uuid))
-                    raise
-                GROUPID = "Group-" + d.source_file_id
+                    raise Derivation.DoesNotExist('No derivation of {}'.format(f.uuid))
+                if len(derivations) > 1:
+                    raise Derivation.MultipleObjectsReturned('{} derivations of {}'.format(len(derivations), f.uuid))
+                GROUPID = "Group-" + derivations[0].source_file_id
 
             elif use == "service":
                 # Service files are in the original file's group
@@ -1140,7 +1322,7 @@ def get_paths_as_fsitems(baseDirectoryPath, objectsDirectoryPath):
     :returns: list of ``FSItem`` instances representing paths
     """
     all_fsitems = []
-    for root, dirs, files in os.walk(objectsDirectoryPath):
+    for root, dirs, files in fswalk.walk(objectsDirectoryPath):
         root = root.replace(baseDirectoryPath, '', 1)
         if files or dirs:
             all_fsitems.append(FSItem('dir', root, is_empty=False))
@@ -1148,7 +1330,7 @@ def get_paths_as_fsitems(baseDirectoryPath, objectsDirectoryPath):
             all_fsitems.append(FSItem('dir', root, is_empty=True))
         for file_ in files:
             all_fsitems.append(
-                FSItem('file', os.path.join(root, file_), is_empty=False))
+                FSItem('file', os.path.join(root, file_.name), is_empty=False))
     return all_fsitems
 
 
@@ -1281,6 +1463,8 @@ def call(jobs):
                 # End reingest
 
                 state.CSV_METADATA = parseMetadata(job, baseDirectoryPath, state)
+                if includeAmdSec:
+                    state.file_metadata.prefetch(fileGroupType, fileGroupIdentifier)
 
                 baseDirectoryPath = os.path.join(baseDirectoryPath, '')
                 objectsDirectoryPath = os.path.join(baseDirectoryPath, 'objects')
@@ -16,6 +16,7 @@ from custom_handlers import get_script_logger
 from executeOrRunSubProcess import executeOrRun
 from databaseFunctions import fileWasRemoved
 from fileOperations import addFileToTransfer, updateSizeAndChecksum
+import fswalk
 from archivematicaFunctions import get_dir_uuids, format_subdir_path
 
 # clientScripts
@@ -36,9 +37,8 @@ def temporary_directory(file_path, date, file_path_cache):
 
 
 def tree(root):
-    for dirpath, __, files in os.walk(root):
-        for file in files:
-            yield os.path.join(dirpath, file)
+    for entry in fswalk.iter_files(root):
+        yield entry.path
 
 
 def assign_uuid(job, filename, extracted_file_original_location, package_uuid,
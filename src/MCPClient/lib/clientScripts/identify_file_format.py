@@ -6,14 +6,17 @@ import uuid
 
 import django
 django.setup()
+from django.conf import settings as mcpclient_settings
 # dashboard
 from fpr.models import IDCommand, IDRule, FormatVersion
-from main.models import FileFormatVersion, File, FileID, UnitVariable
+from main.models import Event, FileFormatVersion, File, FileID, UnitVariable
 from django.db import transaction
 
 # archivematicaCommon
 from executeOrRunSubProcess import executeOrRun
 from databaseFunctions import getUTCDate, insertIntoEvents
+import format_identification
+import fpr_cache
 
 
 def concurrent_instances():
@@ -93,14 +96,14 @@ def write_file_id(file_uuid, format, output):
     )
 
 
-def main(job, command_uuid, file_path, file_uuid, disable_reidentify):
+def main(job, command_uuid, file_path, file_uuid, disable_reidentify, batch_output=None):
     job.print_output("IDCommand UUID:", command_uuid)
     job.print_output("File: ({}) {}".format(file_uuid, file_path))
     if command_uuid == "None":
         job.print_output("Skipping file format identification")
         return 0
     try:
-        command = IDCommand.active.get(uuid=command_uuid)
+        command = fpr_cache.id_command(command_uuid)
     except IDCommand.DoesNotExist:
         job.write_error("IDCommand with UUID {} does not exist.\n".format(command_uuid))
         return 255
@@ -115,22 +118,25 @@ def main(job, command_uuid, file_path, file_uuid, disable_reidentify):
     # Save the selected ID command for use in a later chain
     save_idtool(file_, command_uuid)
 
-    exitcode, output, _ = executeOrRun(command.script_type, command.script, arguments=[file_path], printing=False,
-                                       capture_output=True)
-    output = output.strip()
+    if batch_output is not None:
+        output = batch_output
+    else:
+        exitcode, output, _ = executeOrRun(command.script_type, command.script, arguments=[file_path], printing=False,
+                                           capture_output=True)
+        output = output.strip()
 
-    if exitcode != 0:
-        job.print_error('Error: IDCommand with UUID {} exited non-zero.'.format(command_uuid))
-        return 255
+        if exitcode != 0:
+            job.print_error('Error: IDCommand with UUID {} exited non-zero.'.format(command_uuid))
+            return 255
 
     job.print_output('Command output:', output)
     # PUIDs are the same regardless of tool, so PUID-producing tools don't have "rules" per se - we just
     # go straight to the FormatVersion table to see if there's a matching PUID
     try:
         if command.config == 'PUID':
-            version = FormatVersion.active.get(pronom_id=output)
+            version = fpr_cache.format_version_by_puid(output)
         else:
-            rule = IDRule.active.get(command_output=output, command=command)
+            rule = fpr_cache.id_rule(command_uuid, output)
             version = rule.format
     except IDRule.DoesNotExist:
         job.print_error('Error: No FPR identification rule for tool output "{}" found'.format(output))
@@ -157,6 +163,46 @@ def main(job, command_uuid, file_path, file_uuid, disable_reidentify):
     return 0
 
 
+def identify_in_batches(jobs, parser):
+    """
+    Identify the files of all the jobs with one run of the ID tool of each
+    ID command they use, where the tool can do that.
+
+    Returns {(IDCommand UUID, file path): output}, with the output of the
+    PUID-producing commands for the files the tool identified.  main runs
+    the command for each of the others.
+    """
+    if not mcpclient_settings.BATCH_FORMAT_IDENTIFICATION:
+        return {}
+    jobs_args = []
+    for job in jobs:
+        try:
+            jobs_args.append(parser.parse_args(job.args[1:]))
+        except SystemExit:
+            continue
+    identified = set(Event.objects.filter(
+        file_uuid_id__in=[args.file_uuid for args in jobs_args if args.disable_reidentify],
+        event_type='format identification').values_list('file_uuid_id', flat=True))
+    file_paths = {}
+    for args in jobs_args:
+        if args.file_uuid not in identified:
+            file_paths.setdefault(args.idcommand, []).append(args.file_path)
+
+    outputs = {}
+    for command_uuid, paths in file_paths.items():
+        if command_uuid == 'None':
+            continue
+        try:
+            command = fpr_cache.id_command(command_uuid)
+        except IDCommand.DoesNotExist:
+            continue
+        if command.config != 'PUID' or not format_identification.supports(command.tool.description):
+            continue
+        for path, puid in format_identification.identify(command.tool.description, paths).items():
+            outputs[(command_uuid, path)] = puid
+    return outputs
+
+
 def call(jobs):
     parser = argparse.ArgumentParser(description='Identify file formats.')
     parser.add_argument('idcommand', type=str, help='%IDCommand%')
@@ -164,8 +210,11 @@ def call(jobs):
     parser.add_argument('file_uuid', type=str, help='%fileUUID%')
     parser.add_argument('--disable-reidentify', action='store_true', help='Disable identification if it has already happened for this file.')
 
+    batch_outputs = identify_in_batches(jobs, parser)
+
     with transaction.atomic():
         for job in jobs:
             with job.JobContext():
                 args = parser.parse_args(job.args[1:])
-                job.set_status(main(job, args.idcommand, args.file_path, args.file_uuid, args.disable_reidentify))
+                job.set_status(main(job, args.idcommand, args.file_path, args.file_uuid, args.disable_reidentify,
+                                    batch_outputs.get((args.idcommand, args.file_path))))
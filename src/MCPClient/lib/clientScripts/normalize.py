@@ -22,6 +22,7 @@ from django.db import transaction
 # archivematicaCommon
 import databaseFunctions
 import fileOperations
+import fpr_cache
 from dicts import ReplacementDict
 
 from django.conf import settings as mcpclient_settings
@@ -291,7 +292,7 @@ def insert_derivation_event(original_uuid, output_uuid, derivation_uuid,
 
 
 def get_default_rule(purpose):
-    return FPRule.active.get(purpose='default_' + purpose)
+    return fpr_cache.rule('default_' + purpose)
 
 
 def main(job, opts):
@@ -358,8 +359,7 @@ def main(job, opts):
     if format_id:
         job.print_output('File format:', format_id.format_version)
         try:
-            rule = FPRule.active.get(format=format_id.format_version,
-                                     purpose=opts.purpose)
+            rule = fpr_cache.rule(opts.purpose, format_id.format_version_id)
         except FPRule.DoesNotExist:
             if opts.purpose == 'thumbnail' and opts.thumbnail_mode == 'generate_non_default':
                 job.pyprint('Thumbnail not generated as no rule found for format')
@@ -19,12 +19,13 @@ import django
 django.setup()
 from django.conf import settings as mcpclient_settings
 from django.db import transaction
-from fpr.models import FPRule, FormatVersion
+from fpr.models import FormatVersion
 from main.models import Derivation, File, SIP, Transfer
 
 from executeOrRunSubProcess import executeOrRun
 import databaseFunctions
 from dicts import replace_string_values
+import fpr_cache
 from lib import setup_dicts
 
 # Note that linkTaskManagerFiles.py will take the highest exit code it has seen
@@ -200,16 +201,14 @@ class PolicyChecker(object):
             file_uuid = (
                 self._get_manually_normalized_access_derivative_file_uuid())
         try:
-            fmt = FormatVersion.active.get(
-                fileformatversion__file_uuid=file_uuid)
+            fmt = fpr_cache.file_format_version(file_uuid)
         except FormatVersion.DoesNotExist:
             rules = fmt = None
         if fmt:
-            rules = FPRule.active.filter(format=fmt.uuid, purpose=self.purpose)
+            rules = fpr_cache.rules(self.purpose, fmt.uuid)
         # Check for default rules.
         if not rules:
-            rules = FPRule.active.filter(
-                purpose='default_{}'.format(self.purpose))
+            rules = fpr_cache.rules('default_{}'.format(self.purpose))
         return rules
 
     def _execute_rule_command(self, rule):
@@ -37,6 +37,7 @@ from main.models import UnitVariable, Event, Agent, DublinCore
 
 # archivematicaCommon
 from custom_handlers import get_script_logger
+import fswalk
 import storageService as storage_service
 from archivematicaFunctions import escape
 
@@ -184,11 +185,7 @@ def store_aip(job, aip_destination_uri, aip_path, sip_uuid, sip_name, sip_type):
 
     # If AIP is a directory, calculate size recursively
     if os.path.isdir(aip_path):
-        size = 0
-        for dirpath, _, filenames in os.walk(aip_path):
-            for filename in filenames:
-                file_path = os.path.join(dirpath, filename)
-                size += os.path.getsize(file_path)
+        size = fswalk.tree_size(aip_path)
     else:
         size = os.path.getsize(aip_path)
 
@@ -10,13 +10,13 @@ django.setup()
 # dashboard
 from django.utils import timezone
 from main.models import Derivation, File, FileFormatVersion
-from fpr.models import FPRule
 
 # archivematicaCommon
 from dicts import ReplacementDict
 from executeOrRunSubProcess import executeOrRun
 import databaseFunctions
 import fileOperations
+import fpr_cache
 
 from django.conf import settings as mcpclient_settings
 from lib import setup_dicts
@@ -76,8 +76,7 @@ def insert_file_into_database(task_uuid, file_uuid, sip_uuid, event_uuid, rule,
 def fetch_rules_for(file_):
     try:
         format = FileFormatVersion.objects.get(file_uuid=file_)
-        return FPRule.objects.filter(format=format.format_version,
-                                     purpose='transcription')
+        return fpr_cache.rules('transcription', format.format_version_id)
     except FileFormatVersion.DoesNotExist:
         return []
 
@@ -29,9 +29,11 @@ django.setup()
 
 from main.models import File, FileFormatVersion
 
+from archivematicaFunctions import get_setting
 from custom_handlers import get_script_logger
 from databaseFunctions import insertIntoDerivations
 from fileOperations import updateSizeAndChecksum
+import fixity
 
 import metsrw
 
@@ -113,7 +115,7 @@ def get_file_info_from_mets(job, shared_path, file_):
     return ret
 
 
-def main(job, shared_path, file_uuid, file_path, date, event_uuid):
+def main(job, shared_path, file_uuid, file_path, date, event_uuid, checksums=None):
     try:
         file_ = File.objects.get(uuid=file_uuid)
     except File.DoesNotExist:
@@ -142,13 +144,32 @@ def main(job, shared_path, file_uuid, file_path, date, event_uuid):
                 file_uuid_id=file_uuid,
                 format_version=info['format_version']
             )
+    else:
+        checksum_type = get_setting('checksum_type', 'sha256')
+        checksum = (checksums or {}).get(file_path, {}).get(checksum_type)
+        if checksum:
+            kw.update(checksum=checksum, checksumType=checksum_type)
 
     updateSizeAndChecksum(file_uuid, file_path, date, event_uuid, **kw)
 
     return 0
 
 
+def checksum_files(jobs):
+    """
+    Checksum the files of all the jobs, a few at a time, and return their
+    checksums as {path: {algorithm: hex digest}}.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-p', '--filePath', action='store', dest='file_path', default='')
+    file_paths = [parser.parse_known_args(job.args[1:])[0].file_path for job in jobs]
+    return fixity.checksums_of_files([path for path in file_paths if path],
+                                     [get_setting('checksum_type', 'sha256')])
+
+
 def call(jobs):
+    checksums = checksum_files(jobs)
+
     parser = argparse.ArgumentParser()
     parser.add_argument('sharedPath')
     parser.add_argument('-i', '--fileUUID', type=lambda x: str(uuid.UUID(x)), dest='file_uuid')
@@ -169,4 +190,5 @@ def call(jobs):
                     args.file_uuid,
                     args.file_path,
                     args.date,
-                    args.event_uuid))
+                    args.event_uuid,
+                    checksums))
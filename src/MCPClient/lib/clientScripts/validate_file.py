@@ -23,12 +23,13 @@ import sys
 import django
 from django.db import transaction
 django.setup()
-from fpr.models import FPRule, FormatVersion
+from fpr.models import FormatVersion
 from main.models import Derivation, File, SIP
 
 from custom_handlers import get_script_logger
 import databaseFunctions
 from executeOrRunSubProcess import executeOrRun
+import fpr_cache
 from dicts import replace_string_values
 
 from django.conf import settings as mcpclient_settings
@@ -102,16 +103,14 @@ class Validator(object):
     def _get_rules(self):
         """Return all FPR rules that apply to files of this type."""
         try:
-            fmt = FormatVersion.active.get(
-                fileformatversion__file_uuid=self.file_uuid)
+            fmt = fpr_cache.file_format_version(self.file_uuid)
         except FormatVersion.DoesNotExist:
             rules = fmt = None
         if fmt:
-            rules = FPRule.active.filter(format=fmt.uuid, purpose=self.purpose)
+            rules = fpr_cache.rules(self.purpose, fmt.uuid)
         # Check default rules.
         if not rules:
-            rules = FPRule.active.filter(
-                purpose='default_{}'.format(self.purpose))
+            rules = fpr_cache.rules('default_{}'.format(self.purpose))
         return rules
 
     def _execute_rule_command(self, rule):
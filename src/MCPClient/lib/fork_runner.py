@@ -4,140 +4,335 @@
 Execute the .call(jobs) function of a clientScripts module from multiple
 processes.
 
-Takes a list of jobs to be executed and split them across a specified number of
-subprocesses.  Once the subprocesses complete, gather up the results and return
+Takes a list of jobs to be executed and hands them out to a specified number of
+worker processes.  Once the workers complete, gather up the results and return
 them to the MCP Client.
 
-This is invoked when a clientScripts module provides a `concurrent_instances`
-function (indicating that it supports being run as a subprocess).
+This is invoked for every clientScripts module.  One that provides a
+`concurrent_instances` function (indicating that it supports being run by
+several processes at once) gets that many workers; any other gets one.
+
+The worker processes are kept running between batches: each one is a
+re-execution of this script (so it starts from a clean environment, rather than
+a fork of a process holding database connections), which sets up Django once
+and then runs one set of jobs after another, keeping the modules it imported and
+its database connection warm.  A worker is replaced when it fails a health
+check or after it has run `FORK_RUNNER_RECYCLE_BATCHES` batches.
 """
 
 
+import collections
 import cPickle
 import importlib
 import logging
+import math
 import multiprocessing
 import os
+import select
+import subprocess
 import sys
-import tempfile
+import threading
+import time
 import traceback
 
-from databaseFunctions import auto_close_db
-from executeOrRunSubProcess import launchSubProcess
+from django.conf import settings as django_settings
 
 logger = logging.getLogger('archivematica.mcp.client')
 
 # Using this instead of __file__ to ensure we don't get fork_runner.pyc!
 THIS_SCRIPT = 'fork_runner.py'
 
+# How many chunks we split a batch into for each worker.  Workers take the
+# next chunk as soon as they finish one, so more (smaller) chunks balance the
+# load better, at the cost of a round trip to the worker for each.
+CHUNKS_PER_WORKER = 4
+
+# How long an idle worker has to answer a health check before we replace it.
+HEALTH_CHECK_TIMEOUT_SECONDS = 10
+
+# How long a worker has to exit once asked to, before we kill it.
+STOP_TIMEOUT_SECONDS = 5
+
+# How many batches a worker runs before it's replaced, unless configured
+# (see FORK_RUNNER_RECYCLE_BATCHES)
+DEFAULT_RECYCLE_BATCHES = 100
 
-def call(module_name, jobs, task_count=multiprocessing.cpu_count()):
+
+def call(module_name, jobs, task_count=multiprocessing.cpu_count(), job_size=None):
     """
-    Split `jobs` into `task_count` groups and fork a subprocess to run
-    `module_name`.call() for each of them.
+    Run `module_name`.call() over `jobs` using up to `task_count` worker
+    processes.
+
+    Jobs are handed out a small chunk at a time: whenever a worker finishes a
+    chunk it gets the next one, so a few expensive jobs don't hold up the
+    whole batch while the other workers sit idle.  If `job_size` is given, it's
+    called on each job to get the size of the file it works on, so the chunks
+    can be balanced by size and the biggest ones handed out first.
     """
     jobs_by_uuid = {}
     for job in jobs:
         jobs_by_uuid[job.UUID] = job
 
-    pool = multiprocessing.Pool(processes=task_count)
+    pending_chunks = collections.deque(_chunk_jobs(jobs, task_count, job_size))
+    workers = _pool.acquire(min(task_count, len(pending_chunks)))
 
     try:
-        results = []
-        for job_subset in _split_jobs(jobs, task_count):
-            results.append(pool.apply_async(_run_jobs, (module_name, job_subset)))
+        busy_workers = {}
+        for worker in workers:
+            worker.batches += 1
+            worker.send(('run', module_name, pending_chunks.popleft()))
+            busy_workers[worker.process.stdout] = worker
 
         finished_jobs = []
-        for result in results:
-            finished_jobs += result.get()
+        while busy_workers:
+            readable, _, _ = select.select(list(busy_workers), [], [])
+            for stdout in readable:
+                worker = busy_workers.pop(stdout)
+                finished_jobs += _unpack_result(module_name, worker.receive())
+                if pending_chunks:
+                    worker.send(('run', module_name, pending_chunks.popleft()))
+                    busy_workers[stdout] = worker
+    except Exception:
+        # We don't know what state our workers are in, so don't reuse them.
+        for worker in workers:
+            worker.stop()
+        raise
 
-        for finished_job in finished_jobs:
-            job = jobs_by_uuid[finished_job.UUID]
-            job.load_from(finished_job)
-    finally:
-        pool.terminate()
+    _pool.release(workers)
 
+    for finished_job in finished_jobs:
+        job = jobs_by_uuid[finished_job.UUID]
+        job.load_from(finished_job)
 
-def _split_jobs(jobs, n):
-    "Split `jobs` into n approximately equally-sized pieces"
-    chunk_size = len(jobs) / n
-    result = []
 
-    while jobs:
-        # Last chunk might be a little bigger
-        if len(result) == (n - 1):
-            result.append(jobs)
-            jobs = []
-        else:
-            result.append(jobs[0:chunk_size])
+def _chunk_jobs(jobs, task_count, job_size=None):
+    """
+    Split `jobs` into about CHUNKS_PER_WORKER chunks for each of `task_count`
+    workers.
 
-        jobs = jobs[chunk_size:]
+    Without `job_size` the chunks hold equal numbers of consecutive jobs.
+    With it, jobs are taken biggest first and packed into chunks of roughly
+    equal total size, so the big jobs each get a chunk of their own (and get
+    started first) while the small ones are bundled together.
+    """
+    chunk_count = task_count * CHUNKS_PER_WORKER
+    max_chunk_length = max(1, int(math.ceil(len(jobs) / float(chunk_count))))
 
-    return result
+    sizes = [_job_size(job_size, job) for job in jobs] if job_size else []
+    if not sum(sizes):
+        return [jobs[i:i + max_chunk_length] for i in range(0, len(jobs), max_chunk_length)]
 
+    target_size = sum(sizes) / float(chunk_count)
+    chunks = []
+    chunk = []
+    chunk_size = 0
+    for size, job in sorted(zip(sizes, jobs), key=lambda pair: pair[0], reverse=True):
+        if chunk and (chunk_size + size > target_size or len(chunk) >= max_chunk_length):
+            chunks.append(chunk)
+            chunk = []
+            chunk_size = 0
+        chunk.append(job)
+        chunk_size += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
 
-@auto_close_db
-def _run_jobs(module_name, jobs):
-    (fd, output_file) = tempfile.mkstemp()
 
+def _job_size(job_size, job):
+    """Call the module's `job_size` on `job`, treating failures as size 0."""
     try:
-        environment = {'jobs': jobs,
-                       'sys.path': sys.path,
-                       'output_file': output_file}
-
-        # A bit of trickiness: Re-execute ourselves (fork_runner.py) in a
-        # subprocess as a standalone script.  This ensures that we're running in
-        # a clean environment (avoiding issues with things like forking while
-        # holding a connection to the database)
-        #
-        # We communicate with our subprocess by supplying our `environment` map
-        # on stdin.  It gives results back to us by writing them to a temporary
-        # file.
-        (status, stdout, stderr) = launchSubProcess([os.path.join(os.path.dirname(os.path.abspath(__file__)), THIS_SCRIPT),
-                                                     module_name],
-                                                    cPickle.dumps(environment),
-                                                    printing=False,
-                                                    capture_output=True)
-
-        with os.fdopen(fd) as f:
-            result = cPickle.load(f)
-
-            if isinstance(result, dict) and result['uncaught_exception']:
-                e = result['uncaught_exception']
-                # Something went wrong with our client script.  This shouldn't
-                # happen under normal operation, but might happen during
-                # development.
-                logging.error(("Failure while executing '%s':\n" % (module_name)) + e['traceback'])
-                raise Exception(e['type'] + ": " + e['message'])
+        return job_size(job)
+    except Exception:
+        return 0
+
+
+def _unpack_result(module_name, result):
+    if isinstance(result, dict) and result['uncaught_exception']:
+        e = result['uncaught_exception']
+        # Something went wrong with our client script.  This shouldn't
+        # happen under normal operation, but might happen during
+        # development.
+        logging.error(("Failure while executing '%s':\n" % (module_name)) + e['traceback'])
+        if e['type'] == 'SystemExit':
+            raise ModuleExited(e['message'])
+        raise Exception(e['type'] + ": " + e['message'])
+    else:
+        return result
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class ModuleExited(Exception):
+    """The client script called exit()/quit()/sys.exit()."""
+
+
+class Worker(object):
+    """
+    A long-lived fork_runner.py subprocess.
+
+    We send it pickled requests on its stdin and it sends pickled replies back
+    on its stdout.
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.process = subprocess.Popen(
+            [os.path.join(os.path.dirname(os.path.abspath(__file__)), THIS_SCRIPT)],
+            bufsize=-1,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            close_fds=True)
+        self.send({'sys.path': sys.path})
+
+    def send(self, request):
+        try:
+            cPickle.dump(request, self.process.stdin, cPickle.HIGHEST_PROTOCOL)
+            self.process.stdin.flush()
+        except (IOError, OSError) as e:
+            raise WorkerDied("Worker process %d died: %s" % (self.process.pid, e))
+
+    def receive(self):
+        try:
+            return cPickle.load(self.process.stdout)
+        except EOFError:
+            raise WorkerDied("Worker process %d died with exit code %s" % (self.process.pid, self.process.wait()))
+
+    def is_healthy(self):
+        """Check that our worker is still running and responding."""
+        if self.process.poll() is not None:
+            return False
+        try:
+            self.send(('ping',))
+            readable, _, _ = select.select([self.process.stdout], [], [], HEALTH_CHECK_TIMEOUT_SECONDS)
+            return bool(readable) and self.receive() == 'pong'
+        except WorkerDied:
+            return False
+
+    def stop(self):
+        """Ask our worker to exit (by closing its stdin), killing it if it won't."""
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+
+        deadline = time.time() + STOP_TIMEOUT_SECONDS
+        while self.process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class WorkerPool(object):
+    """The worker processes of this MCP Client, kept between batches."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle_workers = []
+
+    def acquire(self, count):
+        """Get `count` healthy workers, starting new ones if needed."""
+        with self.lock:
+            idle_workers = self.idle_workers[:count]
+            self.idle_workers = self.idle_workers[count:]
+
+        workers = []
+        for worker in idle_workers:
+            if worker.is_healthy():
+                workers.append(worker)
+            else:
+                logger.warning("Replacing unhealthy fork_runner worker %d", worker.process.pid)
+                worker.stop()
+
+        while len(workers) < count:
+            workers.append(Worker())
+
+        return workers
+
+    def release(self, workers):
+        """Give workers back to the pool once they've finished a batch."""
+        for worker in workers:
+            if worker.batches >= getattr(django_settings, 'FORK_RUNNER_RECYCLE_BATCHES', DEFAULT_RECYCLE_BATCHES):
+                worker.stop()
             else:
-                return result
+                with self.lock:
+                    self.idle_workers.append(worker)
+
+
+_pool = WorkerPool()
+
+
+def _run_jobs(module_name, jobs):
+    """Run `jobs` with `module_name`.call() (in our worker process)."""
+    _close_unusable_db_connections()
 
+    # Some client scripts chdir; don't let that leak into the next batch
+    cwd = os.getcwd()
+    try:
+        module = importlib.import_module(module_name)
+        module.call(jobs)
+        return jobs
+    except (Exception, SystemExit) as e:
+        return {
+            'uncaught_exception': {
+                'message': str(e),
+                'type': type(e).__name__,
+                'traceback': traceback.format_exc(),
+            }
+        }
     finally:
-        os.unlink(output_file)
+        os.chdir(cwd)
 
 
-# Executed in our subprocess (see note in _run_jobs above).
-if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        raise Exception("Must be called with a module name (and a list of pickled jobs on stdin)")
+def _close_unusable_db_connections():
+    """
+    Our connections are kept open between batches, but the database may have
+    dropped them in the meantime.
+    """
+    from django.db import connections
 
-    module_to_run = sys.argv[1]
-    environment = cPickle.load(sys.stdin)
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+def _serve():
+    """
+    Worker process main loop: read requests from stdin until the MCP Client
+    closes it, sending replies to stdout.
+    """
+    # Keep the real stdout to ourselves, so anything the client scripts print
+    # can't get mixed up with our replies.
+    requests = sys.stdin
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
 
+    environment = cPickle.load(requests)
     sys.path = environment['sys.path']
-    jobs = environment['jobs']
-    output_file = environment['output_file']
 
-    with open(output_file, 'w') as f:
+    import django
+    django.setup()
+
+    while True:
         try:
-            module = importlib.import_module(module_to_run)
-            module.call(jobs)
-            cPickle.dump(jobs, f)
-        except Exception as e:
-            cPickle.dump({
-                'uncaught_exception': {
-                    'message': e.message,
-                    'type': type(e).__name__,
-                    'traceback': traceback.format_exc(),
-                }
-            }, f)
+            request = cPickle.load(requests)
+        except EOFError:
+            break
+
+        if request[0] == 'ping':
+            reply = 'pong'
+        else:
+            _, module_name, jobs = request
+            reply = _run_jobs(module_name, jobs)
+
+        cPickle.dump(reply, replies, cPickle.HIGHEST_PROTOCOL)
+        replies.flush()
+
+
+# Executed in our worker processes (see note at the top of this file).
+if __name__ == '__main__':
+    _serve()
@@ -5,26 +5,180 @@ batches by clientScript modules and populated with an exit code, standard out
 and standard error information.
 """
 
+import errno
+import os
+import shutil
 import traceback
 import sys
 import logging
+import tempfile
 
 from contextlib import contextmanager
+
+from django.utils import six
 from custom_handlers import CallbackHandler
 
 LOGGER = logging.getLogger('archivematica.mcp.client.job')
 
+# Default for how much of each of a job's outputs we hold in memory
+OUTPUT_MEMORY_LIMIT = 1024 * 1024
+
+
+class OutputBuffer(object):
+    """
+    Accumulates one of a job's outputs, holding at most `memory_limit` bytes
+    of it in memory.
+
+    Output beyond that is spilled, along with everything before it, to a file
+    named `filename` in `directory` (or a temporary file, without a
+    `directory`), and only the first and last `memory_limit` / 2 bytes are
+    kept.  getvalue() then returns those excerpts with a note of the path of
+    the full output between them, and read() the full output.  Once the job
+    is done, keep() moves the file somewhere it can stay, or discard()
+    removes it.
+    """
+
+    def __init__(self, memory_limit=OUTPUT_MEMORY_LIMIT, directory=None, filename=None):
+        self.memory_limit = memory_limit
+        self.directory = directory
+        self.filename = filename
+        self.chunks = []
+        self.size = 0
+        # Once spilled
+        self.path = None
+        self.head = None
+        self.tail = None
+        self._file = None
+
+    def __getstate__(self):
+        # Buffers travel between processes with their jobs (see fork_runner)
+        state = self.__dict__.copy()
+        if self._file is not None:
+            self._file.close()
+        state['_file'] = None
+        self._file = None
+        return state
+
+    def write(self, s):
+        if isinstance(s, six.text_type):
+            s = s.encode('utf-8')
+        if not s:
+            return
+        self.size += len(s)
+        if self.path is None:
+            self.chunks.append(s)
+            if self.size > self.memory_limit:
+                self._spill()
+            return
+
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(s)
+        excerpt_size = self.memory_limit // 2
+        if len(s) >= excerpt_size:
+            self.tail = s[len(s) - excerpt_size:]
+        else:
+            self.tail = self.tail[len(self.tail) + len(s) - excerpt_size:] + s
+
+    def _spill(self):
+        contents = ''.join(self.chunks)
+        self.chunks = []
+        try:
+            self._file = self._open_spill_file()
+            self._file.write(contents)
+        except (IOError, OSError):
+            LOGGER.warning('Unable to spill job output to disk, discarding its middle', exc_info=True)
+            self._file = None
+            self.path = os.devnull
+        else:
+            self.path = self._file.name
+        excerpt_size = self.memory_limit // 2
+        self.head = contents[:excerpt_size]
+        self.tail = contents[len(contents) - excerpt_size:]
+
+    def _open_spill_file(self):
+        if self.directory is None or self.filename is None:
+            return tempfile.NamedTemporaryFile(prefix='job-output-', suffix='.log', dir=self.directory, delete=False)
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        return open(os.path.join(self.directory, self.filename), 'wb')
+
+    def getvalue(self):
+        if self.path is None:
+            if len(self.chunks) > 1:
+                self.chunks = [''.join(self.chunks)]
+            return self.chunks[0] if self.chunks else ''
+        if self._file is not None:
+            self._file.flush()
+        omitted = self.size - len(self.head) - len(self.tail)
+        if self.path == os.devnull:
+            return '%s\n[... %d bytes omitted ...]\n%s' % (self.head, omitted, self.tail)
+        return '%s\n[... %d bytes omitted; full output in %s ...]\n%s' % (
+            self.head, omitted, self.path, self.tail)
+
+    def read(self):
+        """All of the output (as far as we managed to keep it)."""
+        if self.path is None or self.path == os.devnull:
+            return self.getvalue()
+        if self._file is not None:
+            self._file.flush()
+        try:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            LOGGER.warning('Unable to read spilled job output %s', self.path, exc_info=True)
+            return self.getvalue()
+
+    def keep(self, directory):
+        """Move our spill file, if we have one, into `directory` to stay."""
+        if self.path is None or self.path == os.devnull:
+            return
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        path = os.path.join(directory, os.path.basename(self.path))
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        shutil.move(self.path, path)
+        self.path = path
+        self.directory = directory
+
+    def discard(self):
+        """Remove our spill file, if we have one."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        paths = set()
+        if self.path is not None and self.path != os.devnull:
+            paths.add(self.path)
+        # Our file may have been spilled by another process (see fork_runner)
+        if self.directory is not None and self.filename is not None:
+            paths.add(os.path.join(self.directory, self.filename))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    LOGGER.warning('Unable to remove spilled job output %s', path, exc_info=True)
+
 
 class Job():
-    def __init__(self, name, uuid, args, caller_wants_output=False):
+    def __init__(self, name, uuid, args, caller_wants_output=False,
+                 output_memory_limit=OUTPUT_MEMORY_LIMIT, output_directory=None):
         self.name = name
         self.UUID = uuid
         self.args = [name] + args
         self.caller_wants_output = caller_wants_output
         self.int_code = 0
         self.status_code = 'success'
-        self.output = ""
-        self.error = ""
+        self.output = OutputBuffer(output_memory_limit, output_directory, '%s.stdout.log' % uuid)
+        self.error = OutputBuffer(output_memory_limit, output_directory, '%s.stderr.log' % uuid)
 
     def dump(self):
         return (("#<%s; exit=%d; code=%s uuid=%s\n" +
@@ -34,7 +188,7 @@ class Job():
                  "=============== STDERR ===============\n" +
                  "%s" +
                  "\n=============== END STDERR ===============\n" +
-                 "\n>") % (self.name, self.int_code, self.status_code, self.UUID, self.output, self.error))
+                 "\n>") % (self.name, self.int_code, self.status_code, self.UUID, self.get_stdout(), self.get_stderr()))
 
     def load_from(self, other_job):
         self.name = other_job.name
@@ -52,10 +206,10 @@ class Job():
         self.status_code = status_code
 
     def write_output(self, s):
-        self.output += s
+        self.output.write(s)
 
     def write_error(self, s):
-        self.error += s
+        self.error.write(s)
 
     def print_output(self, *args):
         self.write_output(' '.join([self._to_str(x) for x in args]) + "\n")
@@ -86,10 +240,26 @@ class Job():
         return self.int_code
 
     def get_stdout(self):
-        return self.output
+        return self.output.getvalue()
 
     def get_stderr(self):
-        return self.error
+        return self.error.getvalue()
+
+    def get_full_stdout(self):
+        return self.output.read()
+
+    def get_full_stderr(self):
+        return self.error.read()
+
+    def keep_output(self, directory):
+        """Move any of our output spilled to disk into `directory` to stay."""
+        self.output.keep(directory)
+        self.error.keep(directory)
+
+    def discard_output(self):
+        """Remove any of our output spilled to disk, if we failed to run."""
+        self.output.discard()
+        self.error.discard()
 
     @contextmanager
     def JobContext(self, logger=None):
@@ -36,21 +36,34 @@ CONFIG_MAPPING = {
     'client_modules_file': {'section': 'MCPClient', 'option': 'archivematicaClientModules', 'type': 'string'},
     'elasticsearch_server': {'section': 'MCPClient', 'option': 'elasticsearchServer', 'type': 'string'},
     'elasticsearch_timeout': {'section': 'MCPClient', 'option': 'elasticsearchTimeout', 'type': 'float'},
+    'elasticsearch_bulk_chunk_size': {'section': 'MCPClient', 'option': 'elasticsearch_bulk_chunk_size', 'type': 'int'},
     'search_enabled': {'section': 'MCPClient', 'process_function': process_search_enabled},
     'index_aip_continue_on_error': {'section': 'MCPClient', 'option': 'index_aip_continue_on_error', 'type': 'boolean'},
     'capture_client_script_output': {'section': 'MCPClient', 'option': 'capture_client_script_output', 'type': 'boolean'},
+    'client_script_output_memory_limit': {'section': 'MCPClient', 'option': 'client_script_output_memory_limit', 'type': 'int'},
+    'batch_format_identification': {'section': 'MCPClient', 'option': 'batch_format_identification', 'type': 'boolean'},
+    'fits_server_url': {'section': 'MCPClient', 'option': 'fits_server_url', 'type': 'string'},
+    'fits_server_connections': {'section': 'MCPClient', 'option': 'fits_server_connections', 'type': 'int'},
+    'fits_server_timeout': {'section': 'MCPClient', 'option': 'fits_server_timeout', 'type': 'float'},
     'removable_files': {'section': 'MCPClient', 'option': 'removableFiles', 'type': 'string'},
     'temp_directory': {'section': 'MCPClient', 'option': 'temp_dir', 'type': 'string'},
     'secret_key': {'section': 'MCPClient', 'option': 'django_secret_key', 'type': 'string'},
     'storage_service_client_timeout': {'section': 'MCPClient', 'option': 'storage_service_client_timeout', 'type': 'float'},
     'storage_service_client_quick_timeout': {'section': 'MCPClient', 'option': 'storage_service_client_quick_timeout', 'type': 'float'},
+    'storage_service_client_pool_size': {'section': 'MCPClient', 'option': 'storage_service_client_pool_size', 'type': 'int'},
+    'storage_service_client_retries': {'section': 'MCPClient', 'option': 'storage_service_client_retries', 'type': 'int'},
+    'storage_service_client_cache_ttl': {'section': 'MCPClient', 'option': 'storage_service_client_cache_ttl', 'type': 'float'},
     'agentarchives_client_timeout': {'section': 'MCPClient', 'option': 'agentarchives_client_timeout', 'type': 'float'},
+    'fork_runner_recycle_batches': {'section': 'MCPClient', 'option': 'fork_runner_recycle_batches', 'type': 'int'},
+    'concurrent_cpu_batches': {'section': 'MCPClient', 'option': 'concurrent_cpu_batches', 'type': 'int'},
+    'concurrent_io_batches': {'section': 'MCPClient', 'option': 'concurrent_io_batches', 'type': 'int'},
 
     # [antivirus]
     'clamav_server': {'section': 'MCPClient', 'option': 'clamav_server', 'type': 'string'},
     'clamav_pass_by_stream': {'section': 'MCPClient', 'option': 'clamav_pass_by_stream', 'type': 'boolean'},
     'clamav_client_timeout': {'section': 'MCPClient', 'option': 'clamav_client_timeout', 'type': 'float'},
     'clamav_client_backend': {'section': 'MCPClient', 'option': 'clamav_client_backend', 'type': 'string'},
+    'clamav_client_multiscan': {'section': 'MCPClient', 'option': 'clamav_client_multiscan', 'type': 'boolean'},
 
     # float for megabytes to preserve fractions on in-code operations on bytes
     'clamav_client_max_file_size': {'section': 'MCPClient', 'option': 'clamav_client_max_file_size', 'type': 'float'},
@@ -78,18 +91,31 @@ clientScriptsDirectory = /usr/lib/archivematica/MCPClient/clientScripts/
 clientAssetsDirectory = /usr/lib/archivematica/MCPClient/assets/
 elasticsearchServer = localhost:9200
 elasticsearchTimeout = 10
+elasticsearch_bulk_chunk_size = 500
 search_enabled = true
 index_aip_continue_on_error = false
 capture_client_script_output = true
+client_script_output_memory_limit = 1048576
+batch_format_identification = true
+fits_server_url =
+fits_server_connections = 4
+fits_server_timeout = 300
 temp_dir = /var/archivematica/sharedDirectory/tmp
 removableFiles = Thumbs.db, Icon, Icon\r, .DS_Store
 clamav_server = /var/run/clamav/clamd.ctl
 clamav_pass_by_stream = True
 storage_service_client_timeout = 86400
 storage_service_client_quick_timeout = 5
+storage_service_client_pool_size = 10
+storage_service_client_retries = 3
+storage_service_client_cache_ttl = 60
 agentarchives_client_timeout = 300
+fork_runner_recycle_batches = 100
+concurrent_cpu_batches = 1
+concurrent_io_batches = 1
 clamav_client_timeout = 86400
 clamav_client_backend = clamdscanner    ; Options: clamdscanner or clamscanner
+clamav_client_multiscan = false
 clamav_client_max_file_size = 42        ; MB
 clamav_client_max_scan_size = 42        ; MB
 
@@ -216,18 +242,31 @@ REMOVABLE_FILES = config.get('removable_files')
 TEMP_DIRECTORY = config.get('temp_directory')
 ELASTICSEARCH_SERVER = config.get('elasticsearch_server')
 ELASTICSEARCH_TIMEOUT = config.get('elasticsearch_timeout')
+ELASTICSEARCH_BULK_CHUNK_SIZE = config.get('elasticsearch_bulk_chunk_size')
 CLAMAV_SERVER = config.get('clamav_server')
 CLAMAV_PASS_BY_STREAM = config.get('clamav_pass_by_stream')
 CLAMAV_CLIENT_TIMEOUT = config.get('clamav_client_timeout')
 CLAMAV_CLIENT_BACKEND = config.get('clamav_client_backend')
+CLAMAV_CLIENT_MULTISCAN = config.get('clamav_client_multiscan')
 CLAMAV_CLIENT_MAX_FILE_SIZE = config.get('clamav_client_max_file_size')
 CLAMAV_CLIENT_MAX_SCAN_SIZE = config.get('clamav_client_max_scan_size')
 STORAGE_SERVICE_CLIENT_TIMEOUT = config.get('storage_service_client_timeout')
 STORAGE_SERVICE_CLIENT_QUICK_TIMEOUT = config.get('storage_service_client_quick_timeout')
+STORAGE_SERVICE_CLIENT_POOL_SIZE = config.get('storage_service_client_pool_size')
+STORAGE_SERVICE_CLIENT_RETRIES = config.get('storage_service_client_retries')
+STORAGE_SERVICE_CLIENT_CACHE_TTL = config.get('storage_service_client_cache_ttl')
 AGENTARCHIVES_CLIENT_TIMEOUT = config.get('agentarchives_client_timeout')
+FORK_RUNNER_RECYCLE_BATCHES = config.get('fork_runner_recycle_batches')
+CONCURRENT_CPU_BATCHES = config.get('concurrent_cpu_batches')
+CONCURRENT_IO_BATCHES = config.get('concurrent_io_batches')
 SEARCH_ENABLED = config.get('search_enabled')
 INDEX_AIP_CONTINUE_ON_ERROR = config.get('index_aip_continue_on_error')
 CAPTURE_CLIENT_SCRIPT_OUTPUT = config.get('capture_client_script_output')
+CLIENT_SCRIPT_OUTPUT_MEMORY_LIMIT = config.get('client_script_output_memory_limit')
+BATCH_FORMAT_IDENTIFICATION = config.get('batch_format_identification')
+FITS_SERVER_URL = config.get('fits_server_url')
+FITS_SERVER_CONNECTIONS = config.get('fits_server_connections')
+FITS_SERVER_TIMEOUT = config.get('fits_server_timeout')
 DEFAULT_CHECKSUM_ALGORITHM = 'sha256'
 
 
@@ -0,0 +1,11 @@
+"""Reports where it runs, then wanders off, like some client scripts do."""
+
+import os
+import time
+
+
+def call(jobs):
+    for job in jobs:
+        job.pyprint(os.getpid(), os.getcwd())
+        time.sleep(float(job.args[1]))
+    os.chdir('/')
@@ -0,0 +1,11 @@
+"""Kills its worker on the jobs that ask for it."""
+
+import os
+import time
+
+
+def call(jobs):
+    for job in jobs:
+        if job.args[1] == 'die':
+            os._exit(1)
+        time.sleep(float(job.args[1]))
@@ -0,0 +1,5 @@
+"""Raises."""
+
+
+def call(jobs):
+    raise ValueError('Something went wrong')
@@ -1,12 +1,18 @@
 """Tests for the archivematica_clamscan.py client script."""
 
 import os
+import shutil
+import SocketServer
 import sys
+import tempfile
+import threading
+import time
 
 from collections import OrderedDict, namedtuple
 
 import pytest
 import test_antivirus_clamdscan
+from clamd import ClamdUnixSocket
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(
@@ -202,3 +208,81 @@ def test_scan_file(mocker, setup_kwargs, exit_code, queue_event_params, settings
         assert event['eventType'] == 'virus check'
         assert event['fileUUID'] == args['file_uuid']
         assert event['eventOutcome'] == 'Pass' if setup_kwargs['scanner_passed'] else 'Fail'
+
+
+def test_covered_directories(tmpdir):
+    for path in ('a/1', 'a/b/2', 'c/3', 'c/4', 'd/e/5'):
+        tmpdir.join(path).write('', ensure=True)
+    batch = [str(tmpdir.join(path)) for path in ('a/1', 'a/b/2', 'c/3', 'd/e/5')]
+
+    assert archivematica_clamscan.covered_directories(batch) == [
+        str(tmpdir.join('a')), str(tmpdir.join('d', 'e'))]
+
+
+class JobMock():
+
+    def __init__(self, *args):
+        self.args = ['archivematica_clamscan'] + list(args)
+
+
+@pytest.mark.django_db
+def test_scan_batch(mocker, settings, tmpdir):
+    scanner = test_antivirus_clamdscan.setup_clamdscanner(settings, stream=False)
+    settings.CLAMAV_CLIENT_MAX_FILE_SIZE = 1
+    settings.CLAMAV_CLIENT_MAX_SCAN_SIZE = 1
+    for path in ('objects/dir/1', 'objects/dir/2', 'objects/3', 'objects/4'):
+        tmpdir.join(path).write('content', ensure=True)
+    tmpdir.join('objects/big').write('x' * (1024 * 1024 + 1))
+    jobs = [JobMock('None', str(tmpdir.join('objects', path)), args['date'], args['task_uuid'])
+            for path in ('dir/1', 'dir/2', '3', 'big')]
+    multiscan = mocker.patch.object(scanner.client, 'multiscan', return_value={
+        str(tmpdir.join('objects/dir/2')): ('FOUND', 'Eicar-Test-Signature'),
+    })
+    scan = mocker.patch.object(ClamdUnixSocket, 'scan', side_effect=lambda path: {path: ('OK', None)})
+
+    assert archivematica_clamscan.scan_batch(scanner, jobs) == {
+        str(tmpdir.join('objects/dir/1')): (True, 'OK', None),
+        str(tmpdir.join('objects/dir/2')): (False, 'FOUND', 'Eicar-Test-Signature'),
+        str(tmpdir.join('objects/3')): (True, 'OK', None),
+    }
+    multiscan.assert_called_once_with(str(tmpdir.join('objects/dir')))
+    scan.assert_called_once_with(str(tmpdir.join('objects/3')))
+
+
+class FakeClamdHandler(SocketServer.StreamRequestHandler):
+    # Answers SCAN like clamd, slowly enough for scans to overlap
+
+    def handle(self):
+        command, path = self.rfile.readline().strip().split(' ', 1)
+        time.sleep(0.01)
+        self.wfile.write('{}: OK\n'.format(path))
+
+
+@pytest.mark.django_db
+def test_scan_batch_concurrently(mocker, settings, tmpdir):
+    socket_dir = tempfile.mkdtemp()
+    server = SocketServer.ThreadingUnixStreamServer(os.path.join(socket_dir, 'clamd.ctl'), FakeClamdHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        scanner = test_antivirus_clamdscan.setup_clamdscanner(
+            settings, addr=os.path.join(socket_dir, 'clamd.ctl'), stream=False)
+        settings.CLAMAV_CLIENT_MAX_FILE_SIZE = 1
+        settings.CLAMAV_CLIENT_MAX_SCAN_SIZE = 1
+        mocker.patch('multiprocessing.cpu_count', return_value=8)
+        paths = []
+        for i in range(16):
+            # One file per directory, with another file that isn't in the
+            # batch, so each file is scanned on its own
+            tmpdir.join('objects', str(i), 'file').write('content', ensure=True)
+            tmpdir.join('objects', str(i), 'other').write('content')
+            paths.append(str(tmpdir.join('objects', str(i), 'file')))
+        jobs = [JobMock('None', path, args['date'], args['task_uuid']) for path in paths]
+
+        assert archivematica_clamscan.scan_batch(scanner, jobs) == {path: (True, 'OK', None) for path in paths}
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(socket_dir)
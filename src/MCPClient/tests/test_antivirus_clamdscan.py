@@ -159,3 +159,48 @@ def test_clamdscanner_scan(mocker, settings):
     assert passed is None
     assert state is None
     assert details is None
+
+
+def test_clamdscanner_scan_directory(mocker, settings):
+    scanner = setup_clamdscanner(settings, stream=False)
+    files = ['/dir/clean', '/dir/sub/infected', '/dir/sub/unreadable']
+    multiscan = mocker.patch.object(scanner.client, 'multiscan', return_value={
+        '/dir/sub/infected': ('FOUND', 'Eicar-Test-Signature'),
+        '/dir/sub/unreadable': ('ERROR', 'Permission denied'),
+    })
+
+    assert scanner.scan_directory('/dir', files) == {
+        '/dir/clean': (True, 'OK', None),
+        '/dir/sub/infected': (False, 'FOUND', 'Eicar-Test-Signature'),
+        '/dir/sub/unreadable': (False, 'ERROR', 'Permission denied'),
+    }
+    multiscan.assert_called_once_with('/dir')
+
+    # Files aren't reported as passed if the directory itself can't be scanned
+    multiscan.return_value = {'/dir': ('ERROR', "Can't open directory")}
+    assert scanner.scan_directory('/dir', files) == {}
+
+    multiscan.side_effect = ConnectionError("Error while reading from socket.")
+    assert scanner.scan_directory('/dir', files) == {}
+
+
+def test_clamdscanner_scan_directory_skipped_files(mocker, settings, tmpdir):
+    scanner = setup_clamdscanner(settings, stream=False)
+    directory = tmpdir.mkdir('dir')
+    clean = directory.join('clean')
+    clean.write('clean')
+    deep = directory.join(*['sub'] * 14).ensure('deep')
+    link = directory.join('link')
+    link.mksymlinkto(clean)
+    linked_directory = directory.join('linked')
+    linked_directory.mksymlinkto(tmpdir.mkdir('elsewhere'))
+    through_link = tmpdir.join('elsewhere', 'file')
+    through_link.write('file')
+    files = [str(clean), str(deep), str(link), str(linked_directory.join('file'))]
+    mocker.patch.object(scanner.client, 'multiscan', return_value={})
+
+    # Only the file clamd didn't skip passed; the others are left to be
+    # scanned one at a time
+    assert scanner.scan_directory(str(directory), files) == {
+        str(clean): (True, 'OK', None),
+    }
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.abspath(os.path.join(THIS_DIR, '../lib')))
+
+import archivematicaClient
+
+
+MODULES_CONFIG = """
+[supportedBatchCommands]
+normalize_v1.0 = normalize
+characterizefile_v0.0 = characterize_file
+move_v0.0 = cmd_mv
+
+[batchCommandClasses]
+normalize_v1.0 = cpu
+characterizefile_v0.0 = cpu
+
+[batchCommandLimits]
+characterizefile_v0.0 = 1
+"""
+
+
+def test_get_batch_slots(tmpdir):
+    modules_file = tmpdir.join('archivematicaClientModules')
+    modules_file.write(MODULES_CONFIG)
+    supported_modules = archivematicaClient.get_supported_modules(str(modules_file))
+
+    slots = archivematicaClient.get_batch_slots(str(modules_file), supported_modules, 2, 1)
+
+    assert [(name, sorted(client_scripts)) for name, client_scripts in slots] == [
+        ('cpu0', ['characterizefile_v0.0', 'normalize_v1.0']),
+        ('cpu1', ['normalize_v1.0']),
+        ('io0', ['move_v0.0']),
+    ]
+
+
+def test_get_batch_slots_without_classes(tmpdir):
+    modules_file = tmpdir.join('archivematicaClientModules')
+    modules_file.write("[supportedBatchCommands]\nmove_v0.0 = cmd_mv\n")
+    supported_modules = archivematicaClient.get_supported_modules(str(modules_file))
+
+    slots = archivematicaClient.get_batch_slots(str(modules_file), supported_modules, 1, 1)
+
+    assert slots == [('io0', ['move_v0.0'])]
+
+
+def test_get_batch_slots_rejects_no_slots(tmpdir):
+    modules_file = tmpdir.join('archivematicaClientModules')
+    modules_file.write(MODULES_CONFIG)
+    supported_modules = archivematicaClient.get_supported_modules(str(modules_file))
+
+    with pytest.raises(ValueError):
+        archivematicaClient.get_batch_slots(str(modules_file), supported_modules, 0, 1)
@@ -538,6 +538,66 @@ class TestCreateDigiprovMD(TestCase):
         assert ret[8].find('.//{info:lc/xmlns/premis-v2}agentType').text == 'Archivematica user'
 
 
+class TestFileMetadata(TestCase):
+    """ Test prefetching the metadata of a SIP's files. """
+
+    fixture_files = ['agents.json', 'sip.json', 'files.json', 'events-transfer.json']
+    fixtures = [os.path.join(THIS_DIR, 'fixtures', p) for p in fixture_files]
+
+    sip_uuid = '4060ee97-9c3f-4822-afaf-ebdf838284c3'
+    file_uuid = 'ae8d4290-fe52-4954-b72a-0f591bee2e2f'
+
+    def test_prefetched_metadata_is_the_same(self):
+        """ It should create the same amdSec contents as without prefetching, without queries. """
+        state = create_mets_v2.MetsState()
+        expected = [etree.tostring(elem) for elem in create_mets_v2.createDigiprovMD(self.file_uuid, state)]
+        expected.append(etree.tostring(create_mets_v2.createTechMD(self.file_uuid, state)))
+
+        state = create_mets_v2.MetsState()
+        state.file_metadata.prefetch('sip_id', self.sip_uuid)
+        with self.assertNumQueries(0):
+            digiprov_mds = create_mets_v2.createDigiprovMD(self.file_uuid, state)
+            tech_md = create_mets_v2.createTechMD(self.file_uuid, state)
+        assert [etree.tostring(elem) for elem in digiprov_mds] + [etree.tostring(tech_md)] == expected
+
+    def test_files_outside_the_sip_are_queried(self):
+        """ It should query the metadata of files that weren't prefetched. """
+        metadata = create_mets_v2.FileMetadata()
+        metadata.prefetch('sip_id', 'a7b5b4ba-4a87-4c1d-9c1b-1c8e6d1f4d4a')
+        assert metadata.file(self.file_uuid).uuid == self.file_uuid
+        assert len(metadata.events(self.file_uuid)) == 6
+
+
+class TestFileMetadataCharacterization(TestCase):
+    """ Test loading prefetched characterization outputs as they're needed. """
+
+    fixture_files = ['sip.json', 'files.json', 'fpr-reingest.json', 'reingest-characterization.json']
+    fixtures = [os.path.join(THIS_DIR, 'fixtures', p) for p in fixture_files]
+
+    sip_uuid = '4060ee97-9c3f-4822-afaf-ebdf838284c3'
+    file_uuid = 'ae8d4290-fe52-4954-b72a-0f591bee2e2f'
+
+    def test_characterization_documents_are_loaded_when_needed(self):
+        """ It should load the outputs on first use, and not keep them. """
+        metadata = create_mets_v2.FileMetadata()
+        metadata.prefetch('sip_id', self.sip_uuid)
+        assert metadata._characterization_documents == {}
+
+        with self.assertNumQueries(1):
+            documents = metadata.characterization_documents(self.file_uuid)
+        assert len(documents) == 2
+        assert metadata._characterization_documents == {}
+
+    def test_uncharacterized_files_are_not_queried(self):
+        """ It should know which files have no outputs without querying. """
+        metadata = create_mets_v2.FileMetadata()
+        metadata.prefetch('sip_id', self.sip_uuid)
+        other_file_uuid = next(uuid for uuid in metadata._files if uuid != self.file_uuid)
+
+        with self.assertNumQueries(0):
+            assert metadata.characterization_documents(other_file_uuid) == []
+
+
 class TestRights(TestCase):
     """ Test archivematicaCreateMETSRights creating rightsMD. """
 
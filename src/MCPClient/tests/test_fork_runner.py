@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+from uuid import uuid4
+
+import pytest
+
+THIS_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.abspath(os.path.join(THIS_DIR, '../lib')))
+
+import fork_runner
+from job import Job
+
+
+def make_jobs(sizes):
+    return [Job('somejob', str(uuid4()), [str(size)]) for size in sizes]
+
+
+def job_size(job):
+    return int(job.args[1])
+
+
+def test_chunk_jobs_without_sizes_splits_evenly():
+    jobs = make_jobs([1] * 24)
+    chunks = fork_runner._chunk_jobs(jobs, 2)
+
+    assert len(chunks) == 2 * fork_runner.CHUNKS_PER_WORKER
+    assert [job for chunk in chunks for job in chunk] == jobs
+
+
+def test_chunk_jobs_gives_big_jobs_their_own_chunk():
+    jobs = make_jobs([1] * 14 + [100, 50])
+    chunks = fork_runner._chunk_jobs(jobs, 1, job_size)
+
+    assert [job_size(job) for job in chunks[0]] == [100]
+    assert [job_size(job) for job in chunks[1]] == [50]
+    assert sorted(job.UUID for chunk in chunks for job in chunk) == sorted(job.UUID for job in jobs)
+    assert max(len(chunk) for chunk in chunks) <= 4
+
+
+def test_chunk_jobs_ignores_failing_job_size():
+    def broken_job_size(job):
+        raise OSError('No such file or directory')
+
+    jobs = make_jobs([1] * 8)
+    chunks = fork_runner._chunk_jobs(jobs, 2, broken_job_size)
+
+    assert [job for chunk in chunks for job in chunk] == jobs
+
+
+@pytest.fixture
+def pool(request, monkeypatch):
+    """A pool of our own, whose workers are stopped after the test."""
+    pool = fork_runner.WorkerPool()
+    monkeypatch.setattr(fork_runner, '_pool', pool)
+
+    def stop_workers():
+        for worker in pool.idle_workers:
+            worker.stop()
+    request.addfinalizer(stop_workers)
+    return pool
+
+
+def run(module_name, jobs, **kwargs):
+    fork_runner.call('fork_runner_scripts.' + module_name, jobs, **kwargs)
+    return [job.get_stdout().split() for job in jobs]
+
+
+def test_worker_answers_health_checks():
+    worker = fork_runner.Worker()
+    try:
+        assert worker.is_healthy()
+        worker.process.kill()
+        worker.process.wait()
+        assert not worker.is_healthy()
+    finally:
+        worker.stop()
+
+
+def test_unhealthy_workers_are_replaced(pool):
+    (dead_worker,) = pool.acquire(1)
+    pool.release([dead_worker])
+    dead_worker.process.kill()
+    dead_worker.process.wait()
+
+    (worker,) = pool.acquire(1)
+    pool.release([worker])
+
+    assert worker is not dead_worker
+    assert worker.is_healthy()
+
+
+def test_workers_are_reused_then_recycled(pool, settings):
+    settings.FORK_RUNNER_RECYCLE_BATCHES = 2
+    pids = [run('echo', make_jobs([0]), task_count=1)[0][0] for _ in range(3)]
+
+    assert pids[0] == pids[1] != pids[2]
+    assert [worker.batches for worker in pool.idle_workers] == [1]
+
+
+def test_client_script_output_does_not_reach_replies(pool):
+    jobs = make_jobs([0] * 8)
+    outputs = run('echo', jobs, task_count=2)
+
+    assert all(job.get_exit_code() == 0 for job in jobs)
+    assert len(set(pid for (pid,) in outputs)) == 2
+    assert all(worker.is_healthy() for worker in pool.idle_workers)
+
+
+def test_worker_dying_stops_the_batch(pool, monkeypatch):
+    workers = []
+    acquire = pool.acquire
+
+    def acquire_and_remember(count):
+        workers.extend(acquire(count))
+        return workers
+    monkeypatch.setattr(pool, 'acquire', acquire_and_remember)
+
+    with pytest.raises(fork_runner.WorkerDied):
+        run('die', make_jobs(['die', 1, 1, 1]), task_count=2)
+
+    assert len(workers) == 2
+    assert all(worker.process.poll() is not None for worker in workers)
+    assert pool.idle_workers == []
+
+
+@pytest.mark.parametrize('module_name, exception, error', [
+    ('exit', fork_runner.ModuleExited, '3'),
+    ('fail', Exception, 'ValueError: Something went wrong'),
+])
+def test_client_script_errors_are_raised(pool, module_name, exception, error):
+    with pytest.raises(exception) as excinfo:
+        run(module_name, make_jobs([0]), task_count=1)
+
+    assert str(excinfo.value) == error
+    assert pool.idle_workers == []
+
+
+def test_batches_do_not_share_a_working_directory(pool):
+    run('chdir', make_jobs([0]), task_count=1)
+    ((_, cwd),) = run('chdir', make_jobs([0]), task_count=1)
+
+    assert cwd == os.getcwd()
+
+
+def test_concurrent_batches_run_in_separate_processes(pool):
+    batches = [make_jobs([0.5]), make_jobs([0.5])]
+    threads = [threading.Thread(target=run, args=('chdir', jobs), kwargs={'task_count': 1}) for jobs in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    pids = set(jobs[0].get_stdout().split()[0] for jobs in batches)
+    assert len(pids) == 2
@@ -1,4 +1,5 @@
 import os
+import pickle
 import sys
 from uuid import uuid4
 
@@ -21,3 +22,69 @@ def test_job(tmpdir):
     stdout = j.get_stdout()
     expected = '{}\n'.format(unicode_printable.encode('utf8'))
     assert expected == stdout
+
+
+def test_job_output_within_memory_limit(tmpdir):
+    j = Job('somejob', str(uuid4()), [], output_memory_limit=100, output_directory=str(tmpdir))
+    for i in range(10):
+        j.write_output('line %d\n' % i)
+    j.write_error(u'caf\xe9')
+
+    assert j.get_stdout() == ''.join('line %d\n' % i for i in range(10))
+    assert j.get_stderr() == 'caf\xc3\xa9'
+    assert tmpdir.listdir() == []
+
+
+def test_job_output_spills_to_disk(tmpdir):
+    job_uuid = str(uuid4())
+    j = Job('somejob', job_uuid, [], output_memory_limit=100, output_directory=str(tmpdir))
+    output = ''.join('line %03d\n' % i for i in range(1000))
+    for i in range(0, len(output), 7):
+        j.write_output(output[i:i + 7])
+
+    full_output = tmpdir.join(job_uuid + '.stdout.log')
+    stdout = j.get_stdout()
+    assert full_output.read() == output
+    assert stdout == '%s\n[... %d bytes omitted; full output in %s ...]\n%s' % (
+        output[:50], len(output) - 100, full_output, output[-50:])
+    assert j.get_full_stdout() == output
+    assert j.get_stderr() == j.get_full_stderr() == ''
+
+
+def test_job_output_is_kept(tmpdir):
+    job_uuid = str(uuid4())
+    j = Job('somejob', job_uuid, [], output_memory_limit=10, output_directory=str(tmpdir.join('tmp')))
+    j.write_output('a' * 20)
+    j.write_error('b' * 5)
+
+    j.keep_output(str(tmpdir.join('kept')))
+
+    kept_output = tmpdir.join('kept', job_uuid + '.stdout.log')
+    assert tmpdir.join('tmp').listdir() == []
+    assert tmpdir.join('kept').listdir() == [kept_output]
+    assert str(kept_output) in j.get_stdout()
+    assert j.get_full_stdout() == 'a' * 20
+    assert j.get_stderr() == 'b' * 5
+
+
+def test_job_output_survives_pickling(tmpdir):
+    j = Job('somejob', str(uuid4()), [], output_memory_limit=10, output_directory=str(tmpdir))
+    j.write_output('a' * 20)
+
+    j = pickle.loads(pickle.dumps(j, pickle.HIGHEST_PROTOCOL))
+    j.write_output('b' * 20)
+
+    assert j.get_stdout().endswith('bbbbb')
+    assert j.output.size == 40
+    assert open(j.output.path).read() == 'a' * 20 + 'b' * 20
+
+
+def test_job_output_spilled_elsewhere_is_discarded(tmpdir):
+    j = Job('somejob', str(uuid4()), [], output_memory_limit=10, output_directory=str(tmpdir))
+    worker_copy = pickle.loads(pickle.dumps(j, pickle.HIGHEST_PROTOCOL))
+    worker_copy.write_output('a' * 20)
+    worker_copy.write_error('b' * 20)
+
+    j.discard_output()
+
+    assert tmpdir.listdir() == []
@@ -0,0 +1,107 @@
+#!/usr/bin/env python2
+"""Benchmark Task row creation throughput: one INSERT per task vs. bulk INSERTs.
+
+Creates a scratch test database for the configured engine (Django's test
+database, so the real one is never touched), then inserts the same tasks with
+`databaseFunctions.logTaskCreatedSQL` (one row at a time, as TaskGroups used
+to) and with `databaseFunctions.logTasksCreatedSQL` (multi-row INSERTs).
+
+Usage:
+
+    # SQLite (in memory)
+    DJANGO_SETTINGS_MODULE=settings.test \\
+    PYTHONPATH=src/MCPServer/lib:src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/MCPServer/benchmarks/bench_task_creation.py --tasks 10000
+
+    # MySQL (uses the MCPServer database settings; creates `test_<name>`)
+    DJANGO_SETTINGS_MODULE=settings.common \\
+    PYTHONPATH=src/MCPServer/lib:src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/MCPServer/benchmarks/bench_task_creation.py --tasks 10000
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+import uuid
+
+import django
+django.setup()
+from django.db import connection, transaction
+from django.utils import timezone
+
+import databaseFunctions
+from main.models import Job, Task
+
+
+class FakeJobChainLink(object):
+    def __init__(self, job_uuid):
+        self.UUID = job_uuid
+
+
+class FakeTaskManager(object):
+    execute = 'bench_task_creation_v0.0'
+
+    def __init__(self, job_uuid):
+        self.jobChainLink = FakeJobChainLink(job_uuid)
+
+
+def make_tasks(task_manager, count):
+    tasks = []
+    for i in range(count):
+        file_uuid = str(uuid.uuid4())
+        relative_location = '%SIPDirectory%objects/dir-{}/file-{}.tif'.format(i // 1000, i)
+        arguments = '"{}" "{}" "%sharedPath%" "%date%" "%taskUUID%"'.format(file_uuid, relative_location)
+        tasks.append((task_manager,
+                      {'%fileUUID%': file_uuid, '%relativeLocation%': relative_location},
+                      str(uuid.uuid4()),
+                      arguments))
+    return tasks
+
+
+def one_row_at_a_time(tasks):
+    with transaction.atomic():
+        for task in tasks:
+            databaseFunctions.logTaskCreatedSQL(*task)
+
+
+def bulk(tasks, batch_size):
+    with transaction.atomic():
+        databaseFunctions.logTasksCreatedSQL(tasks, batch_size=batch_size)
+
+
+def timed(fn, *args):
+    started = time.time()
+    fn(*args)
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 500, 1000])
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        job_uuid = str(uuid.uuid4())
+        Job.objects.create(jobuuid=job_uuid, createdtime=timezone.now())
+        task_manager = FakeTaskManager(job_uuid)
+
+        print('engine: %s; %d tasks' % (connection.vendor, args.tasks))
+        print('%-28s %10s %12s' % ('method', 'seconds', 'tasks/s'))
+
+        elapsed = timed(one_row_at_a_time, make_tasks(task_manager, args.tasks))
+        print('%-28s %10.2f %12.0f' % ('logTaskCreatedSQL (per row)', elapsed, args.tasks / elapsed))
+        Task.objects.all().delete()
+
+        for batch_size in args.batch_sizes:
+            elapsed = timed(bulk, make_tasks(task_manager, args.tasks), batch_size)
+            print('%-28s %10.2f %12.0f' % ('logTasksCreatedSQL (%d)' % batch_size, elapsed, args.tasks / elapsed))
+            Task.objects.all().delete()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python2
+"""Benchmark TaskGroupRunner callback latency and gearmand request rate.
+
+Runs TaskGroupRunner against a real gearmand with a pool of in-process
+workers that finish every job after a fixed amount of "work".  For each number
+of in-flight task groups we report:
+
+  * callback latency: time from a worker returning its result to the
+    TaskGroupRunner firing the group's finished callback;
+  * gearmand request rate: packets per second that the runner's client sent
+    to gearmand, broken down by command.
+
+Usage (gearmand must be listening on --gearman-server):
+
+    PYTHONPATH=src/MCPServer/lib:src/archivematicaCommon/lib \\
+        python src/MCPServer/benchmarks/bench_task_group_runner.py \\
+        --in-flight 10 100 1000 --work-seconds 0.5
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import cPickle
+import threading
+import time
+import uuid
+
+from django.conf import settings as django_settings
+
+import gearman
+from gearman.connection import GearmanConnection
+from gearman import protocol
+
+
+BENCH_TASK_NAME = 'bench_task_group_runner_v0.0'
+
+
+class FakeTaskGroup(object):
+    """Just enough of a TaskGroup for TaskGroupRunner to run it."""
+
+    def __init__(self):
+        self.UUID = str(uuid.uuid4())
+
+    def name(self):
+        return BENCH_TASK_NAME
+
+    def unit_uuid(self):
+        return self.UUID
+
+    def serialize(self):
+        return cPickle.dumps({'tasks': {}})
+
+    def tasks(self):
+        return []
+
+
+def count_client_commands(counter):
+    """Count the packets the runner's client sends to gearmand, by command."""
+    client_commands = {
+        protocol.GEARMAN_COMMAND_SUBMIT_JOB: 'SUBMIT_JOB',
+        protocol.GEARMAN_COMMAND_GET_STATUS: 'GET_STATUS',
+    }
+    original_send_command = GearmanConnection.send_command
+
+    def send_command(self, cmd_type, cmd_args):
+        if cmd_type in client_commands:
+            counter[client_commands[cmd_type]] += 1
+        return original_send_command(self, cmd_type, cmd_args)
+
+    GearmanConnection.send_command = send_command
+
+
+def start_workers(gearman_server, count, work_seconds, finished_at):
+    def do_work(gearman_worker, gearman_job):
+        time.sleep(work_seconds)
+        finished_at[gearman_job.unique] = time.time()
+        return cPickle.dumps({'task_results': {}})
+
+    def run():
+        worker = gearman.GearmanWorker([gearman_server])
+        worker.register_task(BENCH_TASK_NAME, do_work)
+        worker.work()
+
+    for _ in range(count):
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+
+def run_round(runner, in_flight, finished_at, counter):
+    callbacks_at = {}
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def finished_callback(task_group):
+        with lock:
+            callbacks_at[task_group.UUID] = time.time()
+            if len(callbacks_at) == in_flight:
+                done.set()
+
+    counter.clear()
+    started = time.time()
+    for _ in range(in_flight):
+        runner.runTaskGroup(FakeTaskGroup(), finished_callback)
+    done.wait()
+    elapsed = time.time() - started
+
+    latencies = sorted(callbacks_at[group_uuid] - finished_at[group_uuid]
+                       for group_uuid in callbacks_at)
+    return {
+        'elapsed': elapsed,
+        'latency_mean': sum(latencies) / len(latencies),
+        'latency_p50': latencies[len(latencies) // 2],
+        'latency_max': latencies[-1],
+        'requests': dict(counter),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gearman-server', default='localhost:4730')
+    parser.add_argument('--in-flight', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--workers', type=int, default=64,
+                        help='number of in-process Gearman workers')
+    parser.add_argument('--work-seconds', type=float, default=0.5,
+                        help='how long each job takes to "run"')
+    args = parser.parse_args()
+
+    django_settings.configure(
+        GEARMAN_SERVER=args.gearman_server,
+        LIMIT_TASK_THREADS=75,
+    )
+    from taskGroupRunner import TaskGroupRunner
+
+    counter = collections.Counter()
+    count_client_commands(counter)
+
+    finished_at = {}
+    start_workers(args.gearman_server, args.workers, args.work_seconds, finished_at)
+    TaskGroupRunner.init()
+
+    print('%9s %9s %12s %12s %12s %12s %12s' % (
+        'in-flight', 'elapsed', 'lat mean ms', 'lat p50 ms', 'lat max ms',
+        'submit/s', 'status/s'))
+    for in_flight in args.in_flight:
+        result = run_round(TaskGroupRunner, in_flight, finished_at, counter)
+        elapsed = result['elapsed']
+        print('%9d %8.2fs %12.1f %12.1f %12.1f %12.1f %12.1f' % (
+            in_flight, elapsed,
+            result['latency_mean'] * 1000,
+            result['latency_p50'] * 1000,
+            result['latency_max'] * 1000,
+            result['requests'].get('SUBMIT_JOB', 0) / elapsed,
+            result['requests'].get('GET_STATUS', 0) / elapsed))
+
+
+if __name__ == '__main__':
+    main()
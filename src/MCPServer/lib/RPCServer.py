@@ -33,6 +33,7 @@ from databaseFunctions import auto_close_db
 from linkTaskManagerChoice import choicesAvailableForUnits
 from package import create_package, get_approve_transfer_chain_id
 from processing_config import get_processing_fields
+from workflow import reload_workflow
 from main.models import Job, MicroServiceChainChoice
 
 
@@ -228,6 +229,19 @@ def get_processing_config_fields_handler(*args, **kwargs):
     return get_processing_fields()
 
 
+@auto_close_db
+@pickle_result
+@capture_exceptions(raise_exc=False)
+def reload_workflow_handler(*args, **kwargs):
+    """Reload the workflow from the database, e.g. after a migration.
+
+    Links that have already started keep running with the workflow they were
+    started with.
+    """
+    reload_workflow()
+    return True
+
+
 def startRPCServer():
     gm_worker = gearman.GearmanWorker([django_settings.GEARMAN_SERVER])
     hostID = gethostname() + "_MCPServer"
@@ -246,6 +260,8 @@ def startRPCServer():
         "approvePartialReingest", approve_partial_reingest_handler)
     gm_worker.register_task(
         "getProcessingConfigFields", get_processing_config_fields_handler)
+    gm_worker.register_task(
+        "reloadWorkflow", reload_workflow_handler)
 
     failMaxSleep = 30
     failSleep = 1
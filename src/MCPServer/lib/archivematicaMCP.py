@@ -64,6 +64,7 @@ from unitFile import unitFile
 from unitTransfer import unitTransfer
 from utils import isUUID
 import RPCServer
+import workflow
 
 from archivematicaFunctions import unicodeToStr
 from databaseFunctions import auto_close_db, createSIP, getUTCDate
@@ -208,6 +209,8 @@ def watchDirectories():
             callBackFunctionAdded=createUnitAndJobChainThreaded,
             alertOnFiles=actOnFiles,
             interval=interval,
+            method=django_settings.WATCH_DIRECTORY_METHOD,
+            quiescence=django_settings.WATCH_DIRECTORY_QUIESCENCE,
         )
 
 
@@ -387,6 +390,8 @@ if __name__ == '__main__':
     t.daemon = True
     t.start()
 
+    workflow.reload_workflow()
+
     Executor.init()
     TaskGroupRunner.init()
 
@@ -0,0 +1,205 @@
+"""Split the files of a link into the TaskGroups we'll send to MCP Client.
+
+By default files are packed into TaskGroups of a fixed size (`BATCH_SIZE`).
+That works well when every task costs about the same, but not when a single
+batch of 128 FITS characterizations of video files takes hours while 128
+`cmd_chmod` tasks take milliseconds.
+
+The cost-aware mode estimates how long each task will take from how long the
+same command took in the past (the `Tasks.startTime`/`Tasks.endTime` columns)
+and from the file sizes involved.  It then cuts the link into enough TaskGroups
+to keep every MCP Client busy, and orders them most-expensive first so the
+link doesn't end waiting on one straggler batch.
+"""
+
+# This file is part of Archivematica.
+#
+# Copyright 2010-2018 Artefactual Systems Inc. <http://artefactual.com>
+#
+# Archivematica is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Archivematica is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Archivematica.  If not, see <http://www.gnu.org/licenses/>.
+
+# @package Archivematica
+# @subpackage MCPServer
+
+import collections
+import logging
+
+from django.conf import settings as django_settings
+import gearman
+
+from main.models import File, Task
+
+LOGGER = logging.getLogger('archivematica.mcp.server')
+
+# How many recently finished tasks to look at when estimating the cost of a
+# command.  Kept below SQLite's limit on query parameters since we look up the
+# sizes of their files with an `IN` clause.
+HISTORY_TASK_COUNT = 500
+
+# How many TaskGroups we aim to give each available MCP Client.  More than one
+# so the expensive groups dispatched first can be balanced out by the cheaper
+# ones dispatched last.
+GROUPS_PER_WORKER = 4
+
+# Estimated cost of running one task, in seconds: `per_task` for the fixed
+# overhead plus `per_byte` for every byte of the file it's working on.
+TaskCost = collections.namedtuple('TaskCost', ['per_task', 'per_byte'])
+
+
+def fixed_size_batches(items, batch_size):
+    """Split `items` into consecutive batches of `batch_size` items."""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def cost_aware_batches(execute, items, sizes, max_batch_size, min_batch_seconds):
+    """
+    Split `items` into batches of roughly equal estimated cost.
+
+    `sizes` gives the size in bytes of the file behind each item (or None if
+    it isn't known).  Returns the batches most-expensive first, or None if we
+    know too little about `execute` to do any better than fixed size batches.
+    """
+    cost = estimate_task_cost(execute)
+    if cost is None:
+        return None
+
+    workers = available_workers(execute.lower())
+    if workers is None:
+        return None
+
+    known_sizes = [size for size in sizes if size is not None]
+    default_size = sum(known_sizes) / float(len(known_sizes)) if known_sizes else 0
+    costs = [cost.per_task + cost.per_byte * (default_size if size is None else size)
+             for size in sizes]
+
+    target_cost = max(sum(costs) / (workers * GROUPS_PER_WORKER), min_batch_seconds)
+    LOGGER.debug('Batching %d %s tasks for %d workers; estimated %.3fs per task + %.3es per byte; target %.1fs per batch',
+                 len(items), execute, workers, cost.per_task, cost.per_byte, target_cost)
+
+    return pack_by_cost(items, costs, target_cost, max_batch_size)
+
+
+def pack_by_cost(items, costs, target_cost, max_batch_size):
+    """
+    Pack `items` into batches whose total cost doesn't exceed `target_cost`
+    (unless a single item does) or hold more than `max_batch_size` items.
+
+    Items are taken most-expensive first, so the first batches hold the big
+    items (one per batch if they cost more than `target_cost`) and the cheap
+    ones get bundled together at the end.  Dispatching the batches in order
+    then leaves only cheap batches for the end of the link.
+    """
+    batches = []
+    batch = []
+    batch_cost = 0
+    for cost, item in sorted(zip(costs, items), key=lambda pair: pair[0], reverse=True):
+        if batch and (batch_cost + cost > target_cost or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch = []
+            batch_cost = 0
+        batch.append(item)
+        batch_cost += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def estimate_task_cost(execute):
+    """
+    Estimate the cost of a task running `execute` from recent history.
+
+    MCP Client records a single start time for every task in a batch and an
+    end time once the whole batch is done, so what we really know is how long
+    each batch took, how many tasks it held and how many bytes they covered.
+    We fit `seconds = per_task * tasks + per_byte * bytes` to those batches by
+    least squares.
+    """
+    history = (Task.objects
+               .filter(execution=execute, starttime__isnull=False, endtime__isnull=False)
+               .order_by('-createdtime')
+               .values_list('job_id', 'starttime', 'endtime', 'fileuuid')[:HISTORY_TASK_COUNT])
+    history = list(history)
+    if not history:
+        return None
+
+    file_sizes = dict(File.objects
+                      .filter(uuid__in=set(row[3] for row in history if row[3]))
+                      .values_list('uuid', 'size'))
+
+    batches = collections.defaultdict(lambda: [None, 0, 0])
+    for job_id, starttime, endtime, fileuuid in history:
+        batch = batches[(job_id, starttime)]
+        batch[0] = max(batch[0], endtime) if batch[0] else endtime
+        batch[1] += 1
+        batch[2] += file_sizes.get(fileuuid) or 0
+
+    samples = [((endtime - starttime).total_seconds(), tasks, size)
+               for (_, starttime), (endtime, tasks, size) in batches.items()]
+    return fit_task_cost(samples)
+
+
+def fit_task_cost(samples):
+    """
+    Least squares fit of `seconds = per_task * tasks + per_byte * bytes` over
+    a list of (seconds, tasks, bytes) samples.
+
+    Falls back to the mean cost per task when the sizes don't explain the
+    durations (or when there's nothing to tell them apart).
+    """
+    seconds = sum(sample[0] for sample in samples)
+    tasks = sum(sample[1] for sample in samples)
+    mean_cost = TaskCost(per_task=max(seconds, 0) / float(tasks), per_byte=0.0)
+
+    # Normal equations for the two coefficients
+    nn = float(sum(n * n for _, n, _ in samples))
+    nb = float(sum(n * b for _, n, b in samples))
+    bb = float(sum(b * b for _, _, b in samples))
+    tn = float(sum(t * n for t, n, _ in samples))
+    tb = float(sum(t * b for t, _, b in samples))
+
+    # A (near) zero determinant means the task counts and sizes are
+    # proportional to each other, so we can't tell their costs apart.
+    determinant = nn * bb - nb * nb
+    if determinant <= 1e-9 * nn * bb:
+        return mean_cost
+
+    per_task = (tn * bb - tb * nb) / determinant
+    per_byte = (tb * nn - tn * nb) / determinant
+    if per_task < 0 or per_byte < 0:
+        return mean_cost
+
+    return TaskCost(per_task=per_task, per_byte=per_byte)
+
+
+def available_workers(task_name):
+    """
+    Ask gearmand how many MCP Client workers can run `task_name`.
+
+    Returns None if gearmand couldn't tell us.
+    """
+    try:
+        admin_client = gearman.GearmanAdminClient([django_settings.GEARMAN_SERVER])
+        try:
+            for status in admin_client.get_status():
+                if status['task'] == task_name:
+                    return max(int(status['workers']), 1)
+        finally:
+            admin_client.shutdown()
+    except Exception as e:
+        LOGGER.warning('Unable to get worker status from gearmand: %s', e)
+        return None
+
+    # Nobody has registered to run this task (yet).  Assume a single worker
+    # will come along.
+    return 1
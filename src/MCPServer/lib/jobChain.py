@@ -25,7 +25,8 @@ from jobChainLink import jobChainLink
 
 from dicts import ReplacementDict
 
-from main.models import MicroServiceChain, UnitVariable
+from main.models import UnitVariable
+from workflow import get_workflow
 
 # Holds:
 # -UNIT
@@ -62,8 +63,8 @@ class jobChain:
             return None
         self.unit = unit
 
-        chain = MicroServiceChain.objects.get(id=str(chain_id))
-        LOGGER.debug('Chain: %s', chain)
+        chain = get_workflow().chains[str(chain_id)]
+        LOGGER.debug('Chain: %s', chain.description)
 
         if starting_link_id is None:
             starting_link_id = chain.startinglink_id
@@ -35,7 +35,8 @@ from linkTaskManagerUnitVariableLinkPull import linkTaskManagerUnitVariableLinkP
 
 from databaseFunctions import auto_close_db, logJobCreatedSQL, getUTCDate
 
-from main.models import Job, MicroServiceChainLink, MicroServiceChainLinkExitCode
+from main.models import Job
+from workflow import get_workflow
 
 
 LOGGER = logging.getLogger('archivematica.mcp.server')
@@ -66,22 +67,22 @@ class jobChainLink:
 
         # Depending on the path that led to this, jobChainLinkPK may
         # either be a UUID or a MicroServiceChainLink instance
-        if isinstance(jobChainLinkPK, six.string_types):
-            try:
-                link = MicroServiceChainLink.objects.get(id=str(jobChainLinkPK))
-            # This will sometimes return no values
-            except MicroServiceChainLink.DoesNotExist:
-                return
-        else:
-            link = jobChainLinkPK
+        if not isinstance(jobChainLinkPK, six.string_types):
+            jobChainLinkPK = jobChainLinkPK.id
+        self.workflow = get_workflow()
+        link = self.workflow.links.get(jobChainLinkPK)
+        # This will sometimes return no values
+        if link is None:
+            return
+        self.link = link
 
         self.pk = link.id
 
         self.currentTask = link.currenttask_id
         self.defaultNextChainLink = link.defaultnextchainlink_id
-        taskType = link.currenttask.tasktype_id
-        taskTypePKReference = link.currenttask.tasktypepkreference
-        self.description = link.currenttask.description
+        taskType = link.tasktype_id
+        taskTypePKReference = link.tasktypepkreference
+        self.description = link.description
         self.reloadFileList = link.reloadfilelist
         self.defaultExitMessage = link.defaultexitmessage
         self.microserviceGroup = link.microservicegroup
@@ -107,10 +108,7 @@ class jobChainLink:
 
     def getNextChainLinkPK(self, exitCode):
         if exitCode is not None:
-            try:
-                return MicroServiceChainLinkExitCode.objects.get(microservicechainlink_id=str(self.pk), exitcode=str(exitCode)).nextmicroservicechainlink_id
-            except (MicroServiceChainLinkExitCode.DoesNotExist, MicroServiceChainLinkExitCode.MultipleObjectsReturned):
-                return self.defaultNextChainLink
+            return self.workflow.next_link_id(self.link, exitCode)
 
     @log_exceptions
     @auto_close_db
@@ -141,10 +139,7 @@ class jobChainLink:
         """
         status_code = self.defaultExitMessage
         if exitCode is not None:
-            try:
-                status_code = MicroServiceChainLinkExitCode.objects.get(microservicechainlink_id=str(self.pk), exitcode=str(exitCode)).exitmessage
-            except MicroServiceChainLinkExitCode.DoesNotExist:
-                pass
+            status_code = self.workflow.exit_message(self.link, exitCode)
         if status_code is not None:
             self.setExitMessage(status_code)
         else:
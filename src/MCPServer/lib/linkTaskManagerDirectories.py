@@ -25,7 +25,7 @@ import os
 
 import archivematicaFunctions
 from dicts import ReplacementDict
-from main.models import StandardTaskConfig
+from workflow import get_workflow
 
 from taskGroupRunner import TaskGroupRunner
 
@@ -33,7 +33,7 @@ from taskGroupRunner import TaskGroupRunner
 class linkTaskManagerDirectories(LinkTaskManager):
     def __init__(self, jobChainLink, pk, unit):
         super(linkTaskManagerDirectories, self).__init__(jobChainLink, pk, unit)
-        stc = StandardTaskConfig.objects.get(id=str(pk))
+        stc = get_workflow().standard_tasks[str(pk)]
         filterSubDir = stc.filter_subdir
         standardOutputFile = stc.stdout_file
         standardErrorFile = stc.stderr_file
@@ -20,6 +20,7 @@
 # @author Joseph Perry <joseph@artefactual.com>
 
 import ast
+import collections
 import logging
 import os
 import threading
@@ -28,8 +29,10 @@ from django.conf import settings as django_settings
 
 from linkTaskManager import LinkTaskManager
 import archivematicaFunctions
+import batching
 from dicts import ReplacementDict
-from main.models import StandardTaskConfig, UnitVariable
+from main.models import UnitVariable
+from workflow import get_workflow
 
 from taskGroupRunner import TaskGroupRunner
 from taskGroup import TaskGroup
@@ -44,6 +47,12 @@ LOGGER = logging.getLogger('archivematica.mcp.server')
 # throughput.  So the trick is to set it juuuust right.
 BATCH_SIZE = django_settings.BATCH_SIZE
 
+# When enabled, size each TaskGroup from the estimated cost of its tasks
+# instead (see batching.py).  BATCH_SIZE still caps the number of tasks in a
+# group.
+ADAPTIVE_BATCH_SIZING = django_settings.ADAPTIVE_BATCH_SIZING
+ADAPTIVE_BATCH_MIN_SECONDS = django_settings.ADAPTIVE_BATCH_MIN_SECONDS
+
 
 class linkTaskManagerFiles(LinkTaskManager):
     def __init__(self, jobChainLink, pk, unit):
@@ -52,9 +61,10 @@ class linkTaskManagerFiles(LinkTaskManager):
         if jobChainLink.reloadFileList:
             unit.reloadFileList()
 
-        # The list of task groups we'll be executing for this batch of files
+        # The list of task groups we'll be executing for this batch of files,
+        # in the order they'll be submitted
         self.taskGroupsLock = threading.Lock()
-        self.taskGroups = {}
+        self.taskGroups = collections.OrderedDict()
 
         # Zero if every taskGroup executed so far has succeeded.  Otherwise,
         # something greater than zero.
@@ -62,7 +72,7 @@ class linkTaskManagerFiles(LinkTaskManager):
 
         self.clearToNextLink = False
 
-        stc = StandardTaskConfig.objects.get(id=str(pk))
+        stc = get_workflow().standard_tasks[str(pk)]
         # These three may be concatenated/compared with other strings,
         # so they need to be bytestrings here
         filterFileEnd = str(stc.filter_file_end) if stc.filter_file_end else ''
@@ -98,8 +108,7 @@ class linkTaskManagerFiles(LinkTaskManager):
             SIPReplacementDic[key] = archivematicaFunctions.escapeForCommand(value)
         self.taskGroupsLock.acquire()
 
-        currentTaskGroup = None
-
+        fileUnits = []
         for file, fileUnit in unit.fileList.items():
             if filterFileEnd:
                 if not file.endswith(filterFileEnd):
@@ -110,40 +119,49 @@ class linkTaskManagerFiles(LinkTaskManager):
             if filterSubDir:
                 if not file.startswith(unit.pathString + filterSubDir):
                     continue
-
-            standardOutputFile = self.standardOutputFile
-            standardErrorFile = self.standardErrorFile
-            arguments = self.arguments
-
-            # Apply passvar replacement values
-            if self.jobChainLink.passVar is not None:
-                if isinstance(self.jobChainLink.passVar, list):
-                    for passVar in self.jobChainLink.passVar:
-                        if isinstance(passVar, ReplacementDict):
-                            arguments, standardOutputFile, standardErrorFile = passVar.replace(arguments, standardOutputFile, standardErrorFile)
-                elif isinstance(self.jobChainLink.passVar, ReplacementDict):
-                    arguments, standardOutputFile, standardErrorFile = self.jobChainLink.passVar.replace(arguments, standardOutputFile, standardErrorFile)
-
+            fileUnits.append(fileUnit)
+
+        # Build the replacement dicts of all the files we know in one go
+        fileReplacementDics = ReplacementDict.fromunitfiles(
+            unit.unitType, unit.UUID,
+            [fileUnit.UUID for fileUnit in fileUnits if fileUnit.UUID != "None"])
+
+        # Apply passvar replacement values (the same for every file)
+        linkStrings = (self.arguments, self.standardOutputFile, self.standardErrorFile)
+        if self.jobChainLink.passVar is not None:
+            if isinstance(self.jobChainLink.passVar, list):
+                for passVar in self.jobChainLink.passVar:
+                    if isinstance(passVar, ReplacementDict):
+                        linkStrings = passVar.replace(*linkStrings)
+            elif isinstance(self.jobChainLink.passVar, ReplacementDict):
+                linkStrings = self.jobChainLink.passVar.replace(*linkStrings)
+
+        SIPSubstitution = SIPReplacementDic.compile()
+        tasks = []
+
+        for fileUnit in fileUnits:
             # Apply file replacement values
-            commandReplacementDic = fileUnit.getReplacementDic()
+            commandReplacementDic = fileReplacementDics.get(fileUnit.UUID) or fileUnit.getReplacementDic()
             for key, value in commandReplacementDic.items():
                 # Escape values for shell
                 commandReplacementDic[key] = archivematicaFunctions.escapeForCommand(value)
-            arguments, standardOutputFile, standardErrorFile = commandReplacementDic.replace(arguments, standardOutputFile, standardErrorFile)
+            arguments, standardOutputFile, standardErrorFile = commandReplacementDic.replace(*linkStrings)
 
             # Apply unit (SIP/Transfer) replacement values
-            arguments, standardOutputFile, standardErrorFile = SIPReplacementDic.replace(arguments, standardOutputFile, standardErrorFile)
+            arguments, standardOutputFile, standardErrorFile = SIPSubstitution.replace(arguments, standardOutputFile, standardErrorFile)
 
-            if currentTaskGroup is None or currentTaskGroup.count() > BATCH_SIZE:
-                currentTaskGroup = TaskGroup(self, self.execute)
-                self.taskGroups[currentTaskGroup.UUID] = currentTaskGroup
+            tasks.append((fileUnit, arguments, standardOutputFile, standardErrorFile, commandReplacementDic))
 
-            currentTaskGroup.addTask(
-                arguments, standardOutputFile, standardErrorFile,
-                outputLock, commandReplacementDic)
+        for batch in self._batch_tasks(tasks):
+            taskGroup = TaskGroup(self, self.execute)
+            for fileUnit, arguments, standardOutputFile, standardErrorFile, commandReplacementDic in batch:
+                taskGroup.addTask(
+                    arguments, standardOutputFile, standardErrorFile,
+                    outputLock, commandReplacementDic)
+            self.taskGroups[taskGroup.UUID] = taskGroup
 
+        TaskGroup.logTaskGroupsCreatedSQL(self.taskGroups.values())
         for taskGroup in self.taskGroups.values():
-            taskGroup.logTaskCreatedSQL()
             TaskGroupRunner.runTaskGroup(taskGroup, self.taskGroupFinished)
 
         self.clearToNextLink = True
@@ -151,9 +169,22 @@ class linkTaskManagerFiles(LinkTaskManager):
 
         # If the batch of files was empty, we can immediately proceed to the
         # next job in the chain.  Assume a successful status code.
-        if self.taskGroups == {}:
+        if not self.taskGroups:
             self.jobChainLink.linkProcessingComplete(0)
 
+    def _batch_tasks(self, tasks):
+        """Split the tasks for this link into the batches we'll run as TaskGroups."""
+        if ADAPTIVE_BATCH_SIZING:
+            batches = batching.cost_aware_batches(
+                self.execute, tasks,
+                [task[0].size for task in tasks],
+                BATCH_SIZE, ADAPTIVE_BATCH_MIN_SECONDS)
+            if batches is not None:
+                return batches
+
+        # Each TaskGroup takes one more task once it holds BATCH_SIZE of them.
+        return batching.fixed_size_batches(tasks, BATCH_SIZE + 1)
+
     def taskGroupFinished(self, finishedTaskGroup):
         finishedTaskGroup.write_output()
 
@@ -169,7 +200,7 @@ class linkTaskManagerFiles(LinkTaskManager):
             # Shouldn't happen!
             LOGGER.warning('TaskGroup UUID %s not in task list %s', finishedTaskGroup.UUID, self.taskGroups)
 
-        if self.clearToNextLink is True and self.taskGroups == {}:
+        if self.clearToNextLink is True and not self.taskGroups:
             # All TaskGroups have been processed.  Proceed to next job in the chain.
             LOGGER.debug('Proceeding to next link %s', self.jobChainLink.UUID)
             self.jobChainLink.linkProcessingComplete(self.exitCode, self.jobChainLink.passVar)
@@ -27,7 +27,7 @@ import os
 from linkTaskManager import LinkTaskManager
 import archivematicaFunctions
 from dicts import ChoicesDict, ReplacementDict
-from main.models import StandardTaskConfig
+from workflow import get_workflow
 
 from taskGroup import TaskGroup
 from taskGroupRunner import TaskGroupRunner
@@ -38,7 +38,7 @@ LOGGER = logging.getLogger('archivematica.mcp.server')
 class linkTaskManagerGetMicroserviceGeneratedListInStdOut(LinkTaskManager):
     def __init__(self, jobChainLink, pk, unit):
         super(linkTaskManagerGetMicroserviceGeneratedListInStdOut, self).__init__(jobChainLink, pk, unit)
-        stc = StandardTaskConfig.objects.get(id=str(pk))
+        stc = get_workflow().standard_tasks[str(pk)]
         filterSubDir = stc.filter_subdir
         standardOutputFile = stc.stdout_file
         standardErrorFile = stc.stderr_file
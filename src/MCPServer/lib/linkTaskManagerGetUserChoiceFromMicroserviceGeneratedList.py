@@ -29,7 +29,8 @@ from linkTaskManager import LinkTaskManager
 from linkTaskManagerChoice import choicesAvailableForUnits, choicesAvailableForUnitsLock
 
 from dicts import ReplacementDict, ChoicesDict
-from main.models import StandardTaskConfig, UserProfile, Job
+from main.models import UserProfile, Job
+from workflow import get_workflow
 
 from django.conf import settings as django_settings
 
@@ -40,7 +41,7 @@ class linkTaskManagerGetUserChoiceFromMicroserviceGeneratedList(LinkTaskManager)
     def __init__(self, jobChainLink, pk, unit):
         super(linkTaskManagerGetUserChoiceFromMicroserviceGeneratedList, self).__init__(jobChainLink, pk, unit)
         self.choices = []
-        stc = StandardTaskConfig.objects.get(id=str(pk))
+        stc = get_workflow().standard_tasks[str(pk)]
         key = stc.execute
 
         choiceIndex = 0
@@ -31,7 +31,7 @@ from linkTaskManager import LinkTaskManager
 from linkTaskManagerChoice import choicesAvailableForUnits, choicesAvailableForUnitsLock, waitingOnTimer
 
 from dicts import ReplacementDict
-from main.models import DashboardSetting, Job, MicroServiceChainLink, MicroServiceChoiceReplacementDic, StandardTaskConfig, UserProfile
+from main.models import DashboardSetting, Job, MicroServiceChoiceReplacementDic, UserProfile
 from django.conf import settings as django_settings
 
 LOGGER = logging.getLogger('archivematica.mcp.server')
@@ -99,13 +99,11 @@ class linkTaskManagerReplacementDicFromChoice(LinkTaskManager):
 
         The model used (``DashboardSetting``) is a shared model.
         """
+        workflow = self.jobChainLink.workflow
         try:
-            mscl = MicroServiceChainLink.objects.get(id=self.jobChainLink.pk)
-            task_id = mscl.defaultnextchainlink.currenttask.tasktypepkreference
-            stc = StandardTaskConfig.objects.get(id=task_id)
-        except (MicroServiceChainLink.DoesNotExist,
-                StandardTaskConfig.DoesNotExist,
-                AttributeError):
+            next_link = workflow.links[self.jobChainLink.link.defaultnextchainlink_id]
+            stc = workflow.standard_tasks[next_link.tasktypepkreference]
+        except KeyError:
             return
         args = DashboardSetting.objects.get_dict(stc.execute)
         if not args:
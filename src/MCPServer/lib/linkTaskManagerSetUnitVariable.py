@@ -23,7 +23,7 @@ from linkTaskManager import LinkTaskManager
 
 choicesAvailableForUnits = {}
 
-from main.models import TaskConfigSetUnitVariable
+from workflow import get_workflow
 
 
 class linkTaskManagerSetUnitVariable(LinkTaskManager):
@@ -32,7 +32,7 @@ class linkTaskManagerSetUnitVariable(LinkTaskManager):
                                                              pk, unit)
 
         # Look up the variable entry in the workflow data.
-        var = TaskConfigSetUnitVariable.objects.get(id=pk)
+        var = get_workflow().set_unit_variables[pk]
 
         # Update the unit.
         self.unit.setVariable(
@@ -23,7 +23,7 @@ from linkTaskManager import LinkTaskManager
 
 choicesAvailableForUnits = {}
 
-from main.models import TaskConfigUnitVariableLinkPull
+from workflow import get_workflow
 
 
 class linkTaskManagerUnitVariableLinkPull(LinkTaskManager):
@@ -32,19 +32,19 @@ class linkTaskManagerUnitVariableLinkPull(LinkTaskManager):
                                                                   pk, unit)
 
         # Look up the variable entry in the workflow data.
-        var = TaskConfigUnitVariableLinkPull.objects.get(id=pk)
+        var = get_workflow().unit_variable_link_pulls[pk]
 
         # Determine the next link.
-        link = self.unit.getmicroServiceChainLink(
+        link_id = self.unit.getmicroServiceChainLink(
             var.variable,
             var.variablevalue,
-            var.defaultmicroservicechainlink)
+            var.defaultmicroservicechainlink_id)
 
-        if link is None:
+        if link_id is None:
             return
 
         # Mark as complete and continue.
         self.jobChainLink.linkProcessingComplete(
             exitCode=0,
             passVar=self.jobChainLink.passVar,
-            next_link_id=link.id)
+            next_link_id=link_id)
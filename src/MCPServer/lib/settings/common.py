@@ -34,11 +34,18 @@ CONFIG_MAPPING = {
     'rejected_directory': {'section': 'MCPServer', 'option': 'rejectedDirectory', 'type': 'string'},
     'wait_on_auto_approve': {'section': 'MCPServer', 'option': 'waitOnAutoApprove', 'type': 'int'},
     'watch_directory_interval': {'section': 'MCPServer', 'option': 'watchDirectoriesPollInterval', 'type': 'int'},
+    'watch_directory_method': {'section': 'MCPServer', 'option': 'watch_directory_method', 'type': 'string'},
+    'watch_directory_quiescence': {'section': 'MCPServer', 'option': 'watch_directory_quiescence', 'type': 'float'},
     'secret_key': {'section': 'MCPServer', 'option': 'django_secret_key', 'type': 'string'},
     'search_enabled': {'section': 'MCPServer', 'process_function': process_search_enabled},
     'batch_size': {'section': 'MCPServer', 'option': 'batch_size', 'type': 'int'},
+    'adaptive_batch_sizing': {'section': 'MCPServer', 'option': 'adaptive_batch_sizing', 'type': 'boolean'},
+    'adaptive_batch_min_seconds': {'section': 'MCPServer', 'option': 'adaptive_batch_min_seconds', 'type': 'float'},
     'storage_service_client_timeout': {'section': 'MCPServer', 'option': 'storage_service_client_timeout', 'type': 'float'},
     'storage_service_client_quick_timeout': {'section': 'MCPServer', 'option': 'storage_service_client_quick_timeout', 'type': 'float'},
+    'storage_service_client_pool_size': {'section': 'MCPServer', 'option': 'storage_service_client_pool_size', 'type': 'int'},
+    'storage_service_client_retries': {'section': 'MCPServer', 'option': 'storage_service_client_retries', 'type': 'int'},
+    'storage_service_client_cache_ttl': {'section': 'MCPServer', 'option': 'storage_service_client_cache_ttl', 'type': 'float'},
     'prometheus_http_server': {'section': 'MCPServer', 'option': 'prometheus_http_server', 'type': 'string'},
 
     # [Protocol]
@@ -63,12 +70,19 @@ sharedDirectory = /var/archivematica/sharedDirectory/
 processingDirectory = /var/archivematica/sharedDirectory/currentlyProcessing/
 rejectedDirectory = %%sharedPath%%rejected/
 watchDirectoriesPollInterval = 1
+watch_directory_method = auto
+watch_directory_quiescence = 2
 processingXMLFile = processingMCP.xml
 waitOnAutoApprove = 0
 search_enabled = true
 batch_size = 128
+adaptive_batch_sizing = false
+adaptive_batch_min_seconds = 10
 storage_service_client_timeout = 86400
 storage_service_client_quick_timeout = 5
+storage_service_client_pool_size = 10
+storage_service_client_retries = 3
+storage_service_client_cache_ttl = 60
 prometheus_http_server =
 
 [Protocol]
@@ -191,11 +205,18 @@ PROCESSING_XML_FILE = config.get('processing_xml_file')
 GEARMAN_SERVER = config.get('gearman_server')
 WAIT_ON_AUTO_APPROVE = config.get('wait_on_auto_approve')
 WATCH_DIRECTORY_INTERVAL = config.get('watch_directory_interval')
+WATCH_DIRECTORY_METHOD = config.get('watch_directory_method')
+WATCH_DIRECTORY_QUIESCENCE = config.get('watch_directory_quiescence')
 LIMIT_TASK_THREADS = config.get('limit_task_threads')
 SEARCH_ENABLED = config.get('search_enabled')
 BATCH_SIZE = config.get('batch_size')
+ADAPTIVE_BATCH_SIZING = config.get('adaptive_batch_sizing')
+ADAPTIVE_BATCH_MIN_SECONDS = config.get('adaptive_batch_min_seconds')
 STORAGE_SERVICE_CLIENT_TIMEOUT = config.get('storage_service_client_timeout')
 STORAGE_SERVICE_CLIENT_QUICK_TIMEOUT = config.get('storage_service_client_quick_timeout')
+STORAGE_SERVICE_CLIENT_POOL_SIZE = config.get('storage_service_client_pool_size')
+STORAGE_SERVICE_CLIENT_RETRIES = config.get('storage_service_client_retries')
+STORAGE_SERVICE_CLIENT_CACHE_TTL = config.get('storage_service_client_cache_ttl')
 PROMETHEUS_HTTP_SERVER = config.get('prometheus_http_server')
 
 # Apply email settings
@@ -23,9 +23,9 @@
 import threading
 import databaseFunctions
 import uuid
-import cPickle
 import logging
 
+import batch_payload
 from fileOperations import writeToFile
 
 from django.db import transaction
@@ -78,18 +78,29 @@ class TaskGroup():
 
     def logTaskCreatedSQL(self):
         """Log task creation times for this group of tasks."""
-        with self.groupTasksLock:
-            self.finalised = True
-
-            def insertTasks():
-                with transaction.atomic():
-                    for task in self.groupTasks:
-                        databaseFunctions.logTaskCreatedSQL(self.linkTaskManager,
-                                                            task.commandReplacementDic,
-                                                            task.UUID,
-                                                            task.arguments)
+        TaskGroup.logTaskGroupsCreatedSQL([self])
 
-            databaseFunctions.retryOnFailure("Insert tasks", insertTasks)
+    @staticmethod
+    def logTaskGroupsCreatedSQL(task_groups):
+        """
+        Log task creation times for every task of `task_groups` (typically all
+        the groups of one link), using bulk INSERTs in a single transaction.
+        """
+        tasks = []
+        for task_group in task_groups:
+            with task_group.groupTasksLock:
+                task_group.finalised = True
+                tasks.extend((task_group.linkTaskManager,
+                              task.commandReplacementDic,
+                              task.UUID,
+                              task.arguments)
+                             for task in task_group.groupTasks)
+
+        def insertTasks():
+            with transaction.atomic():
+                databaseFunctions.logTasksCreatedSQL(tasks)
+
+        databaseFunctions.retryOnFailure("Insert tasks", insertTasks)
 
     def calculateExitCode(self):
         """
@@ -108,18 +119,9 @@ class TaskGroup():
         """
         Serialize this TaskGroup into something suitable for MCP Client.
         """
-        result = {'tasks': {}}
-
-        for task in self.groupTasks:
-            task_data = {}
-            task_data["uuid"] = task.UUID
-            task_data["createdDate"] = timezone.now().isoformat(' ')
-            task_data["arguments"] = task.arguments
-            task_data["wants_output"] = task.wants_output
-
-            result['tasks'][task.UUID] = task_data
-
-        return cPickle.dumps(result)
+        return batch_payload.encode_batch(
+            [(task.UUID, task.arguments, task.wants_output) for task in self.groupTasks],
+            timezone.now().isoformat(' '))
 
     def write_output(self):
         """
@@ -7,8 +7,9 @@ The big idea:
     callback.  This call returns immediately.
 
   * Behind the scenes, TaskGroupRunner runs a background thread that takes care
-    of scheduling task groups to be run and tracking the status of currently
-    executing Gearman requests.  As jobs finish, their callbacks are fired.
+    of scheduling task groups to be run and listening for gearmand to report
+    back on currently executing Gearman requests.  As jobs finish, their
+    callbacks are fired.
 """
 
 # This file is part of Archivematica.
@@ -33,7 +34,7 @@ The big idea:
 
 import threading
 import gearman
-import cPickle
+from gearman.client_handler import GearmanClientCommandHandler
 import logging
 from multiprocessing.pool import ThreadPool
 import time
@@ -44,12 +45,89 @@ import math
 from django.conf import settings as django_settings
 from prometheus_client import Gauge
 
+import batch_payload
+
 LOGGER = logging.getLogger('archivematica.mcp.server')
 
 
+class _CompletionTrackingCommandHandler(GearmanClientCommandHandler):
+    """
+    Client command handler that reports job requests to its connection manager
+    as soon as gearmand pushes their final state down the connection.
+
+    Gearman already sends WORK_COMPLETE/WORK_FAIL packets to the client that
+    submitted a (foreground) job, so there's no need to ask for the status of
+    each job: we only need to notice those packets as they arrive.
+    """
+
+    def _request_finished(self, job_handle, recv_fn, *args):
+        current_request = self.handle_to_request_map.get(job_handle)
+        result = recv_fn(job_handle, *args)
+        if current_request is not None:
+            self.connection_manager.request_finished(current_request)
+        return result
+
+    def recv_work_complete(self, job_handle, data):
+        return self._request_finished(
+            job_handle,
+            super(_CompletionTrackingCommandHandler, self).recv_work_complete,
+            data)
+
+    def recv_work_fail(self, job_handle):
+        return self._request_finished(
+            job_handle,
+            super(_CompletionTrackingCommandHandler, self).recv_work_fail)
+
+    def on_io_error(self):
+        # Requests that were in flight on a dead connection will never hear
+        # back from gearmand.  They're marked JOB_UNKNOWN by our parent, and we
+        # report them as finished so their task groups fail instead of hanging.
+        lost_requests = list(self.requests_awaiting_handles) + list(self.handle_to_request_map.values())
+        super(_CompletionTrackingCommandHandler, self).on_io_error()
+        for current_request in lost_requests:
+            self.connection_manager.request_finished(current_request)
+
+
+class _CompletionTrackingClient(gearman.GearmanClient):
+    """
+    GearmanClient that collects finished job requests as they're pushed to us.
+    """
+    command_handler_class = _CompletionTrackingCommandHandler
+
+    def __init__(self, *args, **kwargs):
+        super(_CompletionTrackingClient, self).__init__(*args, **kwargs)
+        self.finished_requests = []
+
+    def request_finished(self, current_request):
+        self.finished_requests.append(current_request)
+
+    def pop_finished_requests(self):
+        finished_requests = self.finished_requests
+        self.finished_requests = []
+        return finished_requests
+
+    def wait_for_finished_requests(self, timeout, stop_waiting=lambda: False):
+        """
+        Block until gearmand reports at least one finished job request, until
+        `stop_waiting` returns True, or until `timeout` seconds have elapsed.
+        """
+        connections = [connection for connection in self.connection_list if connection.connected]
+        if not connections:
+            time.sleep(timeout)
+            return
+
+        def continue_polling(any_activity):
+            return not (self.finished_requests or stop_waiting())
+
+        self.poll_connections_until_stopped(connections, continue_polling, timeout=timeout)
+
+
 class TaskGroupRunner():
 
-    # How often our background thread will wake up and do its thing
+    # The longest our background thread will block waiting for gearmand to
+    # report finished jobs before it wakes up to submit new task groups and
+    # record stats.  Completed jobs are handled as soon as gearmand tells us
+    # about them, so this doesn't delay callbacks.
     POLL_DELAY_SECONDS = 0.2
 
     # The frequency with which we'll log task stats
@@ -99,8 +177,13 @@ class TaskGroupRunner():
         self.pending_task_group_jobs_lock = threading.Lock()
         self.pending_task_group_jobs = []
 
-        # Gearman jobs that are currently waiting on the MCP Client
-        self.running_gearman_jobs = []
+        # Set whenever a TaskGroup is submitted, so an idle event loop can
+        # pick it up straight away.
+        self.pending_task_group_jobs_event = threading.Event()
+
+        # Gearman jobs that are currently waiting on the MCP Client, keyed on
+        # their task group's UUID
+        self.running_gearman_jobs = {}
         self.task_group_jobs_by_uuid = {}
 
         # Track the number of units currently being processed
@@ -125,18 +208,18 @@ class TaskGroupRunner():
         """
         with self.pending_task_group_jobs_lock:
             self.pending_task_group_jobs.append(task_group_job)
+            self.pending_task_group_jobs_event.set()
 
     def _start_polling(self):
         """
-        Start an event loop that will submit TaskGroups to MCP Client and monitor
-        the status of running Gearman jobs.
+        Start an event loop that will submit TaskGroups to MCP Client and wait
+        for gearmand to report back on running Gearman jobs.
         """
         def event_loop():
-            gm_client = gearman.GearmanClient([django_settings.GEARMAN_SERVER])
+            gm_client = _CompletionTrackingClient([django_settings.GEARMAN_SERVER])
 
             while True:
                 try:
-                    time.sleep(TaskGroupRunner.POLL_DELAY_SECONDS)
                     self._poll(gm_client)
                 except Exception as e:
                     LOGGER.error("\n\n*** Uncaught error in event loop: " + str(e) + ": " + str(type(e)))
@@ -160,10 +243,13 @@ class TaskGroupRunner():
 
     def _poll(self, gm_client):
         """
-        Run a single poll loop (get new jobs, monitor running ones).
+        Run a single poll loop (submit new jobs, wait for running ones to
+        finish, handle the ones that did).
         """
         self._submit_pending_task_group_jobs(gm_client)
-        self._monitor_running_jobs(gm_client)
+        self._wait_for_running_jobs(gm_client)
+        self._handle_finished_jobs(gm_client)
+        self._record_stats()
 
     def _submit_pending_task_group_jobs(self, gm_client):
         # Snapshot and clear the current list of pending TaskGroups
@@ -171,6 +257,7 @@ class TaskGroupRunner():
         with self.pending_task_group_jobs_lock:
             pending_task_group_jobs = list(self.pending_task_group_jobs)
             self.pending_task_group_jobs = []
+            self.pending_task_group_jobs_event.clear()
 
         # ... and send them off
         for task_group_job in pending_task_group_jobs:
@@ -192,35 +279,32 @@ class TaskGroupRunner():
                     LOGGER.exception(e)
                     time.sleep(5)
 
-                self.running_gearman_jobs.append(job_request)
-
-    def _monitor_running_jobs(self, gm_client):
-        statuses = []
-        for job in self.running_gearman_jobs:
-            try:
-                status = gm_client.get_job_status(job)
-                statuses.append(status)
-            except KeyError:
-                # There seems to be a race condition here in the Gearman client.
-                # If the job finishes before we get a chance to poll for its
-                # status, a KeyError is thrown.
-                #
-                # Not a huge problem: we can just try again on the next poll.
-                #
-                statuses.append(job)
-
-        finished_jobs = [job for job in statuses if job.complete]
-        still_running_jobs = [job for job in statuses if not job.complete]
-
-        # Record the jobs that are still running.  We do this here (instead of
-        # after dealing with the jobs that have finished) because it ensures we
-        # don't get stuck.  I.e. if processing the first finished job in the
-        # list throws an exception for some reason, we would never progress past
-        # that point.
-        #
-        # By clearing those finished jobs out of `running_gearman_jobs`, we
-        # would just skip over them and keep on trucking.
-        self.running_gearman_jobs = still_running_jobs
+            self.running_gearman_jobs[task_group.UUID] = job_request
+
+    def _wait_for_running_jobs(self, gm_client):
+        """
+        Block until gearmand pushes a finished job to us, or until there's a
+        new TaskGroup to submit (bounded by POLL_DELAY_SECONDS either way).
+        """
+        if not self.running_gearman_jobs:
+            # Nothing in flight, so there's nothing gearmand could tell us.
+            # Sleep until somebody submits a TaskGroup.
+            self.pending_task_group_jobs_event.wait(TaskGroupRunner.POLL_DELAY_SECONDS)
+            return
+
+        gm_client.wait_for_finished_requests(
+            TaskGroupRunner.POLL_DELAY_SECONDS,
+            stop_waiting=self.pending_task_group_jobs_event.is_set)
+
+    def _handle_finished_jobs(self, gm_client):
+        finished_jobs = []
+        for job in gm_client.pop_finished_requests():
+            # Drop the finished jobs from `running_gearman_jobs` before dealing
+            # with them.  That way, if processing the first finished job throws
+            # an exception for some reason, we just skip over it and keep on
+            # trucking instead of getting stuck.
+            if self.running_gearman_jobs.pop(job.gearman_job.unique, None) is not None:
+                finished_jobs.append(job)
 
         # Populate each task's results with what we got back from the MCP Client.
         for finished_job in finished_jobs:
@@ -230,6 +314,7 @@ class TaskGroupRunner():
             task_group_job = self.task_group_jobs_by_uuid.pop(finished_job.gearman_job.unique)
             self.pool.apply_async(self._finish_task_group_job, [task_group_job])
 
+    def _record_stats(self):
         now = time.time()
         if (now - self.last_notification_time) > TaskGroupRunner.NOTIFICATION_INTERVAL_SECONDS:
             LOGGER.debug("%d jobs pending; %d jobs running; %d known task groups",
@@ -246,7 +331,8 @@ class TaskGroupRunner():
 
     def _handle_gearman_response(self, job_request):
         """
-        MCP Client will return a map like:
+        MCP Client will return results (see batch_payload) that decode to a
+        map like:
 
              {'task_results':
                {'task_1_uuid': {'exitCode': 0, 'exitStatus': 'OK', ...}},
@@ -270,7 +356,7 @@ class TaskGroupRunner():
                 LOGGER.debug("Task was: %s", task_group.serialize())
                 return
 
-            job_result = cPickle.loads(job_request.result)
+            job_result = batch_payload.decode_results(job_request.result, django_settings.SHARED_DIRECTORY)
 
             if 'task_results' not in job_result:
                 LOGGER.debug("Expected a map containing 'task_results', but got: %s" % (job_result))
@@ -296,11 +382,11 @@ class TaskGroupRunner():
             msg = ""
 
             if job_request.timed_out:
-                msg = 'Task %s timed out!' % (job_request.unique)
+                msg = 'Task %s timed out!' % (job_request.gearman_job.unique)
             elif job_request.state == gearman.client.JOB_UNKNOWN:
-                msg = 'Task %s connection failed!' % (job_request.unique)
+                msg = 'Task %s connection failed!' % (job_request.gearman_job.unique)
             else:
-                msg = 'Task %s failed!' % (job_request.unique)
+                msg = 'Task %s failed!' % (job_request.gearman_job.unique)
 
             LOGGER.error(msg)
             for task in task_group.tasks():
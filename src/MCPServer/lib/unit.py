@@ -21,6 +21,7 @@
 
 import logging
 import os
+import time
 
 import archivematicaFunctions
 
@@ -32,6 +33,11 @@ from django.conf import settings as django_settings
 
 LOGGER = logging.getLogger('archivematica.mcp.server')
 
+# Changes made to a directory within this many seconds of our listing it may
+# not have moved its modification time on (depending on the filesystem's
+# timestamp resolution), so we don't rely on modification times that recent.
+MTIME_RESOLUTION_SECONDS = 2
+
 
 class unit:
     """A class to inherit from, to over-ride methods, defininging a processing object at the Job level"""
@@ -41,33 +47,44 @@ class unit:
         self.UUID = UUID
 
     def reloadFileList(self):
-        """Match files to their UUID's via their location and the File table's currentLocation"""
-        self.fileList = {}
+        """Match files to their UUID's via their location and the File table's currentLocation
+
+        The directory tree is kept between reloads, and only directories that
+        have been modified since the last one are listed again.
+        """
         # currentPath must be a string to return all filenames as bytestrings,
         # and to safely concatenate with other bytestrings
         currentPath = os.path.join(self.currentPath.replace("%sharedPath%", django_settings.SHARED_DIRECTORY, 1), "").encode('utf-8')
         try:
-            for directory, subDirectories, files in os.walk(currentPath):
-                directory = directory.replace(currentPath, self.pathString, 1)
-                for file_ in files:
+            fileList = {}
+            directoryListings = {}
+            previousListings = getattr(self, '_directoryListings', {})
+            for directory, listing in _listDirectories(currentPath, previousListings):
+                directoryListings[directory] = listing
+                directory = self.pathString + directory
+                for file_ in listing.files:
                     if self.pathString != directory:
                         filePath = os.path.join(directory, file_)
                     else:
                         filePath = directory + file_
-                    self.fileList[filePath] = unitFile(filePath, owningUnit=self)
+                    fileList[filePath] = unitFile(filePath, owningUnit=self)
+            self._directoryListings = directoryListings
 
             if self.unitType == "Transfer":
                 files = File.objects.filter(transfer_id=self.UUID)
             else:
                 files = File.objects.filter(sip_id=self.UUID)
-            for f in files:
-                currentlocation = archivematicaFunctions.unicodeToStr(f.currentlocation)
-                if currentlocation in self.fileList:
-                    self.fileList[currentlocation].UUID = f.uuid
-                    self.fileList[currentlocation].fileGrpUse = f.filegrpuse
+            files = files.values_list('uuid', 'currentlocation', 'filegrpuse', 'size')
+            for uuid, currentlocation, filegrpuse, size in files.iterator():
+                currentlocation = archivematicaFunctions.unicodeToStr(currentlocation)
+                if currentlocation in fileList:
+                    fileList[currentlocation].UUID = uuid
+                    fileList[currentlocation].fileGrpUse = filegrpuse
+                    fileList[currentlocation].size = size
                 else:
                     LOGGER.warning('%s %s has file (%s) %s in the database, but file does not exist in the file system',
-                                   self.unitType, self.UUID, f.uuid, f.currentlocation)
+                                   self.unitType, self.UUID, uuid, currentlocation)
+            self.fileList = fileList
         except Exception:
             LOGGER.exception('Error reloading file list for %s', currentPath)
             exit(1)
@@ -106,13 +123,67 @@ class unit:
     def getmicroServiceChainLink(self, variable, variableValue, defaultMicroServiceChainLink):
         """Attempt to look up next chain link in UnitVariable.
 
-        It returns a MicroServiceChainLink.
+        It returns the id of a MicroServiceChainLink.
         """
         LOGGER.debug('Fetching MicroServiceChainLink for %s (default %s)', variable, defaultMicroServiceChainLink)
         try:
             var = UnitVariable.objects.get(unittype=self.unitType,
                                            unituuid=self.UUID,
                                            variable=variable)
-            return var.microservicechainlink
+            return var.microservicechainlink_id
         except UnitVariable.DoesNotExist:
             return defaultMicroServiceChainLink
+
+
+class _directoryListing(object):
+    """The subdirectories and files of a directory, as of its modification time `mtime`."""
+
+    __slots__ = ('mtime', 'subdirectories', 'files')
+
+    def __init__(self, mtime, subdirectories, files):
+        self.mtime = mtime
+        self.subdirectories = subdirectories
+        self.files = files
+
+
+def _listDirectories(root, previousListings):
+    """
+    Yield (path relative to `root`, _directoryListing) for `root` and every
+    directory under it, the way os.walk would find them.
+
+    `previousListings` are the listings from the last time, by relative path:
+    a directory whose modification time is the same as then isn't listed again.
+    """
+    pending = ['']
+    while pending:
+        directory = pending.pop()
+        path = os.path.join(root, directory)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            continue
+        listing = previousListings.get(directory)
+        if listing is None or listing.mtime != mtime:
+            listing = _listDirectory(path, mtime)
+        yield directory, listing
+        pending.extend(os.path.join(directory, subdirectory) for subdirectory in listing.subdirectories)
+
+
+def _listDirectory(path, mtime):
+    """List `path`, whose modification time is `mtime`."""
+    if time.time() - mtime < MTIME_RESOLUTION_SECONDS:
+        mtime = None
+    subdirectories = []
+    files = []
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return _directoryListing(None, (), ())
+    for name in names:
+        entry = os.path.join(path, name)
+        if not os.path.isdir(entry):
+            files.append(name)
+        elif not os.path.islink(entry):
+            # Like os.walk, we don't follow symlinks to directories
+            subdirectories.append(name)
+    return _directoryListing(mtime, tuple(subdirectories), tuple(files))
@@ -29,15 +29,25 @@ LOGGER = logging.getLogger('archivematica.mcp.server')
 class unitFile(object):
     """For objects representing a File"""
 
-    def __init__(self, currentPath, UUID="None", owningUnit=None):
+    # A unit's file list holds one of these per file, so keep them small.
+    __slots__ = ('currentPath', 'UUID', 'owningUnit', 'fileGrpUse', 'size')
+
+    def __init__(self, currentPath, UUID="None", owningUnit=None, fileGrpUse='None', size=None):
         self.currentPath = currentPath
         self.UUID = UUID
         self.owningUnit = owningUnit
-        self.fileGrpUse = 'None'
-        self.fileList = {currentPath: self}
-        self.pathString = ""
-        if owningUnit:
-            self.pathString = owningUnit.pathString
+        self.fileGrpUse = fileGrpUse
+        self.size = size
+
+    @property
+    def fileList(self):
+        return {self.currentPath: self}
+
+    @property
+    def pathString(self):
+        if self.owningUnit:
+            return self.owningUnit.pathString
+        return ""
 
     def __str__(self):
         return 'unitFile: <UUID: {u.UUID}, path: {u.currentPath}>'.format(u=self)
@@ -19,10 +19,33 @@
 # @subpackage MCPServer
 # @author Joseph Perry <joseph@artefactual.com>
 # @thanks to http://timgolden.me.uk/python/win32_how_do_i/watch_directory_for_changes.html
+"""
+Watch the watched directories for new files and directories to process.
+
+Every watched directory is served by a single dispatcher thread.  Where we
+can, we ask the kernel to tell us about changes (inotify); directories on
+network filesystems (where inotify doesn't see changes made by other machines)
+or on systems without pyinotify are polled every `interval` seconds instead.
+
+A new entry isn't reported until it has finished arriving: something moved
+into a watched directory (a rename, which is how Archivematica hands units from
+one watched directory to the next) is complete straight away, but anything else
+has to stay unchanged for `quiescence` seconds first, so that a transfer that
+is still being copied in isn't picked up half-way.  Polling can't tell a rename
+from a copy, so there an entry only has to stay unchanged from one poll to the
+next (or for `quiescence` seconds, if that's shorter): a copy still under way
+will have changed by then.
+"""
+
 import logging
 import os
-import time
 import threading
+import time
+
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
 
 from archivematicaFunctions import unicodeToStr
 from databaseFunctions import auto_close_db
@@ -31,6 +54,20 @@ from utils import log_exceptions
 
 LOGGER = logging.getLogger('archivematica.mcp.server')
 
+# Watch methods
+AUTO = 'auto'
+INOTIFY = 'inotify'
+POLL = 'poll'
+
+# Filesystems that can be changed by other machines, which inotify won't
+# notice: directories on these are polled in `auto` mode.
+NETWORK_FILESYSTEMS = ('nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'afs',
+                       'ceph', 'glusterfs', 'lustre', '9p', 'fuse.sshfs',
+                       'fuse.glusterfs', 'fuse.ceph', 'fuse.s3fs')
+
+# Longest the dispatcher sleeps without looking at its watches.
+MAX_WAIT_SECONDS = 1.0
+
 
 class archivematicaWatchDirectory:
     """Watches for new files/directories to process in a watched directory. Directories are defined in the WatchedDirectoriesTable."""
@@ -43,52 +80,103 @@ class archivematicaWatchDirectory:
                  alertOnDirectories=True,
                  alertOnFiles=True,
                  interval=1,
-                 threaded=True):
+                 threaded=True,
+                 method=AUTO,
+                 quiescence=0):
         self.run = False
         self.variablesAdded = variablesAdded
         self.callBackFunctionAdded = callBackFunctionAdded
         self.variablesRemoved = variablesRemoved
         self.callBackFunctionRemoved = callBackFunctionRemoved
-        self.directory = directory
+        self.directory = unicodeToStr(directory)
         self.alertOnDirectories = alertOnDirectories
         self.alertOnFiles = alertOnFiles
         self.interval = interval
+        self.quiescence = quiescence
+        self.method = _choose_method(self.directory, method)
 
         if not os.path.isdir(directory):
             os.makedirs(directory, mode=770)
 
+        # Entries we've seen, and those we've seen arrive but that haven't
+        # finished arriving: {name: (signature, unchanged_since)}
+        self.entries = set(os.listdir(self.directory))
+        self.arriving = {}
+        self.next_poll = time.time() + self.interval
+        # Whether to list our directory once more, for what arrived before
+        # our inotify watch was added
+        self.catch_up = False
+
         if threaded:
-            t = threading.Thread(target=self.start)
-            t.daemon = True
-            t.start()
+            WatchDispatcher.get().add(self)
         else:
-            self.start()
+            dispatcher = WatchDispatcher()
+            dispatcher.add(self)
+            dispatcher.start()
 
-    @log_exceptions
-    @auto_close_db
     def start(self):
-        """Based on polling example: http://timgolden.me.uk/python/win32_how_do_i/watch_directory_for_changes.html"""
         self.run = True
-        LOGGER.info('Watching directory %s (Files: %s)', self.directory, self.alertOnFiles)
-        before = dict([(f, None) for f in os.listdir(self.directory)])
-        while self.run:
-            time.sleep(self.interval)
-            after = dict([(f, None) for f in os.listdir(self.directory)])
-            added = [f for f in after if f not in before]
-            removed = [f for f in before if f not in after]
-            if added:
-                LOGGER.debug('Added %s', added)
-                for i in added:
-                    i = unicodeToStr(i)
-                    directory = unicodeToStr(self.directory)
-                    self.event(os.path.join(directory, i), self.variablesAdded, self.callBackFunctionAdded)
-            if removed:
-                LOGGER.debug('Removed %s', removed)
-                for i in removed:
-                    i = unicodeToStr(i)
-                    directory = unicodeToStr(self.directory)
-                    self.event(os.path.join(directory, i), self.variablesRemoved, self.callBackFunctionRemoved)
-            before = after
+        LOGGER.info('Watching directory %s (Files: %s, method: %s)', self.directory, self.alertOnFiles, self.method)
+
+    def poll(self, now):
+        """List our directory for changes (polling method)."""
+        self.next_poll = now + self.interval
+        after = set(os.listdir(self.directory))
+        added = after - self.entries
+        removed = self.entries - after
+        if added:
+            LOGGER.debug('Added %s', list(added))
+            for name in added:
+                self.arrived(name, now)
+        if removed:
+            LOGGER.debug('Removed %s', list(removed))
+            for name in removed:
+                self.removed(name)
+
+    def arrived(self, name, now, complete=False):
+        """`name` appeared in our directory (and is `complete` if moved in)."""
+        if name in self.entries and name not in self.arriving:
+            # Already reported: a poll saw it before its inotify event came
+            return
+        self.entries.add(name)
+        if complete or not self.quiescence:
+            self.arriving.pop(name, None)
+            self.event_added(name)
+        elif self.method == POLL:
+            # Anything moved in will look the same at our next poll
+            self.arriving[name] = (_tree_signature(os.path.join(self.directory, unicodeToStr(name))), now)
+        else:
+            self.arriving[name] = (None, now)
+
+    def removed(self, name):
+        self.entries.discard(name)
+        self.arriving.pop(name, None)
+        self.event(os.path.join(self.directory, unicodeToStr(name)), self.variablesRemoved, self.callBackFunctionRemoved)
+
+    def settle_time(self):
+        """How long an arriving entry has to stay unchanged."""
+        if self.method == POLL:
+            return min(self.interval, self.quiescence)
+        return self.quiescence
+
+    def check_arriving(self, now):
+        """Report the arriving entries that have stopped changing."""
+        settle_time = self.settle_time()
+        for name, (signature, since) in list(self.arriving.items()):
+            if now - since < settle_time and signature is not None:
+                continue
+            current = _tree_signature(os.path.join(self.directory, unicodeToStr(name)))
+            if current is None:
+                # Gone again
+                del self.arriving[name]
+            elif current == signature and now - since >= settle_time:
+                del self.arriving[name]
+                self.event_added(name)
+            elif current != signature:
+                self.arriving[name] = (current, now)
+
+    def event_added(self, name):
+        self.event(os.path.join(self.directory, unicodeToStr(name)), self.variablesAdded, self.callBackFunctionAdded)
 
     def event(self, path, variables, function):
         if not function:
@@ -98,5 +186,175 @@ class archivematicaWatchDirectory:
         if os.path.isfile(path) and self.alertOnFiles:
             function(path, variables)
 
+    def next_deadline(self):
+        """When we next need the dispatcher's attention, if ever."""
+        if self.catch_up:
+            return time.time()
+        deadlines = []
+        if self.method == POLL:
+            deadlines.append(self.next_poll)
+        if self.arriving:
+            deadlines.append(min(since for _, since in self.arriving.values()) + self.settle_time())
+        return min(deadlines) if deadlines else None
+
     def stop(self):
         self.run = False
+
+
+class WatchDispatcher(object):
+    """Runs every watched directory from one thread."""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.watches = []
+        self.watches_by_descriptor = {}
+        self.watch_manager = None
+        self.notifier = None
+        if pyinotify is not None:
+            self.watch_manager = pyinotify.WatchManager()
+            self.notifier = pyinotify.Notifier(self.watch_manager, self._process_inotify_event)
+
+    @classmethod
+    def get(cls):
+        """The dispatcher shared by all threaded watches, started on first use."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                thread = threading.Thread(target=cls._instance.start, name='watchDirectory')
+                thread.daemon = True
+                thread.start()
+            return cls._instance
+
+    def add(self, watch):
+        if watch.method == INOTIFY:
+            mask = (pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO |
+                    pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM)
+            descriptor = self.watch_manager.add_watch(watch.directory, mask).get(watch.directory, -1)
+            if descriptor < 0:
+                LOGGER.warning('Unable to watch %s with inotify, polling it instead', watch.directory)
+                watch.method = POLL
+            else:
+                self.watches_by_descriptor[descriptor] = watch
+                # The watch only sees what arrives from now on, so what
+                # arrived since we listed the directory is caught up on from
+                # the dispatcher thread, which handles the inotify events too
+                watch.catch_up = True
+        with self.lock:
+            self.watches.append(watch)
+        watch.start()
+
+    @log_exceptions
+    @auto_close_db
+    def start(self):
+        while True:
+            with self.lock:
+                watches = [watch for watch in self.watches if watch.run]
+
+            now = time.time()
+            deadlines = [deadline for deadline in (watch.next_deadline() for watch in watches)
+                         if deadline is not None]
+            wait = min([MAX_WAIT_SECONDS] + [max(deadline - now, 0) for deadline in deadlines])
+            self._wait(wait)
+
+            now = time.time()
+            for watch in watches:
+                try:
+                    if watch.catch_up or (watch.method == POLL and now >= watch.next_poll):
+                        watch.catch_up = False
+                        watch.poll(now)
+                    if watch.arriving:
+                        watch.check_arriving(now)
+                except Exception:
+                    LOGGER.exception('Error watching directory %s', watch.directory)
+
+    def _wait(self, seconds):
+        """Wait up to `seconds`, handling any inotify events that come in."""
+        if self.notifier is None or not self.watches_by_descriptor:
+            time.sleep(seconds)
+            return
+        if self.notifier.check_events(timeout=int(seconds * 1000)):
+            self.notifier.read_events()
+            self.notifier.process_events()
+
+    def _process_inotify_event(self, event):
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            # We've missed events: fall back to listing our directories
+            LOGGER.warning('inotify event queue overflowed, rescanning watched directories')
+            for watch in self.watches_by_descriptor.values():
+                watch.poll(time.time())
+            return
+
+        watch = self.watches_by_descriptor.get(event.wd)
+        if watch is None or not watch.run:
+            return
+
+        try:
+            if event.mask & (pyinotify.IN_CREATE | pyinotify.IN_MOVED_TO):
+                LOGGER.debug('Added %s', event.name)
+                watch.arrived(event.name, time.time(), complete=bool(event.mask & pyinotify.IN_MOVED_TO))
+            elif event.mask & (pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM):
+                LOGGER.debug('Removed %s', event.name)
+                watch.removed(event.name)
+        except Exception:
+            LOGGER.exception('Error watching directory %s', watch.directory)
+
+
+def _choose_method(directory, method):
+    """Decide how to watch `directory`, given the configured `method`."""
+    if method == POLL:
+        return POLL
+    if pyinotify is None:
+        if method == INOTIFY:
+            LOGGER.warning('pyinotify is not installed, polling %s instead', directory)
+        return POLL
+    if method == AUTO and _filesystem_type(directory) in NETWORK_FILESYSTEMS:
+        return POLL
+    return INOTIFY
+
+
+def _filesystem_type(path, mounts_file='/proc/mounts'):
+    """The type of the filesystem `path` is on, or None if we can't tell."""
+    path = os.path.realpath(path)
+    best_mount_point, best_type = '', None
+    try:
+        with open(mounts_file) as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Spaces and the like in mount points are octal escaped
+                mount_point = fields[1].decode('string_escape')
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and \
+                        len(mount_point) > len(best_mount_point):
+                    best_mount_point, best_type = mount_point, fields[2]
+    except IOError:
+        return None
+    return best_type
+
+
+def _tree_signature(path):
+    """
+    Something that changes whenever anything under `path` does: the number of
+    entries, their total size and the latest modification time.
+
+    Returns None if `path` no longer exists.
+    """
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        return None
+    count, size, mtime = 1, stat.st_size, stat.st_mtime
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in dirnames + filenames:
+                try:
+                    stat = os.lstat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                count += 1
+                size += stat.st_size
+                mtime = max(mtime, stat.st_mtime)
+    return (count, size, mtime)
@@ -0,0 +1,165 @@
+"""In-memory copy of the workflow that MCPServer moves units through.
+
+The workflow (chains, their links, the links' exit codes and the task configs
+they run) only changes with database migrations, yet moving a unit from one
+link to the next used to look every one of those up again.  Instead, we load
+the whole graph at startup into immutable namedtuples, and the job chains and
+link task managers read it from here without making any queries.
+
+The graph is replaced as a whole when it's reloaded (``reload_workflow``, run
+by the ``reloadWorkflow`` RPC task), so code that holds on to a link keeps
+seeing a consistent view of it.
+"""
+
+# This file is part of Archivematica.
+#
+# Copyright 2010-2018 Artefactual Systems Inc. <http://artefactual.com>
+#
+# Archivematica is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Archivematica is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Archivematica.  If not, see <http://www.gnu.org/licenses/>.
+
+# @package Archivematica
+# @subpackage MCPServer
+
+import collections
+import logging
+import threading
+
+from main.models import (
+    MicroServiceChain,
+    MicroServiceChainLink,
+    MicroServiceChainLinkExitCode,
+    StandardTaskConfig,
+    TaskConfigSetUnitVariable,
+    TaskConfigUnitVariableLinkPull,
+)
+
+LOGGER = logging.getLogger('archivematica.mcp.server')
+
+# Field names follow the models they're loaded from, so they can be used in
+# place of model instances.
+Chain = collections.namedtuple('Chain', [
+    'id', 'startinglink_id', 'description'])
+
+# A MicroServiceChainLink together with its TaskConfig.  `exit_codes` maps
+# each exit code to the tuple of ExitCodes configured for it.
+Link = collections.namedtuple('Link', [
+    'id', 'currenttask_id', 'tasktype_id', 'tasktypepkreference',
+    'description', 'defaultnextchainlink_id', 'microservicegroup',
+    'reloadfilelist', 'defaultexitmessage', 'exit_codes'])
+
+ExitCode = collections.namedtuple('ExitCode', [
+    'exitcode', 'nextmicroservicechainlink_id', 'exitmessage'])
+
+StandardTask = collections.namedtuple('StandardTask', [
+    'id', 'execute', 'arguments', 'filter_subdir', 'filter_file_start',
+    'filter_file_end', 'stdout_file', 'stderr_file'])
+
+SetUnitVariable = collections.namedtuple('SetUnitVariable', [
+    'id', 'variable', 'variablevalue', 'microservicechainlink_id'])
+
+UnitVariableLinkPull = collections.namedtuple('UnitVariableLinkPull', [
+    'id', 'variable', 'variablevalue', 'defaultmicroservicechainlink_id'])
+
+
+class Workflow(object):
+    """
+    The workflow graph, as dicts from primary key to namedtuple.
+
+    Treat it as read only: it's shared by every thread of MCPServer.
+    """
+
+    def __init__(self, chains, links, standard_tasks, set_unit_variables,
+                 unit_variable_link_pulls):
+        self.chains = chains
+        self.links = links
+        self.standard_tasks = standard_tasks
+        self.set_unit_variables = set_unit_variables
+        self.unit_variable_link_pulls = unit_variable_link_pulls
+
+    @classmethod
+    def load(cls):
+        """Load the workflow from the database, with one query per table."""
+        exit_codes = collections.defaultdict(lambda: collections.defaultdict(tuple))
+        for row in MicroServiceChainLinkExitCode.objects.values_list(
+                'microservicechainlink_id', 'exitcode',
+                'nextmicroservicechainlink_id', 'exitmessage'):
+            exit_code = ExitCode(*row[1:])
+            exit_codes[row[0]][exit_code.exitcode] += (exit_code,)
+
+        links = {}
+        for row in MicroServiceChainLink.objects.values_list(
+                'id', 'currenttask_id', 'currenttask__tasktype_id',
+                'currenttask__tasktypepkreference', 'currenttask__description',
+                'defaultnextchainlink_id', 'microservicegroup',
+                'reloadfilelist', 'defaultexitmessage'):
+            links[row[0]] = Link(*row, exit_codes=dict(exit_codes.get(row[0], {})))
+
+        return cls(
+            chains=_load(Chain, MicroServiceChain),
+            links=links,
+            standard_tasks=_load(StandardTask, StandardTaskConfig),
+            set_unit_variables=_load(SetUnitVariable, TaskConfigSetUnitVariable),
+            unit_variable_link_pulls=_load(UnitVariableLinkPull, TaskConfigUnitVariableLinkPull),
+        )
+
+    def next_link_id(self, link, exit_code):
+        """
+        Which link follows `link` when it finishes with `exit_code`.
+
+        Unless exactly one exit code of `link` matches, that's its default
+        next link.
+        """
+        exit_codes = link.exit_codes.get(int(exit_code), ())
+        if len(exit_codes) != 1:
+            return link.defaultnextchainlink_id
+        return exit_codes[0].nextmicroservicechainlink_id
+
+    def exit_message(self, link, exit_code):
+        """The status of a job of `link` that finished with `exit_code`."""
+        exit_codes = link.exit_codes.get(int(exit_code), ())
+        if not exit_codes:
+            return link.defaultexitmessage
+        return exit_codes[0].exitmessage
+
+
+def _load(namedtuple_class, model):
+    """Load every row of `model` into a dict of `namedtuple_class`es by id."""
+    return {row[0]: namedtuple_class(*row)
+            for row in model.objects.values_list(*namedtuple_class._fields)}
+
+
+_workflow = None
+_workflow_lock = threading.Lock()
+
+
+def get_workflow():
+    """Return the current workflow, loading it if we haven't yet."""
+    if _workflow is None:
+        with _workflow_lock:
+            if _workflow is None:
+                _set_workflow(Workflow.load())
+    return _workflow
+
+
+def reload_workflow():
+    """Replace the current workflow with a fresh copy from the database."""
+    workflow = Workflow.load()
+    with _workflow_lock:
+        _set_workflow(workflow)
+
+
+def _set_workflow(workflow):
+    global _workflow
+    _workflow = workflow
+    LOGGER.info('Loaded workflow: %d chains, %d links', len(workflow.chains), len(workflow.links))
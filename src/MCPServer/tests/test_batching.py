@@ -0,0 +1,45 @@
+from batching import TaskCost, fit_task_cost, fixed_size_batches, pack_by_cost
+
+
+def test_fixed_size_batches():
+    assert fixed_size_batches(range(7), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert fixed_size_batches([], 3) == []
+
+
+def test_pack_by_cost_sends_expensive_items_first():
+    items = ['small-1', 'huge', 'small-2', 'big', 'small-3']
+    costs = [1, 100, 1, 40, 1]
+
+    batches = pack_by_cost(items, costs, target_cost=40, max_batch_size=128)
+
+    assert batches[0] == ['huge']
+    assert batches[1] == ['big']
+    assert sorted(batches[2]) == ['small-1', 'small-2', 'small-3']
+
+
+def test_pack_by_cost_respects_max_batch_size():
+    items = range(10)
+    batches = pack_by_cost(items, [0.001] * 10, target_cost=60, max_batch_size=4)
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sorted(sum(batches, [])) == items
+
+
+def test_fit_task_cost_separates_per_task_and_per_byte_costs():
+    # 2s per task, plus 1s per megabyte
+    samples = [
+        (2 * tasks + size / 1e6, tasks, size)
+        for tasks, size in [(10, 5e6), (128, 1e6), (1, 300e6), (50, 80e6)]
+    ]
+
+    cost = fit_task_cost(samples)
+
+    assert abs(cost.per_task - 2) < 1e-6
+    assert abs(cost.per_byte - 1e-6) < 1e-12
+
+
+def test_fit_task_cost_falls_back_to_mean_cost_per_task():
+    # Without any sizes, all we can tell is the average cost of a task
+    samples = [(10, 10, 0), (30, 10, 0)]
+
+    assert fit_task_cost(samples) == TaskCost(per_task=2.0, per_byte=0.0)
@@ -0,0 +1,53 @@
+import cPickle
+
+from gearman.constants import JOB_COMPLETE, JOB_CREATED, JOB_FAILED, JOB_UNKNOWN
+from gearman.job import GearmanJob, GearmanJobRequest
+
+from taskGroupRunner import _CompletionTrackingClient
+
+
+def _client_and_handler():
+    client = _CompletionTrackingClient(['localhost:4730'])
+    handler = client.command_handler_class(connection_manager=client)
+    return client, handler
+
+
+def _in_flight_request(handler, handle):
+    request = GearmanJobRequest(GearmanJob(None, handle, 'task', 'unique-' + handle, 'data'))
+    request.state = JOB_CREATED
+    handler.handle_to_request_map[handle] = request
+    return request
+
+
+def test_work_complete_is_reported_as_it_arrives():
+    client, handler = _client_and_handler()
+    request = _in_flight_request(handler, 'H:1')
+    _in_flight_request(handler, 'H:2')
+
+    handler.recv_work_complete('H:1', cPickle.dumps({'task_results': {}}))
+
+    assert request.state == JOB_COMPLETE
+    assert client.pop_finished_requests() == [request]
+    assert client.pop_finished_requests() == []
+
+
+def test_work_fail_is_reported_as_it_arrives():
+    client, handler = _client_and_handler()
+    request = _in_flight_request(handler, 'H:1')
+
+    handler.recv_work_fail('H:1')
+
+    assert request.state == JOB_FAILED
+    assert client.pop_finished_requests() == [request]
+
+
+def test_lost_connection_reports_in_flight_requests():
+    client, handler = _client_and_handler()
+    first = _in_flight_request(handler, 'H:1')
+    second = _in_flight_request(handler, 'H:2')
+
+    handler.on_io_error()
+
+    finished = client.pop_finished_requests()
+    assert sorted(finished) == sorted([first, second])
+    assert all(request.state == JOB_UNKNOWN for request in finished)
@@ -0,0 +1,47 @@
+import os
+
+import unit
+
+
+def walk(root):
+    return {os.path.relpath(os.path.join(directory, name), root)
+            for directory, _, files in os.walk(root) for name in files}
+
+
+def list_directories(root, previous):
+    listings = dict(unit._listDirectories(root, previous))
+    files = {os.path.join(directory, name)
+             for directory, listing in listings.items() for name in listing.files}
+    return listings, files
+
+
+def test_list_directories_matches_os_walk(tmpdir):
+    tmpdir.join('objects', 'a', 'b').ensure('file.txt')
+    tmpdir.join('objects').ensure('other.txt')
+    tmpdir.ensure('metadata', dir=True)
+    tmpdir.join('logs').mksymlinkto(tmpdir.join('objects'))
+    tmpdir.join('dangling').mksymlinkto(tmpdir.join('missing'))
+    root = os.path.join(str(tmpdir), '')
+
+    _, files = list_directories(root, {})
+
+    assert files == walk(root)
+
+
+def test_list_directories_only_lists_modified_directories(tmpdir, monkeypatch):
+    tmpdir.join('objects', 'a').ensure('file.txt')
+    tmpdir.join('objects', 'b').ensure('file.txt')
+    root = os.path.join(str(tmpdir), '')
+    monkeypatch.setattr(unit, 'MTIME_RESOLUTION_SECONDS', -1)
+    listings, _ = list_directories(root, {})
+
+    listed = []
+    list_directory = unit._listDirectory
+    monkeypatch.setattr(unit, '_listDirectory', lambda path, mtime: listed.append(path) or list_directory(path, mtime))
+    tmpdir.join('objects', 'b').ensure('new.txt')
+    os.utime(str(tmpdir.join('objects', 'b')), (0, 0))
+
+    _, files = list_directories(root, listings)
+
+    assert listed == [str(tmpdir.join('objects', 'b'))]
+    assert files == walk(root)
@@ -0,0 +1,107 @@
+import os
+import threading
+
+import pytest
+
+import watchDirectory
+
+
+def watch(directory, method, quiescence):
+    """Watch `directory`, returning an Event set with the paths it reports."""
+    added = threading.Event()
+    added.paths = []
+
+    def callback(path, variables):
+        added.paths.append(path)
+        added.set()
+
+    watchDirectory.archivematicaWatchDirectory(
+        str(directory),
+        callBackFunctionAdded=callback,
+        interval=0.1,
+        method=method,
+        quiescence=quiescence)
+    return added
+
+
+@pytest.mark.parametrize('method', [watchDirectory.INOTIFY, watchDirectory.POLL])
+def test_reports_new_directory(tmpdir, method):
+    watched = tmpdir.mkdir('watched')
+    added = watch(watched, method, quiescence=0)
+
+    tmpdir.mkdir('transfer').join('file').write('contents')
+    tmpdir.join('transfer').rename(watched.join('transfer'))
+
+    assert added.wait(5)
+    assert added.paths == [str(watched.join('transfer'))]
+
+
+@pytest.mark.skipif(watchDirectory.pyinotify is None, reason='needs pyinotify')
+def test_waits_for_directory_to_finish_arriving(tmpdir):
+    watched = tmpdir.mkdir('watched')
+    added = watch(watched, watchDirectory.INOTIFY, quiescence=0.5)
+
+    transfer = watched.mkdir('transfer')
+    for i in range(3):
+        transfer.join('file-%d' % i).write('contents')
+        assert not added.wait(0.3)
+
+    assert added.wait(5)
+    assert added.paths == [str(transfer)]
+
+
+@pytest.mark.skipif(watchDirectory.pyinotify is None, reason='needs pyinotify')
+def test_reports_directory_arriving_before_inotify_watch(tmpdir, monkeypatch):
+    watched = tmpdir.mkdir('watched')
+    add_watch = watchDirectory.pyinotify.WatchManager.add_watch
+
+    def arrive_then_add_watch(self, *args, **kwargs):
+        tmpdir.mkdir('transfer').rename(watched.join('transfer'))
+        return add_watch(self, *args, **kwargs)
+
+    monkeypatch.setattr(watchDirectory.pyinotify.WatchManager, 'add_watch', arrive_then_add_watch)
+    added = watch(watched, watchDirectory.INOTIFY, quiescence=0)
+
+    assert added.wait(5)
+    assert added.paths == [str(watched.join('transfer'))]
+
+
+def test_polling_reports_moved_directory_before_quiescence(tmpdir):
+    watched = tmpdir.mkdir('watched')
+    added = watch(watched, watchDirectory.POLL, quiescence=10)
+
+    tmpdir.mkdir('transfer').join('file').write('contents')
+    tmpdir.join('transfer').rename(watched.join('transfer'))
+
+    assert added.wait(2)
+    assert added.paths == [str(watched.join('transfer'))]
+
+
+def test_polling_waits_for_directory_to_finish_arriving(tmpdir):
+    watched = tmpdir.mkdir('watched')
+    added = watch(watched, watchDirectory.POLL, quiescence=10)
+
+    transfer = watched.mkdir('transfer')
+    # Changing faster than we poll
+    for i in range(10):
+        transfer.join('file-%d' % i).write('contents')
+        assert not added.wait(0.04)
+
+    assert added.wait(2)
+    assert added.paths == [str(transfer)]
+
+
+def test_filesystem_type(tmpdir):
+    mounts = tmpdir.join('mounts')
+    mounts.write(
+        'rootfs / rootfs rw 0 0\n'
+        'nas:/export /var/archivematica/sharedDirectory nfs4 rw 0 0\n'
+        'nas:/other /var/archivematica/shared\\040directory cifs rw 0 0\n')
+
+    def fstype(path):
+        return watchDirectory._filesystem_type(path, mounts_file=str(mounts))
+
+    assert fstype('/var/archivematica/sharedDirectory/watchedDirectories') == 'nfs4'
+    assert fstype('/var/archivematica/sharedDirectoryOther') == 'rootfs'
+    assert fstype('/var/archivematica/shared directory/x') == 'cifs'
+    assert fstype(os.path.join('/', 'tmp')) == 'rootfs'
@@ -0,0 +1,49 @@
+import pytest
+
+from main.models import (
+    MicroServiceChainLink,
+    MicroServiceChainLinkExitCode,
+    StandardTaskConfig,
+)
+import workflow
+
+
+@pytest.mark.django_db
+def test_load_matches_database():
+    loaded = workflow.Workflow.load()
+
+    assert len(loaded.links) == MicroServiceChainLink.objects.count()
+    assert len(loaded.standard_tasks) == StandardTaskConfig.objects.count()
+
+    for db_link in MicroServiceChainLink.objects.select_related('currenttask'):
+        link = loaded.links[db_link.id]
+        assert link.tasktype_id == db_link.currenttask.tasktype_id
+        assert link.tasktypepkreference == db_link.currenttask.tasktypepkreference
+        assert link.defaultnextchainlink_id == db_link.defaultnextchainlink_id
+
+
+@pytest.mark.django_db
+def test_next_link_and_exit_message_match_database():
+    loaded = workflow.Workflow.load()
+
+    for exit_code in MicroServiceChainLinkExitCode.objects.all():
+        link = loaded.links[exit_code.microservicechainlink_id]
+        matches = MicroServiceChainLinkExitCode.objects.filter(
+            microservicechainlink_id=link.id, exitcode=exit_code.exitcode)
+        if matches.count() == 1:
+            assert loaded.next_link_id(link, exit_code.exitcode) == exit_code.nextmicroservicechainlink_id
+            assert loaded.exit_message(link, exit_code.exitcode) == exit_code.exitmessage
+
+
+def test_unknown_exit_code_uses_link_defaults():
+    link = workflow.Link(
+        id='link', currenttask_id='task', tasktype_id='type',
+        tasktypepkreference=None, description='', defaultnextchainlink_id='next',
+        microservicegroup='', reloadfilelist=True, defaultexitmessage='Failed',
+        exit_codes={0: (workflow.ExitCode(0, 'success', 'Completed successfully'),)})
+    loaded = workflow.Workflow({}, {'link': link}, {}, {}, {})
+
+    assert loaded.next_link_id(link, 0) == 'success'
+    assert loaded.exit_message(link, '0') == 'Completed successfully'
+    assert loaded.next_link_id(link, 1) == 'next'
+    assert loaded.exit_message(link, 1) == 'Failed'
@@ -0,0 +1,131 @@
+#!/usr/bin/env python2
+"""Benchmark ReplacementDict.replace: one str.replace per key vs. a single pass.
+
+Substitutes a file-level ReplacementDict (with the keys frommodel gives it)
+and then a unit-level one into typical task arguments for many files, the
+way linkTaskManagerFiles does, with:
+
+- the loop ReplacementDict.replace used to run (str.replace for each key);
+- ReplacementDict.replace (compiling the dict for every call);
+- the unit-level dict compiled once and reused for every file.
+
+No database is needed.
+
+Usage:
+
+    DJANGO_SETTINGS_MODULE=settings.test \\
+    PYTHONPATH=src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/archivematicaCommon/benchmarks/bench_replacement_dict.py --files 100000
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+import uuid
+
+import django
+django.setup()
+
+from archivematicaFunctions import unicodeToStr
+from dicts import ReplacementDict, setup as setup_dicts
+
+ARGUMENTS = '"%fileUUID%" "%relativeLocation%" "%SIPDirectory%" "%date%" "%taskUUID%" "%fileGrpUse%"'
+STANDARD_OUTPUT = '%SIPLogsDirectory%fileMeta/%fileUUID%.xml'
+
+
+def str_replace_per_key(rd, *strings):
+    """ReplacementDict.replace as it used to be."""
+    ret = []
+    for orig in strings:
+        if orig is not None:
+            orig = unicodeToStr(orig)
+            for key, value in rd.items():
+                orig = orig.replace(key, unicodeToStr(value))
+        ret.append(orig)
+    return ret
+
+
+def unit_dict():
+    sip_uuid = str(uuid.uuid4())
+    sipdir = '/var/archivematica/sharedDirectory/currentlyProcessing/sip-{}/'.format(sip_uuid)
+    rd = ReplacementDict({
+        '%SIPUUID%': sip_uuid,
+        '%SIPName%': 'sip',
+        '%currentPath%': sipdir,
+        '%SIPDirectory%': sipdir,
+        '%SIPDirectoryBasename%': 'sip-' + sip_uuid,
+        '%SIPLogsDirectory%': sipdir + 'logs/',
+        '%SIPObjectsDirectory%': sipdir + 'objects/',
+        '%relativeLocation%': sipdir,
+        '%unitType%': 'SIP',
+    })
+    rd._add_directory_values()
+    return rd
+
+
+def file_dicts(count, sipdir):
+    for i in range(count):
+        rd = ReplacementDict()
+        location = u'{}objects/dir-{}/file-{}.tif'.format(sipdir, i // 1000, i)
+        rd._add_file_values(str(uuid.uuid4()), location, location, 'original', sipdir, sipdir, 'file', True)
+        rd._add_directory_values()
+        yield rd
+
+
+def old(count, sip_rd):
+    for rd in file_dicts(count, sip_rd['%SIPDirectory%']):
+        strings = str_replace_per_key(rd, ARGUMENTS, STANDARD_OUTPUT, None)
+        str_replace_per_key(sip_rd, *strings)
+
+
+def new(count, sip_rd):
+    for rd in file_dicts(count, sip_rd['%SIPDirectory%']):
+        strings = rd.replace(ARGUMENTS, STANDARD_OUTPUT, None)
+        sip_rd.replace(*strings)
+
+
+def new_compiled(count, sip_rd):
+    sip_substitution = sip_rd.compile()
+    for rd in file_dicts(count, sip_rd['%SIPDirectory%']):
+        strings = rd.replace(ARGUMENTS, STANDARD_OUTPUT, None)
+        sip_substitution.replace(*strings)
+
+
+def baseline(count, sip_rd):
+    """Just building the dicts, to subtract from the others."""
+    for rd in file_dicts(count, sip_rd['%SIPDirectory%']):
+        pass
+
+
+def timed(fn, *args):
+    started = time.time()
+    fn(*args)
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup_dicts(
+        shared_directory='/var/archivematica/sharedDirectory/',
+        processing_directory='/var/archivematica/sharedDirectory/currentlyProcessing/',
+        watch_directory='/var/archivematica/sharedDirectory/watchedDirectories/',
+        rejected_directory='/var/archivematica/sharedDirectory/rejected/',
+    )
+    sip_rd = unit_dict()
+
+    overhead = timed(baseline, args.files, sip_rd)
+    print('%d files; %.2fs building dicts not counted' % (args.files, overhead))
+    print('%-32s %10s %14s' % ('method', 'seconds', 'files/s'))
+    for name, fn in (('str.replace per key (old)', old),
+                     ('ReplacementDict.replace', new),
+                     ('unit dict compiled once', new_compiled)):
+        elapsed = max(timed(fn, args.files, sip_rd) - overhead, 1e-6)
+        print('%-32s %10.2f %14.0f' % (name, elapsed, args.files / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python2
+"""Benchmark Storage Service client calls: a session per call vs. pooled sessions.
+
+Starts a stub Storage Service on localhost (with an optional delay per new
+connection, standing in for the TCP and TLS handshakes of a remote one) and
+times the lookups the dashboard makes for a page of AIPs and their
+locations, with:
+
+- a new session for every call, as _storage_api_session used to return;
+- the pooled sessions, without the response cache;
+- the pooled sessions and the response cache, and get_files_info for the
+  page's AIPs instead of a get_file_info call for each.
+
+No database is needed.
+
+Usage:
+
+    DJANGO_SETTINGS_MODULE=settings.test \\
+    PYTHONPATH=src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/archivematicaCommon/benchmarks/bench_storage_service.py --pages 50 --connect-delay-ms 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import BaseHTTPServer
+import json
+import socket
+import SocketServer
+import threading
+import time
+import urlparse
+import uuid
+
+import django
+django.setup()
+from django.conf import settings
+
+import storageService as storage_service
+
+PIPELINE_UUID = str(uuid.uuid4())
+
+
+class StubStorageService(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+    connect_delay = 0
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections alive
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        # Headers are written a line at a time; don't wait on delayed ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.connections += 1
+        time.sleep(self.server.connect_delay)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        params = urlparse.parse_qs(url.query)
+        if url.path.startswith('/api/v2/pipeline/'):
+            payload = {'uuid': PIPELINE_UUID, 'resource_uri': '/api/v2/pipeline/%s/' % PIPELINE_UUID}
+        elif url.path == '/api/v2/location/':
+            payload = {'meta': {'next': None, 'limit': 20},
+                       'objects': [{'uuid': str(uuid.uuid4()), 'purpose': params['purpose'][0]}]}
+        elif url.path == '/api/v2/file/':
+            uuids = params['uuid__in'][0].split(',') if 'uuid__in' in params else params['uuid']
+            payload = {'meta': {'next': None, 'limit': 20},
+                       'objects': [{'uuid': file_uuid, 'status': 'UPLOADED'} for file_uuid in uuids]}
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(payload)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def page_lookups(aip_uuids, batched):
+    """What the dashboard asks for when showing a page of AIPs."""
+    storage_service.get_location(purpose='BL')
+    storage_service.get_location(purpose='AS')
+    if batched:
+        storage_service.get_files_info(aip_uuids)
+    else:
+        for aip_uuid in aip_uuids:
+            storage_service.get_file_info(uuid=aip_uuid)
+
+
+def run(server, pages, aips_per_page, batched):
+    server.connections = 0
+    storage_service.clear_cache()
+    started = time.time()
+    for _ in range(pages):
+        page_lookups([str(uuid.uuid4()) for _ in range(aips_per_page)], batched)
+    return time.time() - started, server.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--aips-per-page', type=int, default=10)
+    parser.add_argument('--connect-delay-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    server = StubStorageService(('127.0.0.1', 0), StubHandler)
+    server.connect_delay = args.connect_delay_ms / 1000.0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    stub_settings = {
+        'dashboard_uuid': PIPELINE_UUID,
+        'storage_service_url': 'http://127.0.0.1:%d/' % server.server_address[1],
+        'storage_service_user': 'test',
+        'storage_service_apikey': 'test',
+    }
+    storage_service.get_setting = lambda name, default=None: stub_settings.get(name, default)
+
+    pooled_session = storage_service._storage_api_session
+    cases = (
+        ('session per call', lambda timeout=settings.STORAGE_SERVICE_CLIENT_QUICK_TIMEOUT:
+            storage_service._new_storage_api_session(timeout), 0, False),
+        ('pooled', pooled_session, 0, False),
+        ('pooled, cached, batched', pooled_session, 60, True),
+    )
+
+    print('%d pages of %d AIPs; %.0fms per new connection' % (args.pages, args.aips_per_page, args.connect_delay_ms))
+    print('%-26s %10s %12s' % ('client', 'seconds', 'connections'))
+    for name, session, cache_ttl, batched in cases:
+        storage_service._storage_api_session = session
+        settings.STORAGE_SERVICE_CLIENT_CACHE_TTL = cache_ttl
+        seconds, connections = run(server, args.pages, args.aips_per_page, batched)
+        print('%-26s %10.2f %12d' % (name, seconds, connections))
+    for session in storage_service._sessions.values():
+        session.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
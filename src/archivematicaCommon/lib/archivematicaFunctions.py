@@ -25,7 +25,6 @@ different Archivematica modules.
 
 from __future__ import print_function
 import collections
-import hashlib
 import locale
 import os
 import pprint
@@ -36,6 +35,7 @@ from django.utils import six
 from lxml import etree
 
 from main.models import DashboardSetting
+import fixity
 from namespaces import NSMAP
 
 
@@ -175,17 +175,13 @@ def get_file_checksum(filename, algorithm='sha256'):
     Perform a checksum on the specified file.
 
     This function reads in files incrementally to avoid memory exhaustion.
-    See: https://stackoverflow.com/a/4213255
+    See fixity.file_checksums to compute several checksums in one read.
 
     :param filename: The path to the file we want to check
     :param algorithm: Which algorithm to use for hashing, e.g. 'md5'
     :return: Returns a checksum string for the specified file.
     """
-    hash_ = hashlib.new(algorithm)
-    with open(filename, 'rb') as file_:
-        for chunk in iter(lambda: file_.read(1024 * hash_.block_size), b''):
-            hash_.update(chunk)
-    return hash_.hexdigest()
+    return fixity.file_checksums(filename, [algorithm])[algorithm]
 
 
 def find_metadata_files(sip_path, filename, only_transfers=False):
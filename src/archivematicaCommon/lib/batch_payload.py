@@ -0,0 +1,227 @@
+"""
+Encode the batches of tasks MCPServer sends MCPClient through Gearman, and
+the results MCPClient sends back.
+
+Both used to be pickled dicts with an entry per task: each task repeated the
+full arguments string (mostly the same paths as the task before it), and the
+results carried every output the server had asked for, however big, through
+gearmand.  A version 2 payload is instead:
+
+    MAGIC + version (one byte) + compression (one byte) + body
+
+where the body is a pickled dict, compressed with zlib when that's worth it.
+
+A batch has the fields its tasks share (their creation date) once, then for
+each task its UUID as 16 bytes, whether it wants its output back, and its
+arguments as a delta from the previous task's: the length of the prefix and
+suffix they have in common, and what's between them.
+
+In results, an output longer than INLINE_OUTPUT_LIMIT is written to a file in
+the shared directory and sent as a reference to that file, which the server
+reads and removes when it decodes the results.
+
+Payloads without MAGIC are the old pickled dicts, which we still decode; the
+client answers a batch in the format it came in.
+"""
+
+from __future__ import absolute_import
+
+import cPickle
+import logging
+import os
+import uuid
+import zlib
+
+from django.utils import six
+
+LOGGER = logging.getLogger('archivematica.common')
+
+MAGIC = 'AMBATCH'
+
+# Pickled dicts, as sent before versioning
+LEGACY_VERSION = 1
+VERSION = 2
+
+NO_COMPRESSION = '\x00'
+ZLIB_COMPRESSION = '\x01'
+
+# Bodies smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+ZLIB_LEVEL = 6
+
+# Outputs longer than this are sent by reference
+INLINE_OUTPUT_LIMIT = 64 * 1024
+
+# Where referenced outputs go, relative to the shared directory
+OUTPUT_DIRECTORY = os.path.join('tmp', 'taskOutput')
+
+
+class PayloadError(Exception):
+    pass
+
+
+def encode_batch(tasks, created_date, version=VERSION):
+    """
+    Encode a batch of `tasks`, each a (UUID, arguments, wants_output) tuple,
+    created at `created_date` (an ISO 8601 string).
+    """
+    if version == LEGACY_VERSION:
+        return cPickle.dumps({'tasks': {
+            task_uuid: {
+                'uuid': task_uuid,
+                'createdDate': created_date,
+                'arguments': arguments,
+                'wants_output': wants_output,
+            } for task_uuid, arguments, wants_output in tasks}})
+
+    encoded_tasks = []
+    previous = ''
+    for task_uuid, arguments, wants_output in tasks:
+        encoded_tasks.append((uuid.UUID(task_uuid).bytes, bool(wants_output)) + _delta(previous, arguments))
+        previous = arguments
+    return _encode({'createdDate': created_date, 'tasks': encoded_tasks})
+
+
+def decode_batch(data):
+    """
+    Decode a batch from `data`, returning its version and a list of tasks as
+    dicts with the keys `uuid`, `createdDate`, `arguments` and `wants_output`.
+    """
+    version, body = _decode(data)
+    if version == LEGACY_VERSION:
+        return version, list(body['tasks'].values())
+
+    tasks = []
+    previous = ''
+    for uuid_bytes, wants_output, prefix_length, suffix_length, middle in body['tasks']:
+        arguments = _undelta(previous, prefix_length, suffix_length, middle)
+        tasks.append({
+            'uuid': str(uuid.UUID(bytes=uuid_bytes)),
+            'createdDate': body['createdDate'],
+            'arguments': arguments,
+            'wants_output': wants_output,
+        })
+        previous = arguments
+    return version, tasks
+
+
+def encode_results(results, shared_directory, version=VERSION):
+    """
+    Encode task `results`, a dict by task UUID of dicts with an `exitCode`
+    and, for tasks that want their output, `stdout` and `stderror`.
+
+    Large outputs are written under `shared_directory` and referenced.
+    """
+    if version == LEGACY_VERSION:
+        return cPickle.dumps({'task_results': results})
+
+    encoded_results = []
+    for task_uuid, result in results.items():
+        encoded_result = [uuid.UUID(task_uuid).bytes, result['exitCode']]
+        if 'stdout' in result or 'stderror' in result:
+            encoded_result.extend([
+                _output_or_reference(result.get('stdout', ''), shared_directory, task_uuid, 'stdout'),
+                _output_or_reference(result.get('stderror', ''), shared_directory, task_uuid, 'stderr'),
+            ])
+        encoded_results.append(tuple(encoded_result))
+    return _encode({'task_results': encoded_results})
+
+
+def decode_results(data, shared_directory):
+    """
+    Decode results encoded by encode_results (of any version), returning
+    ``{'task_results': {task_uuid: result}}``.
+
+    Outputs sent by reference are read from `shared_directory`, and their
+    files removed.
+    """
+    version, body = _decode(data)
+    if version == LEGACY_VERSION:
+        return body
+
+    task_results = {}
+    for encoded_result in body['task_results']:
+        task_uuid = str(uuid.UUID(bytes=encoded_result[0]))
+        result = {'exitCode': encoded_result[1]}
+        if len(encoded_result) > 2:
+            result['stdout'] = _dereference(encoded_result[2], shared_directory)
+            result['stderror'] = _dereference(encoded_result[3], shared_directory)
+        task_results[task_uuid] = result
+    return {'task_results': task_results}
+
+
+def _encode(body):
+    body = cPickle.dumps(body, cPickle.HIGHEST_PROTOCOL)
+    compression = NO_COMPRESSION
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = zlib.compress(body, ZLIB_LEVEL)
+        compression = ZLIB_COMPRESSION
+    return MAGIC + chr(VERSION) + compression + body
+
+
+def _decode(data):
+    """Returns the version and (unpickled) body of the payload `data`."""
+    if not data.startswith(MAGIC):
+        return LEGACY_VERSION, cPickle.loads(data)
+
+    header_length = len(MAGIC) + 2
+    version = ord(data[len(MAGIC)])
+    compression = data[len(MAGIC) + 1]
+    if version != VERSION:
+        raise PayloadError('Unsupported batch payload version %d' % version)
+    body = data[header_length:]
+    if compression == ZLIB_COMPRESSION:
+        body = zlib.decompress(body)
+    elif compression != NO_COMPRESSION:
+        raise PayloadError('Unsupported batch payload compression %r' % compression)
+    return version, cPickle.loads(body)
+
+
+def _delta(previous, current):
+    """Describe `current` by what it shares with the start and end of `previous`."""
+    limit = min(len(previous), len(current))
+    prefix_length = 0
+    while prefix_length < limit and previous[prefix_length] == current[prefix_length]:
+        prefix_length += 1
+    suffix_length = 0
+    limit -= prefix_length
+    while suffix_length < limit and previous[-1 - suffix_length] == current[-1 - suffix_length]:
+        suffix_length += 1
+    return prefix_length, suffix_length, current[prefix_length:len(current) - suffix_length]
+
+
+def _undelta(previous, prefix_length, suffix_length, middle):
+    return previous[:prefix_length] + middle + previous[len(previous) - suffix_length:]
+
+
+def _output_or_reference(output, shared_directory, task_uuid, name):
+    """`output` itself if it's small enough, or else a reference to a file holding it."""
+    if output is None or len(output) <= INLINE_OUTPUT_LIMIT:
+        return output
+    if isinstance(output, six.text_type):
+        output = output.encode('utf-8')
+    relative_path = os.path.join(OUTPUT_DIRECTORY, '%s.%s' % (task_uuid, name))
+    path = os.path.join(shared_directory, relative_path)
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(output)
+    except (IOError, OSError):
+        LOGGER.warning('Unable to write output of task %s to %s, sending it inline', task_uuid, path, exc_info=True)
+        return output
+    return {'reference': relative_path, 'length': len(output)}
+
+
+def _dereference(output, shared_directory):
+    if not isinstance(output, dict):
+        return output
+    path = os.path.join(shared_directory, output['reference'])
+    try:
+        with open(path, 'rb') as f:
+            contents = f.read()
+        os.remove(path)
+    except (IOError, OSError):
+        LOGGER.warning('Unable to read task output from %s', path, exc_info=True)
+        return ''
+    return contents
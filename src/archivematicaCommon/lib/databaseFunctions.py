@@ -20,6 +20,7 @@
 # @author Joseph Perry <joseph@artefactual.com>
 from __future__ import print_function
 
+import collections
 from functools import wraps
 import logging
 import os
@@ -30,7 +31,7 @@ import time
 import uuid
 
 from django.db import close_old_connections
-from django.db.models import Q
+from django.db.models import BigIntegerField, Case, Q, TextField, Value, When
 from django.utils import six, timezone
 from main.models import Agent, Derivation, Event, File, FPCommandOutput, Job, SIP, Task, Transfer, UnitVariable
 
@@ -225,6 +226,22 @@ def insertIntoFPCommandOutput(fileUUID="", fitsXMLString="", ruleUUID=""):
 # user approved?
 # client connected/disconnected.
 
+def _task_fields(taskManager, commandReplacementDic, taskUUID, arguments):
+    """Column values for a new row in the Tasks table (see logTaskCreatedSQL)."""
+    fileUUID = ""
+    if "%fileUUID%" in commandReplacementDic:
+        fileUUID = commandReplacementDic["%fileUUID%"]
+    fileName = os.path.basename(os.path.abspath(commandReplacementDic["%relativeLocation%"]))
+
+    return {'taskuuid': taskUUID,
+            'job_id': taskManager.jobChainLink.UUID,
+            'fileuuid': fileUUID,
+            'filename': fileName,
+            'execution': taskManager.execute,
+            'arguments': arguments,
+            'createdtime': getUTCDate()}
+
+
 def logTaskCreatedSQL(taskManager, commandReplacementDic, taskUUID, arguments):
     """
     Creates a new entry in the Tasks table using the supplied data.
@@ -234,20 +251,88 @@ def logTaskCreatedSQL(taskManager, commandReplacementDic, taskUUID, arguments):
     :param str taskUUID: The UUID to be used for this Task in the database.
     :param str arguments: The arguments to be passed to the command when it is executed, as a string. Can contain replacement variables; see ReplacementDict for supported values.
     """
-    jobUUID = taskManager.jobChainLink.UUID
-    fileUUID = ""
-    if "%fileUUID%" in commandReplacementDic:
-        fileUUID = commandReplacementDic["%fileUUID%"]
-    taskexec = taskManager.execute
-    fileName = os.path.basename(os.path.abspath(commandReplacementDic["%relativeLocation%"]))
+    Task.objects.create(**_task_fields(taskManager, commandReplacementDic, taskUUID, arguments))
+
 
-    Task.objects.create(taskuuid=taskUUID,
-                        job_id=jobUUID,
-                        fileuuid=fileUUID,
-                        filename=fileName,
-                        execution=taskexec,
-                        arguments=arguments,
-                        createdtime=getUTCDate())
+def logTasksCreatedSQL(tasks, batch_size=500):
+    """
+    Creates new entries in the Tasks table for many tasks at once, using
+    multi-row INSERTs of up to `batch_size` rows each.
+
+    :param list tasks: (taskManager, commandReplacementDic, taskUUID, arguments) tuples, with the same meaning as the arguments of logTaskCreatedSQL.
+    :param int batch_size: The maximum number of rows per INSERT statement.
+    """
+    Task.objects.bulk_create([Task(**_task_fields(*task)) for task in tasks],
+                             batch_size=batch_size)
+
+
+# Limits on a single UPDATE statement written by logTaskResultsSQL.  Each task
+# takes seven query parameters (a comparison and a value in each of three CASE
+# expressions, plus the `IN` clause), so this keeps us below SQLite's limit of
+# 999.  Capping the output size keeps us well within MySQL's default
+# max_allowed_packet.
+TASK_RESULTS_PER_UPDATE = 100
+TASK_OUTPUT_BYTES_PER_UPDATE = 1024 * 1024
+
+
+def logTaskResultsSQL(results, endTime=None):
+    """
+    Records the outcome of many tasks in the Tasks table with a handful of
+    UPDATE statements, rather than one per task.
+
+    Tasks whose output isn't recorded are updated with one statement per
+    distinct exit code.  Otherwise each statement sets the exit code and the
+    output of up to TASK_RESULTS_PER_UPDATE tasks using CASE expressions.
+
+    :param list results: (taskUUID, exitCode, stdOut, stdError) tuples. stdOut and stdError are None if the output of the task isn't to be recorded.
+    :param datetime endTime: The time the tasks finished. Defaults to the current date.
+    """
+    if endTime is None:
+        endTime = getUTCDate()
+
+    without_output = collections.defaultdict(list)
+    with_output = []
+    for taskUUID, exitCode, stdOut, stdError in results:
+        if stdOut is None and stdError is None:
+            without_output[exitCode].append(taskUUID)
+        else:
+            with_output.append((taskUUID, exitCode, stdOut or '', stdError or ''))
+
+    for exitCode, taskUUIDs in without_output.items():
+        for i in range(0, len(taskUUIDs), TASK_RESULTS_PER_UPDATE):
+            Task.objects.filter(taskuuid__in=taskUUIDs[i:i + TASK_RESULTS_PER_UPDATE]).update(
+                exitcode=exitCode, endtime=endTime)
+
+    for chunk in _task_results_chunks(with_output):
+        Task.objects.filter(taskuuid__in=[result[0] for result in chunk]).update(
+            exitcode=_case_by_task(chunk, 1, BigIntegerField()),
+            stdout=_case_by_task(chunk, 2, TextField()),
+            stderror=_case_by_task(chunk, 3, TextField()),
+            endtime=endTime)
+
+
+def _task_results_chunks(results):
+    """Split `results` into chunks small enough for a single UPDATE."""
+    chunk = []
+    chunk_bytes = 0
+    for result in results:
+        result_bytes = len(result[2]) + len(result[3])
+        if chunk and (len(chunk) >= TASK_RESULTS_PER_UPDATE or
+                      chunk_bytes + result_bytes > TASK_OUTPUT_BYTES_PER_UPDATE):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(result)
+        chunk_bytes += result_bytes
+    if chunk:
+        yield chunk
+
+
+def _case_by_task(results, index, output_field):
+    """CASE expression picking the `index`th value of each task's result."""
+    return Case(*[When(taskuuid=result[0], then=Value(result[index]))
+                  for result in results],
+                output_field=output_field)
 
 
 def logJobCreatedSQL(job):
@@ -104,8 +104,6 @@ class ReplacementDict(dict):
             except:
                 sip = models.Transfer.objects.get(uuid=sip)
 
-        shared_path = config['shared_directory']
-
         # We still want to set SIP variables, even if no SIP or Transfer
         # was passed in, so try to fetch it from the file
         if file_ and not sip:
@@ -121,64 +119,122 @@ class ReplacementDict(dict):
                 relative_location = sip.currentlocation
             else:
                 relative_location = sip.currentpath
-            if expand_path:
-                sipdir = relative_location.replace('%sharedPath%', shared_path)
-            else:
-                sipdir = relative_location
-
-            rd['%SIPUUID%'] = sip.uuid
-            sip_name = os.path.basename(sipdir.rstrip('/')).replace('-' + sip.uuid, '')
-            rd['%SIPName%'] = sip_name
-            rd['%currentPath%'] = sipdir
-            rd['%SIPDirectory%'] = sipdir
-            rd['%SIPDirectoryBasename%'] = os.path.basename(os.path.abspath(sipdir))
-            rd['%SIPLogsDirectory%'] = os.path.join(sipdir, 'logs', '')
-            rd['%SIPObjectsDirectory%'] = os.path.join(sipdir, 'objects', '')
-            if type_ == 'sip':
-                rd['%relativeLocation%'] = relative_location
-            elif type_ == 'transfer':
-                rd['%transferDirectory%'] = sipdir
-                rd['%relativeLocation%'] = relative_location
+            sipdir = rd._add_sip_values(sip.uuid, relative_location, type_, expand_path)
 
         if file_:
-            rd['%fileUUID%'] = file_.uuid
             try:
                 base_location = file_.sip.currentpath
             except:
                 base_location = file_.transfer.currentlocation
+            rd._add_file_values(file_.uuid, file_.originallocation, file_.currentlocation, file_.filegrpuse,
+                                base_location, sipdir, type_, expand_path)
 
-            if expand_path and sipdir is not None:
-                base_location = base_location.replace('%sharedPath%', shared_path)
-                # If the original location contains non-unicode characters,
-                # using base_location as retrieved from the DB will raise.
-                origin = file_.originallocation.replace('%transferDirectory%', base_location.encode("utf-8"))
-                current_location = file_.currentlocation.replace('%transferDirectory%', base_location)
-                current_location = current_location.replace('%SIPDirectory%', sipdir)
-            else:
-                origin = file_.originallocation
-                current_location = file_.currentlocation
-            rd['%originalLocation%'] = origin
-            rd['%currentLocation%'] = current_location
-            rd['%fileDirectory%'] = os.path.dirname(current_location)
-            rd['%fileGrpUse%'] = file_.filegrpuse
-            if type_ == 'file':
-                rd['%relativeLocation%'] = current_location
-
-            # These synonyms were originally defined by the Normalize microservice
-            rd['%inputFile%'] = current_location
-            rd['%fileFullName%'] = current_location
-            name, ext = os.path.splitext(current_location)
-            rd['%fileName%'] = os.path.basename(name)
-            rd['%fileExtension%'] = ext[1:]
-            rd['%fileExtensionWithDot%'] = ext
-
-        rd['%tmpDirectory%'] = os.path.join(config['shared_directory'], 'tmp', '')
-        rd['%processingDirectory%'] = config['processing_directory']
-        rd['%watchDirectoryPath%'] = config['watch_directory']
-        rd['%rejectedDirectory%'] = config['rejected_directory']
+        rd._add_directory_values()
 
         return rd
 
+    @staticmethod
+    def fromunitfiles(unit_type, unit_uuid, file_uuids, expand_path=True):
+        """
+        Creates the ReplacementDicts that frommodel(type_='file', file_=uuid)
+        would for each of `file_uuids`, which are files of the unit (SIP, DIP
+        or Transfer, as given by `unit_type`) `unit_uuid`.
+
+        Rather than a few queries per file, the unit's files are fetched along
+        with their SIP or Transfer in one query.  Returns a dict of
+        ReplacementDicts by file UUID.
+        """
+        file_uuids = set(file_uuids)
+        if unit_type == 'Transfer':
+            files = models.File.objects.filter(transfer_id=unit_uuid)
+        else:
+            files = models.File.objects.filter(sip_id=unit_uuid)
+        files = files.values_list('uuid', 'originallocation', 'currentlocation', 'filegrpuse',
+                                  'sip_id', 'sip__currentpath', 'transfer__currentlocation')
+
+        rds = {}
+        for uuid, originallocation, currentlocation, filegrpuse, sip_uuid, sip_path, transfer_path in files.iterator():
+            if uuid not in file_uuids:
+                continue
+            rd = ReplacementDict()
+            if sip_uuid is not None and sip_path is not None:
+                sipdir = rd._add_sip_values(sip_uuid, sip_path, 'file', expand_path)
+                base_location = sip_path
+            elif sip_uuid is None and transfer_path is not None:
+                sipdir = None
+                base_location = transfer_path
+            else:
+                # A missing SIP/Transfer or path; leave it to frommodel
+                continue
+            rd._add_file_values(uuid, originallocation, currentlocation, filegrpuse,
+                                base_location, sipdir, 'file', expand_path)
+            rd._add_directory_values()
+            rds[uuid] = rd
+
+        for uuid in file_uuids.difference(rds):
+            rds[uuid] = ReplacementDict.frommodel(type_='file', file_=uuid, expand_path=expand_path)
+
+        return rds
+
+    def _add_sip_values(self, uuid, relative_location, type_, expand_path):
+        """Add the variables of a SIP or Transfer, returning its directory."""
+        if expand_path:
+            sipdir = relative_location.replace('%sharedPath%', config['shared_directory'])
+        else:
+            sipdir = relative_location
+
+        self['%SIPUUID%'] = uuid
+        sip_name = os.path.basename(sipdir.rstrip('/')).replace('-' + uuid, '')
+        self['%SIPName%'] = sip_name
+        self['%currentPath%'] = sipdir
+        self['%SIPDirectory%'] = sipdir
+        self['%SIPDirectoryBasename%'] = os.path.basename(os.path.abspath(sipdir))
+        self['%SIPLogsDirectory%'] = os.path.join(sipdir, 'logs', '')
+        self['%SIPObjectsDirectory%'] = os.path.join(sipdir, 'objects', '')
+        if type_ == 'sip':
+            self['%relativeLocation%'] = relative_location
+        elif type_ == 'transfer':
+            self['%transferDirectory%'] = sipdir
+            self['%relativeLocation%'] = relative_location
+        return sipdir
+
+    def _add_file_values(self, uuid, originallocation, currentlocation, filegrpuse,
+                         base_location, sipdir, type_, expand_path):
+        """Add the variables of a file, in the SIP or Transfer at `base_location`."""
+        self['%fileUUID%'] = uuid
+
+        if expand_path and sipdir is not None:
+            base_location = base_location.replace('%sharedPath%', config['shared_directory'])
+            # If the original location contains non-unicode characters,
+            # using base_location as retrieved from the DB will raise.
+            origin = originallocation.replace('%transferDirectory%', base_location.encode("utf-8"))
+            current_location = currentlocation.replace('%transferDirectory%', base_location)
+            current_location = current_location.replace('%SIPDirectory%', sipdir)
+        else:
+            origin = originallocation
+            current_location = currentlocation
+        self['%originalLocation%'] = origin
+        self['%currentLocation%'] = current_location
+        self['%fileDirectory%'] = os.path.dirname(current_location)
+        self['%fileGrpUse%'] = filegrpuse
+        if type_ == 'file':
+            self['%relativeLocation%'] = current_location
+
+        # These synonyms were originally defined by the Normalize microservice
+        self['%inputFile%'] = current_location
+        self['%fileFullName%'] = current_location
+        name, ext = os.path.splitext(current_location)
+        self['%fileName%'] = os.path.basename(name)
+        self['%fileExtension%'] = ext[1:]
+        self['%fileExtensionWithDot%'] = ext
+
+    def _add_directory_values(self):
+        """Add the variables for Archivematica's directories."""
+        self['%tmpDirectory%'] = os.path.join(config['shared_directory'], 'tmp', '')
+        self['%processingDirectory%'] = config['processing_directory']
+        self['%watchDirectoryPath%'] = config['watch_directory']
+        self['%rejectedDirectory%'] = config['rejected_directory']
+
     def replace(self, *strings):
         """
         Iterates over a set of strings. Any keys in self found within
@@ -202,15 +258,18 @@ class ReplacementDict(dict):
         contains Unicode characters is "%originalLocation%", and Archivematica
         does not use this variable in any place where precise fidelity of the
         original string is required.
+
+        Each string is substituted in a single pass; see Substitution.  To
+        apply the same dict to many strings, compile() it once instead.
         """
-        ret = []
-        for orig in strings:
-            if orig is not None:
-                orig = unicodeToStr(orig)
-                for key, value in self.items():
-                    orig = orig.replace(key, unicodeToStr(value))
-            ret.append(orig)
-        return ret
+        return self.compile().replace(*strings)
+
+    def compile(self):
+        """
+        Returns a Substitution of the current contents of this dict, which
+        can be used to replace them in any number of strings.
+        """
+        return Substitution(self)
 
     def to_gnu_options(self):
         """
@@ -231,6 +290,70 @@ class ReplacementDict(dict):
         return args
 
 
+class Substitution(object):
+    """
+    Replaces the keys of a dict with their values in strings, in one pass
+    over each string.
+
+    Keys are found left to right; where two keys start at the same place,
+    the longer one is used.  The values that are substituted in aren't
+    searched for keys again.
+
+    Keys and values are converted to bytestrings, like the strings given to
+    replace(), which always returns bytestrings.
+    """
+
+    def __init__(self, replacements):
+        # This is done for every file of every link, so it avoids calling
+        # unicodeToStr for each item; values are only converted when used.
+        self.replacements = {}
+        for key, value in replacements.items():
+            if isinstance(key, six.text_type):
+                key = key.encode('utf-8')
+            if key:
+                self.replacements[key] = value
+        self.pattern = _substitution_pattern(frozenset(self.replacements))
+
+    def replace(self, *strings):
+        """Returns a list of `strings` with our keys replaced."""
+        ret = []
+        for orig in strings:
+            if orig is not None:
+                orig = unicodeToStr(orig)
+                if self.pattern is not None:
+                    # The keys found are at the odd indexes
+                    parts = self.pattern.split(orig)
+                    if len(parts) > 1:
+                        parts[1::2] = [unicodeToStr(self.replacements[key]) for key in parts[1::2]]
+                        orig = ''.join(parts)
+            ret.append(orig)
+        return ret
+
+
+# Compiled patterns by the set of keys they match.  There are only a handful
+# of distinct key sets (the same keys are used for every file, say), so this
+# is bounded in practice; it's cleared in case it isn't.
+_substitution_patterns = {}
+_SUBSTITUTION_PATTERNS_MAX = 256
+
+
+def _substitution_pattern(keys):
+    """Returns a regular expression matching (and capturing) any of `keys`."""
+    if not keys:
+        return None
+    try:
+        return _substitution_patterns[keys]
+    except KeyError:
+        pass
+    if len(_substitution_patterns) >= _SUBSTITUTION_PATTERNS_MAX:
+        _substitution_patterns.clear()
+    # Longest first, so that it wins over any key it starts with
+    alternatives = sorted(keys, key=len, reverse=True)
+    pattern = re.compile('(' + '|'.join(re.escape(key) for key in alternatives) + ')')
+    _substitution_patterns[keys] = pattern
+    return pattern
+
+
 class ChoicesDict(ReplacementDict):
     @staticmethod
     def fromstring(s):
@@ -25,6 +25,7 @@ from __future__ import division
 
 import calendar
 import datetime
+import itertools
 import json
 import logging
 import os
@@ -35,21 +36,26 @@ from xml.etree import ElementTree
 
 from django.db.models import Q
 from django.utils.six.moves import xrange
-from main.models import File, Transfer
+from main.models import File, FileFormatVersion, Transfer
 
 # archivematicaCommon
 from archivematicaFunctions import get_dashboard_uuid
+import fswalk
 import namespaces as ns
 import version
 
 from externals import xmltodict
 
-from elasticsearch import Elasticsearch, ImproperlyConfigured
+from elasticsearch import Elasticsearch, ImproperlyConfigured, TransportError, helpers
 
 
 logger = logging.getLogger('archivematica.common')
 
 MAX_QUERY_SIZE = 50000  # TODO Check that this is a reasonable number
+# Hits fetched per shard by each scroll request in scan_results, and how long
+# Elasticsearch keeps a scroll's context between them
+SCROLL_SIZE = 500
+SCROLL_TIMEOUT = '1m'
 MATCH_ALL_QUERY = {
     "query": {
         "match_all": {}
@@ -103,12 +109,22 @@ class TooManyResultsError(ElasticsearchError):
     pass
 
 
+class BulkIndexError(ElasticsearchError):
+    """ Some documents of a bulk_index call could not be indexed. """
+    def __init__(self, errors):
+        super(BulkIndexError, self).__init__('%d document(s) failed to index' % len(errors))
+        self.errors = errors
+
+
 _es_hosts = None
 _es_client = None
 DEFAULT_TIMEOUT = 10
+# Documents per bulk request
+DEFAULT_BULK_CHUNK_SIZE = 500
+_es_bulk_chunk_size = DEFAULT_BULK_CHUNK_SIZE
 
 
-def setup(hosts, timeout=DEFAULT_TIMEOUT):
+def setup(hosts, timeout=DEFAULT_TIMEOUT, bulk_chunk_size=DEFAULT_BULK_CHUNK_SIZE):
     """
     Initialize Elasticsearch client and share it as the attribute _es_client in
     the current module. An additional attribute _es_hosts is defined containing
@@ -116,8 +132,10 @@ def setup(hosts, timeout=DEFAULT_TIMEOUT):
     """
     global _es_hosts
     global _es_client
+    global _es_bulk_chunk_size
 
     _es_hosts = hosts
+    _es_bulk_chunk_size = bulk_chunk_size
     _es_client = Elasticsearch(**{
         'hosts': _es_hosts,
         'timeout': timeout,
@@ -126,7 +144,7 @@ def setup(hosts, timeout=DEFAULT_TIMEOUT):
 
 
 def setup_reading_from_conf(settings):
-    setup(settings.ELASTICSEARCH_SERVER, settings.ELASTICSEARCH_TIMEOUT)
+    setup(settings.ELASTICSEARCH_SERVER, settings.ELASTICSEARCH_TIMEOUT, settings.ELASTICSEARCH_BULK_CHUNK_SIZE)
 
 
 def get_host():
@@ -212,13 +230,32 @@ def create_transfers_index(client):
         raise ElasticsearchError('The transfer index mapping is incorrect. The "transfers" index should be re-created.')
 
 
-def search_all_results(client, body, index=None, doc_type=None, **query_params):
+def search_all_results(client, body, index=None, doc_type=None, source=None, **query_params):
     """
-    Performs client.search with the size set to MAX_QUERY_SIZE.
+    Performs a search and returns every hit, in the shape client.search does.
 
     By default search_raw returns only 10 results.  Since we usually want all
-    results, this is a wrapper that fetches MAX_QUERY_SIZE results and logs a
-    warning if more results were available.
+    results, this is a wrapper that collects all of them from scan_results.
+    Where the hits don't all need to be in memory at once, iterate over
+    scan_results instead.
+    """
+    hits = list(scan_results(client, body, index=index, doc_type=doc_type, source=source, **query_params))
+    return {'hits': {'total': len(hits), 'hits': hits}}
+
+
+def scan_results(client, body, index=None, doc_type=None, source=None, size=SCROLL_SIZE, **query_params):
+    """
+    Iterates over every hit of a search, using the scroll API.
+
+    Hits are fetched `size` per shard at a time, as they're consumed, so
+    memory use doesn't depend on the number of results.  They come in no
+    particular order; sorts and scores only apply with preserve_order=True,
+    which is expensive on large indexes.
+
+    :param list source: Document fields to return in each hit's `_source`,
+        rather than the whole document.
+    :param query_params: Passed to elasticsearch.helpers.scan, and to the
+        initial client.search.
     """
     if isinstance(index, list):
         index = ','.join(index)
@@ -226,17 +263,19 @@ def search_all_results(client, body, index=None, doc_type=None, **query_params):
     if isinstance(doc_type, list):
         doc_type = ','.join(doc_type)
 
-    results = client.search(
-        body=body,
+    if source is not None:
+        query_params['_source'] = ','.join(source)
+
+    query_params.setdefault('scroll', SCROLL_TIMEOUT)
+
+    return helpers.scan(
+        client,
+        query=body,
         index=index,
         doc_type=doc_type,
-        size=MAX_QUERY_SIZE,
+        size=size,
         **query_params)
 
-    if results['hits']['total'] > MAX_QUERY_SIZE:
-        logger.warning('Number of items in backlog (%s) exceeds maximum amount fetched (%s)', results['hits']['total'], MAX_QUERY_SIZE)
-    return results
-
 
 def get_type_mapping(client, index, type):
     return client.indices.get_mapping(index, doc_type=type)[index]['mappings']
@@ -467,6 +506,90 @@ def try_to_index(client, data, index, doc_type, wait_between_tries=10, max_tries
     raise
 
 
+def bulk_index(client, documents, index, doc_type, chunk_size=None, wait_between_tries=10, max_tries=10, printfn=print):
+    """
+    Index `documents` (an iterable of dicts, e.g. a generator) with bulk
+    requests of `chunk_size` documents (by default, as set up), checking the
+    cluster's health once beforehand.
+
+    Like try_to_index, each request is tried up to `max_tries` times: when it
+    fails outright, or for the documents Elasticsearch rejects because it is
+    too busy (status 429).
+
+    Returns the number of documents indexed.  Each document that fails to
+    index is reported with `printfn`; once all the others have been indexed,
+    BulkIndexError is raised with their errors.
+    """
+    if max_tries < 1:
+        raise ValueError("max_tries must be 1 or greater")
+    wait_for_cluster_yellow_status(client)
+    documents = iter(documents)
+    chunk_size = chunk_size or _es_bulk_chunk_size
+    indexed = 0
+    errors = []
+    while True:
+        chunk = list(itertools.islice(documents, chunk_size))
+        if not chunk:
+            break
+        chunk_indexed, chunk_errors = _bulk_index_chunk(
+            client, chunk, index, doc_type, wait_between_tries, max_tries, printfn)
+        indexed += chunk_indexed
+        errors.extend(chunk_errors)
+    if errors:
+        raise BulkIndexError(errors)
+    return indexed
+
+
+def _bulk_index_chunk(client, documents, index, doc_type, wait_between_tries, max_tries, printfn):
+    """
+    Index `documents` with a bulk request, retrying as described in
+    bulk_index.  Returns the number indexed and the errors of the others.
+    """
+    indexed = 0
+    errors = []
+    for attempt in xrange(1, max_tries + 1):
+        actions = [{'_index': index, '_type': doc_type, '_source': document} for document in documents]
+        results = []
+        try:
+            for result in helpers.streaming_bulk(client, actions, chunk_size=len(actions), raise_on_error=False):
+                results.append(result)
+            failure = None
+        except TransportError as e:
+            failure = e
+
+        # The documents the request didn't get to (if it failed) are tried
+        # again along with those that were rejected.
+        retry = documents[len(results):]
+        rejected = []
+        for document, (ok, result) in zip(documents, results):
+            if ok:
+                indexed += 1
+            elif _bulk_result_status(result) == 429 and attempt < max_tries:
+                retry.append(document)
+                rejected.append(result)
+            else:
+                errors.append(result)
+                printfn('ERROR: error trying to index: {}'.format(result), file=sys.stderr)
+
+        if not retry:
+            break
+        if failure is not None and attempt == max_tries:
+            # Reraise the Elasticsearch exception to aid in debugging.
+            raise failure
+        printfn('ERROR: error trying to index {} document(s), retrying: {}'.format(
+            len(retry), failure or rejected[0]), file=sys.stderr)
+        time.sleep(wait_between_tries)
+        documents = retry
+
+    return indexed, errors
+
+
+def _bulk_result_status(result):
+    """The HTTP status of one document's `result` from streaming_bulk."""
+    (item,) = result.values()
+    return item.get('status')
+
+
 def get_aip_data(client, uuid, fields=None):
     search_params = {
         'body': {
@@ -506,7 +629,8 @@ def index_files(client, index, type_, uuid, pathToArchive, identifiers=[], sipNa
             index,
             type_,
             sipName,
-            identifiers=identifiers
+            identifiers=identifiers,
+            printfn=printfn
         )
 
     # Index transfer
@@ -533,7 +657,7 @@ def _extract_transfer_metadata(doc):
             for el in doc.findall("mets:amdSec/mets:sourceMD/mets:mdWrap/mets:xmlData/transfer_metadata", namespaces=ns.NSMAP)]
 
 
-def index_mets_file_metadata(client, uuid, metsFilePath, index, type_, sipName, identifiers=[]):
+def index_mets_file_metadata(client, uuid, metsFilePath, index, type_, sipName, identifiers=[], printfn=print):
     # parse XML
     tree = ElementTree.parse(metsFilePath)
     root = tree.getroot()
@@ -584,9 +708,19 @@ def index_mets_file_metadata(client, uuid, metsFilePath, index, type_, sipName,
     metadata_files = root.findall("mets:fileSec/mets:fileGrp[@USE='metadata']/mets:file", namespaces=ns.NSMAP)
     files = original_files + metadata_files
 
-    # Index AIC METS file if it exists
+    files_indexed = bulk_index(client, _mets_file_documents(root, files, fileData), index, type_, printfn=printfn)
+
+    print('Indexed AIP files and corresponding METS XML.')
+
+    return files_indexed
+
+
+def _mets_file_documents(root, files, fileData):
+    """Yields the document to index for each of the METS `files`."""
     for file_ in files:
-        indexData = fileData.copy()  # Deep copy of dict, not of dict contents
+        indexData = fileData.copy()
+        # Documents are sent in chunks, so each needs its own METS dict
+        indexData['METS'] = fileData['METS'].copy()
 
         # Get file UUID.  If and ADMID exists, look in the amdSec for the UUID,
         # otherwise parse it out of the file ID.
@@ -619,17 +753,7 @@ def index_mets_file_metadata(client, uuid, metsFilePath, index, type_, sipName,
         if fileExtension:
             indexData['fileExtension'] = fileExtension[1:].lower()
 
-        # index data
-        wait_for_cluster_yellow_status(client)
-        try_to_index(client, indexData, index, type_)
-
-        # Reset fileData['METS']['amdSec'], since it is updated in the loop
-        # above. See http://stackoverflow.com/a/3975388 for explanation
-        fileData['METS']['amdSec'] = {}
-
-    print('Indexed AIP files and corresponding METS XML.')
-
-    return len(files)
+        yield indexData
 
 
 # To avoid Elasticsearch schema collisions, if a dict value is itself a
@@ -685,13 +809,15 @@ def normalize_list_dict_elements(data):
     return data
 
 
-def _get_file_formats(f):
-    formats = []
-    fields = ['format_version__pronom_id',
+def _get_file_formats(transfer_uuid):
+    """The formats of the files of a transfer, by file UUID."""
+    formats = {}
+    fields = ['file_uuid_id',
+              'format_version__pronom_id',
               'format_version__description',
               'format_version__format__group__description']
-    for puid, format, group in f.fileformatversion_set.all().values_list(*fields):
-        formats.append({
+    for file_uuid, puid, format, group in FileFormatVersion.objects.filter(file_uuid__transfer_id=transfer_uuid).values_list(*fields):
+        formats.setdefault(file_uuid, []).append({
             'puid': puid,
             'format': format,
             'group': group,
@@ -754,15 +880,6 @@ def index_transfer_files(client, uuid, pathToTransfer, index, type_, status='',
         trailing / but not including objects/
     index, type: index and type in ElasticSearch
     """
-    files_indexed = 0
-    ingest_date = str(datetime.datetime.today())[0:10]
-
-    # Some files should not be indexed
-    # This should match the basename of the file
-    ignore_files = [
-        'processingMCP.xml',
-    ]
-
     # Get accessionId and name from Transfers table using UUID
     try:
         transfer = Transfer.objects.get(uuid=uuid)
@@ -771,24 +888,48 @@ def index_transfer_files(client, uuid, pathToTransfer, index, type_, status='',
     except Transfer.DoesNotExist:
         accession_id = transfer_name = ''
 
+    documents = _transfer_file_documents(uuid, pathToTransfer, transfer_name, accession_id, status, printfn)
+    files_indexed = bulk_index(client, documents, index, type_, printfn=printfn)
+
+    if files_indexed > 0:
+        client.indices.refresh()
+
+    return files_indexed
+
+
+def _transfer_file_documents(uuid, pathToTransfer, transfer_name, accession_id, status, printfn):
+    """Yields the document to index for each file of a transfer."""
+    ingest_date = str(datetime.datetime.today())[0:10]
+
+    # Some files should not be indexed
+    # This should match the basename of the file
+    ignore_files = [
+        'processingMCP.xml',
+    ]
+
     # Get dashboard UUID
     dashboard_uuid = get_dashboard_uuid()
 
-    for filepath in list_files_in_dir(pathToTransfer):
-        if os.path.isfile(filepath):
+    # The transfer's File rows by location, rather than a query per file
+    files = {currentlocation: (file_uuid, modificationtime)
+             for currentlocation, file_uuid, modificationtime
+             in File.objects.filter(transfer_id=uuid).values_list('currentlocation', 'uuid', 'modificationtime').iterator()}
+    formats_by_file = _get_file_formats(uuid)
+
+    for entry in fswalk.iter_files(pathToTransfer):
+        filepath = entry.path
+        if entry.is_file():
             # Get file UUID
             file_uuid = ''
             modification_date = ''
             relative_path = filepath.replace(pathToTransfer, '%transferDirectory%')
-            try:
-                f = File.objects.get(currentlocation=relative_path,
-                                     transfer_id=uuid)
-                file_uuid = f.uuid
-                formats = _get_file_formats(f)
+            if relative_path in files:
+                file_uuid, modification_time = files[relative_path]
+                formats = formats_by_file.get(file_uuid, [])
                 bulk_extractor_reports = _list_bulk_extractor_reports(pathToTransfer, file_uuid)
-                if f.modificationtime is not None:
-                    modification_date = f.modificationtime.strftime('%Y-%m-%d')
-            except File.DoesNotExist:
+                if modification_time is not None:
+                    modification_date = modification_time.strftime('%Y-%m-%d')
+            else:
                 file_uuid = ''
                 formats = []
                 bulk_extractor_reports = []
@@ -798,14 +939,15 @@ def index_transfer_files(client, uuid, pathToTransfer, index, type_, status='',
             file_extension = os.path.splitext(filepath)[1][1:].lower()
             filename = os.path.basename(filepath)
             # Size in megabytes
-            size = os.path.getsize(filepath) / (1024 * 1024)
-            create_time = os.stat(filepath).st_ctime
+            stat = entry.stat()
+            size = stat.st_size / (1024 * 1024)
+            create_time = stat.st_ctime
 
             if filename not in ignore_files:
                 printfn('Indexing {} (UUID: {})'.format(relative_path, file_uuid))
 
                 # TODO Index Backlog Location UUID?
-                indexData = {
+                yield {
                     'filename': filename,
                     'relative_path': relative_path,
                     'fileuuid': file_uuid,
@@ -822,33 +964,9 @@ def index_transfer_files(client, uuid, pathToTransfer, index, type_, status='',
                     'bulk_extractor_reports': bulk_extractor_reports,
                     'format': formats,
                 }
-
-                wait_for_cluster_yellow_status(client)
-                try_to_index(client, indexData, index, type_)
-
-                files_indexed = files_indexed + 1
             else:
                 printfn('Skipping indexing {}'.format(relative_path))
 
-    if files_indexed > 0:
-        client.indices.refresh()
-
-    return files_indexed
-
-
-def list_files_in_dir(path, filepaths=[]):
-    # define entries
-    for file in os.listdir(path):
-        child_path = os.path.join(path, file)
-        filepaths.append(child_path)
-
-        # if entry is a directory, recurse
-        if os.path.isdir(child_path) and os.access(child_path, os.R_OK):
-            list_files_in_dir(child_path, filepaths)
-
-    # return fully traversed data
-    return filepaths
-
 
 def _document_ids_from_field_query(client, index, doc_types, field, value):
     document_ids = []
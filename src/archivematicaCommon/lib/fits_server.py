@@ -0,0 +1,60 @@
+"""
+Characterize files with a long-lived FITS server instead of a JVM per file.
+
+Running FITS for a file starts a JVM and loads all of FITS's tools, which
+takes much longer than examining an ordinary document or image.  The FITS
+Web service (https://github.com/harvard-lts/FITSservlet) keeps them loaded:
+examine asks it to examine a file on a filesystem it shares with the
+MCPClient, over a kept-alive HTTP connection, and returns the FITS XML.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import os
+
+from django.conf import settings
+import requests
+
+LOGGER = logging.getLogger('archivematica.common')
+
+
+class FITSServerError(Exception):
+    """The FITS server couldn't examine a file."""
+
+
+def enabled():
+    """Whether a FITS server is configured."""
+    return bool(getattr(settings, 'FITS_SERVER_URL', None))
+
+
+def examine(path):
+    """
+    The FITS XML for the file at `path`, from the FITS server at
+    settings.FITS_SERVER_URL.
+
+    Raises FITSServerError if the server can't be reached, or doesn't return
+    a successful response.
+    """
+    url = settings.FITS_SERVER_URL.rstrip('/') + '/examine'
+    try:
+        response = _session().get(url, params={'file': path}, timeout=settings.FITS_SERVER_TIMEOUT)
+    except requests.exceptions.RequestException as err:
+        raise FITSServerError('Unable to reach the FITS server at {}: {}'.format(url, err))
+    if response.status_code != requests.codes.ok:
+        raise FITSServerError('The FITS server returned {} for {}: {}'.format(
+            response.status_code, path, response.text[:1000]))
+    return response.content
+
+
+_session_pid = None
+_session_instance = None
+
+
+def _session():
+    # One session, so one kept-alive connection, per process
+    global _session_pid, _session_instance
+    if _session_pid != os.getpid():
+        _session_instance = requests.Session()
+        _session_pid = os.getpid()
+    return _session_instance
@@ -0,0 +1,73 @@
+"""
+Compute file checksums, several algorithms in one read.
+
+file_checksums reads a file once for all the algorithms asked for.
+checksums_of_files does the same for many files, reading them in a pool of
+threads: hashlib and file reads release the GIL.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import logging
+from multiprocessing.pool import ThreadPool
+
+LOGGER = logging.getLogger('archivematica.common')
+
+ALGORITHMS = ('md5', 'sha1', 'sha256', 'sha512')
+
+# A multiple of the page size and of every algorithm's block size
+BUFFER_SIZE = 1024 * 1024
+
+THREADS = 4
+
+
+def file_checksums(path, algorithms=ALGORITHMS):
+    """
+    The checksums of the file at `path` with each of `algorithms`, as
+    {algorithm: hex digest}.
+    """
+    with open(path, 'rb', 0) as file_:
+        return _read_checksums(file_, algorithms)
+
+
+def checksums_of_files(paths, algorithms=ALGORITHMS, threads=THREADS):
+    """
+    The checksums of each of the files at `paths` with each of `algorithms`,
+    as {path: {algorithm: hex digest}}.
+
+    The files are read by `threads` threads.  Files that can't be read are
+    left out.
+    """
+    results = {}
+    pool = ThreadPool(min(threads, len(paths)) or 1)
+    try:
+        for path, checksums in pool.imap_unordered(_checksum_file, [(path, algorithms) for path in paths]):
+            if checksums is not None:
+                results[path] = checksums
+    finally:
+        pool.terminate()
+    return results
+
+
+def _checksum_file(args):
+    path, algorithms = args
+    try:
+        return path, file_checksums(path, algorithms)
+    except (IOError, OSError):
+        LOGGER.warning('Unable to checksum %s', path, exc_info=True)
+        return path, None
+
+
+def _read_checksums(file_, algorithms):
+    hashes = [(algorithm, hashlib.new(algorithm)) for algorithm in algorithms]
+    buffer_ = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer_)
+    while True:
+        length = file_.readinto(buffer_)
+        if not length:
+            break
+        chunk = view[:length]
+        for _, hash_ in hashes:
+            hash_.update(chunk)
+    return {algorithm: hash_.hexdigest() for algorithm, hash_ in hashes}
@@ -0,0 +1,109 @@
+"""
+Identify the formats of many files with one run of an identification tool.
+
+The FPR's identification commands take one file at a time, so Siegfried or
+FIDO load their signatures again for every file.  For the tools that can,
+identify runs them once for many files instead: Siegfried with all the files
+on one command line, FIDO in-process, with its signatures compiled once per
+process.  Only the PRONOM IDs the tool is sure of are returned; any other
+file (unidentified, several matches, errors) is left to the FPR command.
+"""
+
+from __future__ import absolute_import
+
+import json
+import logging
+
+from executeOrRunSubProcess import executeOrRun
+
+LOGGER = logging.getLogger('archivematica.common')
+
+UNKNOWN = 'UNKNOWN'
+
+# Files per Siegfried invocation, to keep command lines short
+SIEGFRIED_BATCH_SIZE = 100
+
+
+def supports(tool):
+    """Whether the files of a batch can be identified together with `tool`,
+    an FPR IDTool's description."""
+    return tool.lower() in _IDENTIFIERS
+
+
+def identify(tool, paths):
+    """
+    Identify the files at `paths` with `tool`, an FPR IDTool's description.
+
+    Returns {path: PRONOM ID} for the files the tool matched to exactly one
+    format.
+    """
+    return _IDENTIFIERS[tool.lower()](paths)
+
+
+def parse_siegfried_json(output):
+    """{filename: PRONOM ID} from the output of `sf -json`."""
+    puids = {}
+    for file_ in json.loads(output).get('files', []):
+        if file_.get('errors'):
+            continue
+        matches = [match.get('id', match.get('puid')) for match in file_.get('matches') or []
+                   if match.get('ns', 'pronom') == 'pronom']
+        if len(matches) == 1 and matches[0] not in (None, UNKNOWN):
+            puids[file_['filename']] = matches[0]
+    return puids
+
+
+def _siegfried_puids(paths):
+    puids = {}
+    for start in range(0, len(paths), SIEGFRIED_BATCH_SIZE):
+        batch = paths[start:start + SIEGFRIED_BATCH_SIZE]
+        _, output, error = executeOrRun('command', ['sf', '-json', '-coe'], arguments=batch,
+                                        printing=False, capture_output=True)
+        try:
+            identified = parse_siegfried_json(output)
+        except (ValueError, AttributeError, KeyError, TypeError):
+            LOGGER.warning('Unable to identify files with Siegfried: %s', error)
+            continue
+        puids.update((path, identified[path]) for path in batch if path in identified)
+    return puids
+
+
+_fido_instance = None
+
+
+def _fido():
+    global _fido_instance
+    if _fido_instance is None:
+        from fido.fido import Fido
+        _fido_instance = Fido(quiet=True)
+    return _fido_instance
+
+
+def _fido_puids(paths):
+    try:
+        fido = _fido()
+    except Exception:
+        LOGGER.warning('Unable to load FIDO', exc_info=True)
+        return {}
+
+    puids = {}
+
+    def handle_matches(fullname, matches, delta_t, matchtype=''):
+        # Extension matches are guesses; leave those files to the FPR command
+        if matchtype in ('signature', 'container') and len(matches) == 1:
+            puids[fullname] = fido.get_puid(matches[0][0])
+
+    fido.handle_matches = handle_matches
+    for path in paths:
+        try:
+            fido.identify_file(path, extension=False)
+        except Exception:
+            LOGGER.warning('Unable to identify %s with FIDO', path, exc_info=True)
+            puids.pop(path, None)
+    return puids
+
+
+_IDENTIFIERS = {
+    'siegfried': _siegfried_puids,
+    'fido': _fido_puids,
+}
@@ -0,0 +1,143 @@
+"""
+A read-through cache of the active FPR, for client scripts.
+
+Client scripts look up ID commands, ID rules, format versions and format
+policy rules for every file they handle, and then follow the rules to their
+commands and tools, although the FPR hardly ever changes.  The first lookup
+in a process loads all of the active FPR, with the related objects the
+scripts use, and later lookups are answered from memory.
+
+The cache is reloaded when the FPR's revision changes: when rows are added to
+its tables, or enabled or disabled, which is how the FPR records every change.
+The revision is checked at most every CHECK_INTERVAL seconds.
+
+The cached objects are shared, so they must not be changed or saved.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import time
+
+from django.db.models import Case, Count, IntegerField, Max, Sum, Value, When
+
+from fpr.models import FormatVersion, FPCommand, FPRule, IDCommand, IDRule
+from main.models import FileFormatVersion
+
+CHECK_INTERVAL = 10
+
+VERSIONED_MODELS = (FormatVersion, IDCommand, IDRule, FPCommand, FPRule)
+
+
+class _FPR(object):
+    """The active FPR, indexed the ways client scripts look it up."""
+
+    def __init__(self, revision):
+        self.revision = revision
+        self.format_versions = {}
+        self.format_versions_by_puid = collections.defaultdict(list)
+        for version in FormatVersion.active.select_related('format').order_by('pk'):
+            self.format_versions[version.uuid] = version
+            if version.pronom_id:
+                self.format_versions_by_puid[version.pronom_id].append(version)
+
+        self.id_commands = {command.uuid: command for command in IDCommand.active.select_related('tool')}
+        self.id_rules = collections.defaultdict(list)
+        for rule in IDRule.active.select_related('format', 'format__format').order_by('pk'):
+            self.id_rules[(rule.command_id, rule.command_output)].append(rule)
+
+        self.rules = collections.defaultdict(list)
+        self.rules_by_purpose = collections.defaultdict(list)
+        for rule in FPRule.active.select_related(
+                'format', 'command', 'command__tool', 'command__output_format',
+                'command__verification_command', 'command__event_detail_command').order_by('pk'):
+            self.rules_by_purpose[rule.purpose].append(rule)
+            self.rules[(rule.purpose, rule.format_id)].append(rule)
+
+
+_fpr = None
+_checked = 0
+
+
+def revision():
+    """A value that changes whenever rows are added to, enabled or disabled
+    in the FPR's tables."""
+    enabled = Sum(Case(When(enabled=True, then=Value(1)), default=Value(0), output_field=IntegerField()))
+    return tuple(
+        tuple(sorted(model.objects.aggregate(count=Count('pk'), last=Max('pk'), enabled=enabled).items()))
+        for model in VERSIONED_MODELS)
+
+
+def clear():
+    """Forget the cached FPR, so it's loaded again on the next lookup."""
+    global _fpr
+    _fpr = None
+
+
+def _get_fpr():
+    global _fpr, _checked
+    now = time.time()
+    if _fpr is None or now - _checked >= CHECK_INTERVAL:
+        current = revision()
+        if _fpr is None or _fpr.revision != current:
+            _fpr = _FPR(current)
+        _checked = now
+    return _fpr
+
+
+def _get(model, objects, description):
+    # Like model.objects.get, for a list of the objects that matched
+    if not objects:
+        raise model.DoesNotExist('{} matching {} does not exist.'.format(model.__name__, description))
+    if len(objects) > 1:
+        raise model.MultipleObjectsReturned('{} {} match {}.'.format(len(objects), model.__name__, description))
+    return objects[0]
+
+
+def id_command(uuid):
+    """The active IDCommand with `uuid`."""
+    command = _get_fpr().id_commands.get(uuid)
+    return _get(IDCommand, [command] if command else [], 'uuid={}'.format(uuid))
+
+
+def id_rule(command_uuid, command_output):
+    """The active IDRule for the output `command_output` of the IDCommand
+    with `command_uuid`."""
+    return _get(IDRule, _get_fpr().id_rules.get((command_uuid, command_output), []),
+                'command={}, command_output={}'.format(command_uuid, command_output))
+
+
+def format_version(uuid):
+    """The active FormatVersion with `uuid`."""
+    version = _get_fpr().format_versions.get(uuid)
+    return _get(FormatVersion, [version] if version else [], 'uuid={}'.format(uuid))
+
+
+def format_version_by_puid(pronom_id):
+    """The active FormatVersion with the PRONOM ID `pronom_id`."""
+    return _get(FormatVersion, _get_fpr().format_versions_by_puid.get(pronom_id, []),
+                'pronom_id={}'.format(pronom_id))
+
+
+def file_format_version(file_uuid):
+    """The active FormatVersion the file with `file_uuid` is identified as."""
+    versions = [_get_fpr().format_versions.get(uuid) for uuid in
+                FileFormatVersion.objects.filter(file_uuid_id=file_uuid).values_list('format_version_id', flat=True)]
+    return _get(FormatVersion, [version for version in versions if version],
+                'fileformatversion__file_uuid={}'.format(file_uuid))
+
+
+def rules(purpose, format_uuid=None):
+    """The active FPRules for `purpose`, for the FormatVersion with
+    `format_uuid`, or for any format if it's None."""
+    fpr = _get_fpr()
+    if format_uuid is None:
+        return list(fpr.rules_by_purpose.get(purpose, []))
+    return list(fpr.rules.get((purpose, format_uuid), []))
+
+
+def rule(purpose, format_uuid=None):
+    """The active FPRule for `purpose`, for the FormatVersion with
+    `format_uuid`, or for any format if it's None."""
+    return _get(FPRule, rules(purpose, format_uuid),
+                'purpose={}, format={}'.format(purpose, format_uuid))
@@ -0,0 +1,56 @@
+"""
+Walk directory trees with scandir.
+
+os.scandir (or, on Python 2, the scandir backport) lists a directory as
+DirEntry objects, which know whether they're a file or a directory without
+another stat call and cache the stat result they do look up.  The walk is
+iterative, so trees of any depth can be walked, and like os.walk it doesn't
+descend into symlinks to directories.
+"""
+
+from __future__ import absolute_import
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+
+def walk(top, onerror=None):
+    """
+    Yield (dirpath, directory entries, file entries) for `top` and every
+    directory under it, in the order os.walk(top) would.
+
+    Entries are DirEntry objects.  Removing entries from the directory
+    entries skips walking them.  Errors listing a directory are passed to
+    `onerror`, if given, and the directory skipped.
+    """
+    pending = [top]
+    while pending:
+        dirpath = pending.pop()
+        directories = []
+        files = []
+        try:
+            for entry in scandir(dirpath):
+                if entry.is_dir():
+                    directories.append(entry)
+                else:
+                    files.append(entry)
+        except OSError as error:
+            if onerror is not None:
+                onerror(error)
+            continue
+        yield dirpath, directories, files
+        pending.extend(entry.path for entry in reversed(directories) if not entry.is_symlink())
+
+
+def iter_files(top):
+    """Yield a DirEntry for every file under `top`."""
+    for _, _, files in walk(top):
+        for entry in files:
+            yield entry
+
+
+def tree_size(top):
+    """The total size, in bytes, of the files under `top`."""
+    return sum(entry.stat().st_size for entry in iter_files(top))
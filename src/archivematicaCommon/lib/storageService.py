@@ -1,10 +1,15 @@
 from __future__ import absolute_import
 import base64
+import copy
+import functools
+import json
 import logging
 import os
 import platform
 import requests
 from requests.auth import AuthBase
+from requests.packages.urllib3.util.retry import Retry
+import threading
 import urllib
 import time
 
@@ -15,6 +20,14 @@ from archivematicaFunctions import get_setting
 
 LOGGER = logging.getLogger("archivematica.common")
 
+# Failed requests are retried after 0.5s, 1s, 2s... (see urllib3's Retry);
+# only idempotent requests are retried once they've been sent
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (502, 503, 504)
+
+# Most UUIDs to put in one request of get_files_info
+FILES_INFO_CHUNK_SIZE = 50
+
 
 class Error(requests.exceptions.RequestException):
     pass
@@ -33,17 +46,33 @@ class WaitForAsyncError(Error):
 # ########### HELPER FUNCTIONS #############
 
 class ApiKeyAuth(AuthBase):
-    """Custom auth for requests that puts user & key in Authorization header."""
+    """Custom auth for requests that puts user & key in Authorization header.
+
+    Without a username or API key, those in the settings when the request is
+    made are used.
+    """
 
     def __init__(self, username=None, apikey=None):
-        self.username = username or get_setting('storage_service_user', 'test')
-        self.apikey = apikey or get_setting('storage_service_apikey', None)
+        self.username = username
+        self.apikey = apikey
 
     def __call__(self, r):
-        r.headers['Authorization'] = "ApiKey {0}:{1}".format(self.username, self.apikey)
+        username = self.username or get_setting('storage_service_user', 'test')
+        apikey = self.apikey or get_setting('storage_service_apikey', None)
+        r.headers['Authorization'] = "ApiKey {0}:{1}".format(username, apikey)
         return r
 
 
+class HTTPAdapterWithTimeout(requests.adapters.HTTPAdapter):
+    def __init__(self, timeout=None, *args, **kwargs):
+        self.timeout = timeout
+        super(HTTPAdapterWithTimeout, self).__init__(*args, **kwargs)
+
+    def send(self, *args, **kwargs):
+        kwargs['timeout'] = self.timeout
+        return super(HTTPAdapterWithTimeout, self).send(*args, **kwargs)
+
+
 def _storage_service_url():
     # Get storage service URL from DashboardSetting model
     storage_service_url = get_setting('storage_service_url', None)
@@ -57,21 +86,38 @@ def _storage_service_url():
     return storage_service_url
 
 
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
 def _storage_api_session(timeout=django_settings.STORAGE_SERVICE_CLIENT_QUICK_TIMEOUT):
-    """Return a requests.Session with a customized adapter with timeout support."""
-    class HTTPAdapterWithTimeout(requests.adapters.HTTPAdapter):
-        def __init__(self, timeout=None, *args, **kwargs):
-            self.timeout = timeout
-            super(HTTPAdapterWithTimeout, self).__init__(*args, **kwargs)
+    """Return the requests.Session for requests with `timeout`.
+
+    There's one session per timeout in each process, shared by its threads,
+    so connections to the storage service are kept alive and reused.  Its
+    adapters have a pool of STORAGE_SERVICE_CLIENT_POOL_SIZE connections, and
+    retry failed requests up to STORAGE_SERVICE_CLIENT_RETRIES times.
+    """
+    key = (os.getpid(), timeout)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_storage_api_session(timeout)
+    return session
 
-        def send(self, *args, **kwargs):
-            kwargs['timeout'] = self.timeout
-            return super(HTTPAdapterWithTimeout, self).send(*args, **kwargs)
 
+def _new_storage_api_session(timeout):
+    retries = Retry(
+        total=django_settings.STORAGE_SERVICE_CLIENT_RETRIES,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False)
+    pool_size = django_settings.STORAGE_SERVICE_CLIENT_POOL_SIZE
     session = requests.session()
     session.auth = ApiKeyAuth()
-    session.mount('http://', HTTPAdapterWithTimeout(timeout=timeout))
-    session.mount('https://', HTTPAdapterWithTimeout(timeout=timeout))
+    for prefix in ('http://', 'https://'):
+        session.mount(prefix, HTTPAdapterWithTimeout(
+            timeout=timeout, pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries))
     return session
 
 
@@ -87,6 +133,54 @@ def _storage_api_params():
     return urllib.urlencode({'username': username, 'api_key': api_key})
 
 
+def _storage_api_objects(session, url, params):
+    """Return the objects of every page of the list at `url`."""
+    params = dict(params, offset=0)
+    objects = []
+    while True:
+        response = session.get(url, params=params)
+        page = response.json()
+        objects += page['objects']
+        if not page['meta']['next']:
+            break
+        params['offset'] += page['meta']['limit']
+    return objects
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(function):
+    """
+    Cache what `function` returns, by its arguments, for
+    STORAGE_SERVICE_CLIENT_CACHE_TTL seconds (not at all if that's 0).
+
+    For lookups of things that rarely change, like the pipeline and its
+    locations.  Callers get copies, which they're free to change.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        ttl = django_settings.STORAGE_SERVICE_CLIENT_CACHE_TTL
+        if not ttl:
+            return function(*args, **kwargs)
+        key = (function.__name__, _storage_service_url(), json.dumps([args, kwargs], sort_keys=True, default=str))
+        with _cache_lock:
+            expires, result = _cache.get(key, (0, None))
+        if expires < time.time():
+            result = function(*args, **kwargs)
+            with _cache_lock:
+                _cache[key] = (time.time() + ttl, result)
+        return copy.deepcopy(result)
+    return wrapper
+
+
+def clear_cache():
+    """Forget the cached storage service responses."""
+    with _cache_lock:
+        _cache.clear()
+
+
 def _storage_relative_from_absolute(location_path, space_path):
     """Strip space_path and next / from location_path."""
     location_path = os.path.normpath(location_path)
@@ -120,9 +214,11 @@ def create_pipeline(create_default_locations=False, shared_path=None,
     except requests.exceptions.RequestException as e:
         LOGGER.warning('Unable to create Archivematica pipeline in storage service from %s because %s', pipeline, e, exc_info=True)
         raise
+    clear_cache()
     return True
 
 
+@_cached
 def get_pipeline(uuid):
     url = _storage_service_url() + 'pipeline/' + uuid + '/'
     try:
@@ -140,6 +236,7 @@ def get_pipeline(uuid):
 # ########### LOCATIONS #############
 
 
+@_cached
 def get_location(path=None, purpose=None, space=None):
     """ Returns a list of storage locations, filtered by parameters.
 
@@ -151,7 +248,6 @@ def get_location(path=None, purpose=None, space=None):
     path: Path to location.  If a space is passed in, paths starting with /
         have the space's path stripped.
     """
-    return_locations = []
     if space and path:
         path = _storage_relative_from_absolute(path, space['path'])
         space = space['uuid']
@@ -164,20 +260,14 @@ def get_location(path=None, purpose=None, space=None):
         'relative_path': path,
         'purpose': purpose,
         'space': space,
-        'offset': 0,
     }
-    while True:
-        response = _storage_api_session().get(url, params=params)
-        locations = response.json()
-        return_locations += locations['objects']
-        if not locations['meta']['next']:
-            break
-        params['offset'] += locations['meta']['limit']
+    return_locations = _storage_api_objects(_storage_api_session(), url, params)
 
     LOGGER.debug("Storage locations returned: %s", return_locations)
     return return_locations
 
 
+@_cached
 def get_default_location(purpose):
     url = _storage_service_url() + 'location/default/{}'.format(purpose)
     response = _storage_api_session().get(url)
@@ -368,7 +458,6 @@ def get_file_info(uuid=None, origin_location=None, origin_path=None,
     """
     # TODO Need a better way to deal with mishmash of relative and absolute
     # paths coming in
-    return_files = []
     url = _storage_service_url() + 'file/'
     params = {
         'uuid': uuid,
@@ -378,20 +467,33 @@ def get_file_info(uuid=None, origin_location=None, origin_path=None,
         'current_path': current_path,
         'package_type': package_type,
         'status': status,
-        'offset': 0,
     }
-    while True:
-        response = _storage_api_slow_session().get(url, params=params)
-        files = response.json()
-        return_files += files['objects']
-        if not files['meta']['next']:
-            break
-        params['offset'] += files['meta']['limit']
+    return_files = _storage_api_objects(_storage_api_slow_session(), url, params)
 
     LOGGER.debug("Files returned: %s", return_files)
     return return_files
 
 
+def get_files_info(uuids):
+    """ Returns a dict by UUID of the files with the given UUIDs.
+
+    Like calling get_file_info(uuid=uuid) for each of `uuids`, but with one
+    request for every FILES_INFO_CHUNK_SIZE of them.  UUIDs the storage
+    service doesn't know are left out.
+    """
+    uuids = list(uuids)
+    session = _storage_api_slow_session()
+    url = _storage_service_url() + 'file/'
+    files = {}
+    for i in range(0, len(uuids), FILES_INFO_CHUNK_SIZE):
+        params = {'uuid__in': ','.join(uuids[i:i + FILES_INFO_CHUNK_SIZE])}
+        for file_ in _storage_api_objects(session, url, params):
+            files[file_['uuid']] = file_
+
+    LOGGER.debug("Files returned: %s", files)
+    return files
+
+
 def download_file_url(file_uuid):
     """
     Returns URL to storage service for downloading `file_uuid`.
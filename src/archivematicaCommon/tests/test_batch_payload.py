@@ -0,0 +1,97 @@
+import cPickle
+import os
+import uuid
+
+import pytest
+
+import batch_payload
+
+CREATED_DATE = '2018-03-01 12:00:00.000000+00:00'
+
+
+def tasks(count, wants_output=False):
+    return [(str(uuid.uuid4()),
+             '"%%SIPDirectory%%objects/dir/file-%d.tif" "%s" "%%date%%"' % (i, uuid.uuid4()),
+             wants_output)
+            for i in range(count)]
+
+
+def legacy_batch(batch):
+    """A batch as TaskGroup.serialize used to pickle it."""
+    return cPickle.dumps({'tasks': {
+        task_uuid: {'uuid': task_uuid, 'createdDate': CREATED_DATE,
+                    'arguments': arguments, 'wants_output': wants_output}
+        for task_uuid, arguments, wants_output in batch}})
+
+
+def decoded(batch):
+    return sorted((task['uuid'], task['arguments'], task['wants_output'], task['createdDate'])
+                  for task in batch)
+
+
+@pytest.mark.parametrize('count', [0, 1, 2, 500])
+def test_batch_round_trip(count):
+    batch = tasks(count) + tasks(count, wants_output=True)
+
+    version, decoded_batch = batch_payload.decode_batch(batch_payload.encode_batch(batch, CREATED_DATE))
+
+    assert version == batch_payload.VERSION
+    assert decoded(decoded_batch) == sorted(task + (CREATED_DATE,) for task in batch)
+
+
+def test_batch_round_trip_arguments():
+    arguments = ['', 'abc', 'abc', 'abcabc', 'ab', 'xabcx', u'caf\xe9 abc', 'abc', '']
+    batch = [(str(uuid.uuid4()), a, False) for a in arguments]
+
+    _, decoded_batch = batch_payload.decode_batch(batch_payload.encode_batch(batch, CREATED_DATE))
+
+    assert [task['arguments'] for task in decoded_batch] == arguments
+
+
+def test_decode_legacy_batch():
+    batch = tasks(3, wants_output=True)
+
+    version, decoded_batch = batch_payload.decode_batch(legacy_batch(batch))
+
+    assert version == batch_payload.LEGACY_VERSION
+    assert decoded(decoded_batch) == sorted(task + (CREATED_DATE,) for task in batch)
+    assert batch_payload.encode_batch(batch, CREATED_DATE, batch_payload.LEGACY_VERSION) == legacy_batch(batch)
+
+
+def test_batch_is_smaller_than_legacy_batch():
+    batch = tasks(128)
+
+    encoded = batch_payload.encode_batch(batch, CREATED_DATE)
+
+    assert encoded[len(batch_payload.MAGIC) + 1] == batch_payload.ZLIB_COMPRESSION
+    assert len(encoded) * 3 < len(legacy_batch(batch))
+
+
+def test_decode_unsupported_version():
+    with pytest.raises(batch_payload.PayloadError):
+        batch_payload.decode_batch(batch_payload.MAGIC + chr(99) + batch_payload.NO_COMPRESSION)
+
+
+def test_results_round_trip(tmpdir):
+    results = {
+        str(uuid.uuid4()): {'exitCode': 0},
+        str(uuid.uuid4()): {'exitCode': 1, 'stdout': 'out', 'stderror': u'caf\xe9'},
+        str(uuid.uuid4()): {'exitCode': 2, 'stdout': '', 'stderror': None},
+    }
+
+    for version in (batch_payload.LEGACY_VERSION, batch_payload.VERSION):
+        encoded = batch_payload.encode_results(results, str(tmpdir), version)
+        assert batch_payload.decode_results(encoded, str(tmpdir)) == {'task_results': results}
+
+
+def test_large_output_is_sent_by_reference(tmpdir, monkeypatch):
+    monkeypatch.setattr(batch_payload, 'INLINE_OUTPUT_LIMIT', 10)
+    task_uuid = str(uuid.uuid4())
+    results = {task_uuid: {'exitCode': 0, 'stdout': 'x' * 1000, 'stderror': u'\xe9' * 10}}
+
+    encoded = batch_payload.encode_results(results, str(tmpdir))
+
+    assert len(encoded) < 200
+    assert os.listdir(str(tmpdir.join(batch_payload.OUTPUT_DIRECTORY))) == [task_uuid + '.stdout']
+    assert batch_payload.decode_results(encoded, str(tmpdir)) == {'task_results': results}
+    assert os.listdir(str(tmpdir.join(batch_payload.OUTPUT_DIRECTORY))) == []
@@ -3,9 +3,10 @@ import os
 
 import databaseFunctions
 
-from main.models import Event, File
+from main.models import Event, File, Job, Task
 
 from django.test import TestCase
+from django.utils import timezone
 import pytest
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -123,3 +124,59 @@ class TestDatabaseFunctions(TestCase):
         with pytest.raises(ValueError) as excinfo:
             databaseFunctions.getAccessionNumberFromTransfer("no such transfer")
         assert "No Transfer found" in str(excinfo.value)
+
+    # logTasksCreatedSQL
+
+    def test_log_tasks_created_sql_inserts_every_task(self):
+        job = Job.objects.create(jobuuid="3a1bb3c1-5e3a-4b5c-9d43-2e7b46a9bc30",
+                                 createdtime=timezone.now())
+
+        class FakeJobChainLink(object):
+            UUID = job.jobuuid
+
+        class FakeTaskManager(object):
+            jobChainLink = FakeJobChainLink()
+            execute = "examine_v0.0"
+
+        task_manager = FakeTaskManager()
+        tasks = [
+            (task_manager,
+             {"%fileUUID%": "file-%d" % i, "%relativeLocation%": "%SIPDirectory%objects/file-" + str(i)},
+             "task-%d" % i,
+             "--file-uuid file-%d" % i)
+            for i in range(5)
+        ]
+
+        databaseFunctions.logTasksCreatedSQL(tasks, batch_size=2)
+
+        created = Task.objects.filter(job_id=job.jobuuid).order_by("taskuuid")
+        assert [task.taskuuid for task in created] == ["task-%d" % i for i in range(5)]
+        assert created[3].fileuuid == "file-3"
+        assert created[3].filename == "file-3"
+        assert created[3].execution == "examine_v0.0"
+        assert created[3].arguments == "--file-uuid file-3"
+
+    # logTaskResultsSQL
+
+    def test_log_task_results_sql_updates_every_task(self):
+        job = Job.objects.create(jobuuid="8b4a5c1e-0f2d-4f6e-9a52-3d0c1b2a9e77",
+                                 createdtime=timezone.now())
+        for i in range(5):
+            Task.objects.create(taskuuid="task-%d" % i, job=job, createdtime=timezone.now())
+
+        databaseFunctions.logTaskResultsSQL([
+            ("task-0", 0, None, None),
+            ("task-1", 1, None, None),
+            ("task-2", 0, "out-2", "err-2"),
+            ("task-3", 179, "out-3", None),
+            ("task-4", 0, None, None),
+        ])
+
+        tasks = {task.taskuuid: task for task in Task.objects.filter(job_id=job.jobuuid)}
+        assert [tasks["task-%d" % i].exitcode for i in range(5)] == [0, 1, 0, 179, 0]
+        assert tasks["task-2"].stdout == "out-2"
+        assert tasks["task-2"].stderror == "err-2"
+        assert tasks["task-3"].stdout == "out-3"
+        assert tasks["task-3"].stderror == ""
+        assert tasks["task-0"].stdout == ""
+        assert all(task.endtime is not None for task in tasks.values())
@@ -1,11 +1,15 @@
 # -*- coding: UTF-8 -*-
+import itertools
 import os
+import random
+
 import pytest
 
 from django.utils import six
 
 from dicts import ReplacementDict, ChoicesDict
 from dicts import setup as setup_dicts
+from archivematicaFunctions import unicodeToStr
 
 from main import models
 
@@ -127,3 +131,115 @@ def test_replacementdict_replace_returns_bytestring():
     d = ReplacementDict({'%originalLocation%': '\x82\xdb\x82\xc1\x82\xd5\x82\xe9\x83\x81\x83C\x83\x8b'})
     out_str = d.replace(in_str)[0]
     assert isinstance(out_str, six.binary_type)
+
+
+def sequential_replace(items, *strings):
+    """ReplacementDict.replace as it used to be: str.replace for each item in turn."""
+    ret = []
+    for orig in strings:
+        if orig is not None:
+            orig = unicodeToStr(orig)
+            for key, value in items:
+                orig = orig.replace(key, unicodeToStr(value))
+        ret.append(orig)
+    return ret
+
+
+def test_replacementdict_replace_matches_sequential_replace():
+    """
+    Where the old, one key after the other replacement gave the same result
+    whatever the order of the keys, the single pass gives that result too.
+
+    (The values are made of characters that aren't in any key, as values that
+    make new keys with what's around them are substituted differently; see
+    test_replacementdict_replace_does_not_rescan_values.)
+    """
+    rng = random.Random(42)
+    keys = ['%a%', '%bb%', '%SIPDirectory%', '%fileUUID%', '$foo', '%x']
+    alphabet = keys + ['%', '$', 'a', 'b', '/', ' ', '"', u'\xe9'.encode('utf-8')]
+    value_alphabet = ['/', 'v', ' ', u'\xe9'.encode('utf-8')]
+    checked = 0
+    for _ in range(2000):
+        items = []
+        for key in rng.sample(keys, rng.randint(1, 4)):
+            value = ''.join(rng.choice(value_alphabet) for _ in range(rng.randint(1, 3)))
+            items.append((key, value.decode('utf-8') if rng.random() < 0.5 else value))
+        string = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        results = set(tuple(sequential_replace(order, string))
+                      for order in itertools.permutations(items))
+        if len(results) == 1:
+            assert ReplacementDict(items).replace(string) == list(results.pop()), (items, string)
+            checked += 1
+    assert checked > 1000
+
+
+def test_replacementdict_replace_prefers_longest_key():
+    d = ReplacementDict({'$foo': 'X', '$foobar': 'Y'})
+    assert d.replace('$foobar and $foo') == ['Y and X']
+    # As it used to be, if the longer key happened to come first
+    assert d.replace('$foobar and $foo') == sequential_replace(
+        sorted(d.items(), key=lambda item: len(item[0]), reverse=True), '$foobar and $foo')
+
+
+def test_replacementdict_replace_overlapping_keys():
+    d = ReplacementDict({'%a%': 'A', '%b%': 'B'})
+    # The leftmost key wins; %a% and %b% share the middle %
+    assert d.replace('%a%b%') == ['Ab%']
+    assert d.replace('%a%%b%') == ['AB']
+
+
+def test_replacementdict_replace_does_not_rescan_values():
+    d = ReplacementDict({'%a%': '%b%', '%b%': 'B', '%c%': 'b'})
+    assert d.replace('%a% %b%') == ['%b% B']
+    # Nor does a value combine with what's around it to make another key
+    assert d.replace('%%c%%') == ['%b%']
+
+
+def test_replacementdict_replace_bytes_and_unicode():
+    d = ReplacementDict({
+        '%bytes%': 'caf\xc3\xa9',
+        u'%unicode%': u'caf\xe9',
+        '%latin1%': 'caf\xe9',
+        u'%cl\xe9%': 'key',
+    })
+    out = d.replace(u'%bytes% %unicode% %latin1% %cl\xe9% \u0e01',
+                    'caf\xe9 %cl\xc3\xa9%',
+                    None)
+    assert out == ['caf\xc3\xa9 caf\xc3\xa9 caf\xe9 key \xe0\xb8\x81',
+                   'caf\xe9 key',
+                   None]
+    assert all(isinstance(s, six.binary_type) for s in out[:2])
+
+
+def test_replacementdict_compile():
+    d = ReplacementDict({'%a%': 'A'})
+    substitution = d.compile()
+    d['%a%'] = 'changed'
+    d['%b%'] = 'B'
+
+    assert substitution.replace('%a% %b%', None) == ['A %b%', None]
+    assert d.replace('%a% %b%') == ['changed B']
+    assert ReplacementDict().replace(u'%a%') == ['%a%']
+
+
+@pytest.mark.django_db
+def test_replacementdict_unit_files_constructor_matches_frommodel():
+    transfer = models.Transfer.objects.create(
+        uuid='8ae1b2a1-3f4c-4cf6-b1d0-0ad7b6a2e3a5',
+        currentlocation='%sharedPath%currentlyProcessing/transfer-8ae1b2a1-3f4c-4cf6-b1d0-0ad7b6a2e3a5/')
+    sip = models.SIP.objects.create(
+        uuid='d8b9a7b6-6c4e-4a4b-8a5d-79c4c3c7f6a1',
+        currentpath='%sharedPath%currentlyProcessing/sip-d8b9a7b6-6c4e-4a4b-8a5d-79c4c3c7f6a1/')
+    transfer_file = models.File.objects.create(
+        uuid='1e7b0fd8-2a46-4c9c-8a27-3b7a7f7b7b01', transfer=transfer,
+        originallocation='%transferDirectory%objects/a.txt',
+        currentlocation='%transferDirectory%objects/a.txt')
+    sip_file = models.File.objects.create(
+        uuid='1e7b0fd8-2a46-4c9c-8a27-3b7a7f7b7b02', transfer=transfer, sip=sip,
+        originallocation='%transferDirectory%objects/b.txt',
+        currentlocation='%SIPDirectory%objects/b.txt')
+
+    for unit_type, unit, file_ in (('Transfer', transfer, transfer_file), ('SIP', sip, sip_file)):
+        for expand_path in (True, False):
+            rds = ReplacementDict.fromunitfiles(unit_type, unit.uuid, [file_.uuid], expand_path=expand_path)
+            assert rds == {file_.uuid: ReplacementDict.frommodel(type_='file', file_=file_.uuid, expand_path=expand_path)}
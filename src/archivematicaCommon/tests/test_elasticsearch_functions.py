@@ -1,10 +1,14 @@
+import json
 import os
 
 import pytest
 import unittest
 import vcr
+from elasticsearch import ConnectionError
+from elasticsearch.serializer import JSONSerializer
 
 import elasticSearchFunctions
+from main import models
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -88,3 +92,230 @@ class TestElasticSearchFunctions(unittest.TestCase):
     def test_set_tags_fails_when_file_cant_be_found(self):
         with pytest.raises(elasticSearchFunctions.EmptySearchResultError):
             elasticSearchFunctions.set_file_tags(self.client, 'no_such_file', [])
+
+
+class FakeClient(object):
+    """Just enough of an Elasticsearch client for bulk indexing."""
+
+    class cluster(object):
+        @staticmethod
+        def health():
+            return {'status': 'green'}
+
+    class indices(object):
+        @staticmethod
+        def refresh():
+            pass
+
+    class transport(object):
+        serializer = JSONSerializer()
+
+    def __init__(self, fail=(), hits=(), reject=(), unavailable=0):
+        self.requests = []
+        self.documents = []
+        self.fail = fail
+        # Documents rejected (as by a full bulk queue) the first time they're
+        # sent, and how many requests fail before one gets through
+        self.reject = set(reject)
+        self.unavailable = unavailable
+        self.hits = list(hits)
+        self.searches = []
+
+    def bulk(self, body, **kwargs):
+        lines = [json.loads(line) for line in body.splitlines()]
+        documents = lines[1::2]
+        self.requests.append(documents)
+        if self.unavailable:
+            self.unavailable -= 1
+            raise ConnectionError('N/A', 'Connection refused', None)
+        items = []
+        for document in documents:
+            if document.get('name') in self.reject:
+                self.reject.discard(document.get('name'))
+                items.append({'index': {'status': 429, 'error': 'EsRejectedExecutionException'}})
+            else:
+                self.documents.append(document)
+                items.append({'index': {'status': 400 if document.get('name') in self.fail else 201, 'error': 'failed'}})
+        return {'items': items}
+
+    def search(self, body, size, **kwargs):
+        """A scan search; scroll returns `size` hits at a time."""
+        self.searches.append(dict(kwargs, size=size))
+        self.scroll_size = size
+        self.scroll_position = 0
+        return self._scroll_response([])
+
+    def scroll(self, scroll_id, **kwargs):
+        page = self.hits[self.scroll_position:self.scroll_position + self.scroll_size]
+        self.scroll_position += self.scroll_size
+        return self._scroll_response(page)
+
+    def _scroll_response(self, page):
+        return {'_scroll_id': 'scroll', '_shards': {'total': 1, 'failed': 0},
+                'hits': {'total': len(self.hits), 'hits': page}}
+
+
+def test_bulk_index():
+    client = FakeClient()
+
+    indexed = elasticSearchFunctions.bulk_index(
+        client, ({'name': i} for i in range(5)), 'transfers', 'transferfile', chunk_size=2)
+
+    assert indexed == 5
+    assert client.requests == [[{'name': 0}, {'name': 1}], [{'name': 2}, {'name': 3}], [{'name': 4}]]
+
+
+def test_bulk_index_reports_failed_documents():
+    client = FakeClient(fail=(1, 3))
+    reported = []
+
+    with pytest.raises(elasticSearchFunctions.BulkIndexError) as excinfo:
+        elasticSearchFunctions.bulk_index(
+            client, ({'name': i} for i in range(5)), 'transfers', 'transferfile',
+            printfn=lambda *args, **kwargs: reported.append(args))
+
+    assert len(excinfo.value.errors) == 2
+    assert len(reported) == 2
+    assert len(client.documents) == 5
+
+
+def test_bulk_index_retries_rejected_documents():
+    client = FakeClient(reject=(1, 3))
+
+    indexed = elasticSearchFunctions.bulk_index(
+        client, ({'name': i} for i in range(5)), 'transfers', 'transferfile',
+        wait_between_tries=0, printfn=lambda *args, **kwargs: None)
+
+    assert indexed == 5
+    assert client.requests[1] == [{'name': 1}, {'name': 3}]
+    assert sorted(document['name'] for document in client.documents) == range(5)
+
+
+def test_bulk_index_retries_failed_requests():
+    client = FakeClient(unavailable=2)
+
+    indexed = elasticSearchFunctions.bulk_index(
+        client, ({'name': i} for i in range(5)), 'transfers', 'transferfile',
+        wait_between_tries=0, printfn=lambda *args, **kwargs: None)
+
+    assert indexed == 5
+    assert len(client.requests) == 3
+    assert len(client.documents) == 5
+
+
+def test_bulk_index_gives_up():
+    client = FakeClient(unavailable=3)
+
+    with pytest.raises(ConnectionError):
+        elasticSearchFunctions.bulk_index(
+            client, ({'name': i} for i in range(5)), 'transfers', 'transferfile',
+            wait_between_tries=0, max_tries=3, printfn=lambda *args, **kwargs: None)
+
+    assert len(client.requests) == 3
+
+
+METS = '''<?xml version="1.0" encoding="UTF-8"?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/" xmlns:premis="info:lc/xmlns/premis-v2"
+           xmlns:xlink="http://www.w3.org/1999/xlink">
+  <mets:metsHdr CREATEDATE="2018-01-01T00:00:00"/>
+  <mets:amdSec ID="amdSec_1">
+    <mets:techMD><mets:mdWrap><mets:xmlData><premis:object><premis:objectIdentifier>
+      <premis:objectIdentifierValue>4d9ea5ee-4c2b-47c1-8b1c-7a9cd0c4a9a1</premis:objectIdentifierValue>
+    </premis:objectIdentifier></premis:object></mets:xmlData></mets:mdWrap></mets:techMD>
+  </mets:amdSec>
+  <mets:amdSec ID="amdSec_2">
+    <mets:techMD><mets:mdWrap><mets:xmlData><premis:object><premis:objectIdentifier>
+      <premis:objectIdentifierValue>0b2f1c1e-7b7a-4c6a-9b52-1d6a0a7c3d02</premis:objectIdentifierValue>
+    </premis:objectIdentifier></premis:object></mets:xmlData></mets:mdWrap></mets:techMD>
+  </mets:amdSec>
+  <mets:fileSec>
+    <mets:fileGrp USE="original">
+      <mets:file ID="file-4d9ea5ee-4c2b-47c1-8b1c-7a9cd0c4a9a1" ADMID="amdSec_1">
+        <mets:FLocat xlink:href="objects/a.TXT" LOCTYPE="OTHER"/>
+      </mets:file>
+      <mets:file ID="file-0b2f1c1e-7b7a-4c6a-9b52-1d6a0a7c3d02" ADMID="amdSec_2">
+        <mets:FLocat xlink:href="objects/b.jpg" LOCTYPE="OTHER"/>
+      </mets:file>
+    </mets:fileGrp>
+    <mets:fileGrp USE="metadata">
+      <mets:file ID="file-7c3f0e4e-4f7b-4c36-9d0e-1a4a6f6b2a03">
+        <mets:FLocat xlink:href="objects/metadata/metadata.csv" LOCTYPE="OTHER"/>
+      </mets:file>
+    </mets:fileGrp>
+  </mets:fileSec>
+</mets:mets>
+'''
+
+
+@pytest.mark.django_db
+def test_index_mets_file_metadata(tmpdir):
+    mets = tmpdir.join('METS.xml')
+    mets.write(METS)
+    client = FakeClient()
+
+    indexed = elasticSearchFunctions.index_mets_file_metadata(
+        client, 'f8a3c8f0-8d9e-4f38-ae0b-6d8a6a1e7a00', str(mets), 'aips', 'aipfile', 'sip')
+
+    assert indexed == 3
+    assert len(client.requests) == 1
+    assert [(d['FILEUUID'], d['filePath'], d['fileExtension']) for d in client.documents] == [
+        ('4d9ea5ee-4c2b-47c1-8b1c-7a9cd0c4a9a1', 'objects/a.TXT', 'txt'),
+        ('0b2f1c1e-7b7a-4c6a-9b52-1d6a0a7c3d02', 'objects/b.jpg', 'jpg'),
+        ('7c3f0e4e-4f7b-4c36-9d0e-1a4a6f6b2a03', 'objects/metadata/metadata.csv', 'csv'),
+    ]
+    # Each document has its own file's amdSec
+    assert [d['FILEUUID'] in json.dumps(d['METS']['amdSec']) for d in client.documents] == [True, True, False]
+    assert client.documents[2]['METS']['amdSec'] == {}
+
+
+@pytest.mark.django_db
+def test_index_transfer_files(tmpdir):
+    transfer_uuid = '2c8e6a4c-3f7e-4b0e-9f43-4a0f2c6d1e10'
+    transfer_dir = tmpdir.mkdir('transfer')
+    transfer_dir.mkdir('objects').join('a.txt').write('a')
+    transfer_dir.join('objects', 'b.txt').write('b')
+    transfer_dir.join('processingMCP.xml').write('')
+    transfer = models.Transfer.objects.create(
+        uuid=transfer_uuid, currentlocation='%sharedPath%currentlyProcessing/transfer/', accessionid='acc')
+    models.File.objects.create(
+        uuid='8e2b6a52-4bfa-4d2b-9d0f-5d6c8d1f3a11', transfer=transfer,
+        originallocation='%transferDirectory%objects/a.txt', currentlocation='%transferDirectory%objects/a.txt')
+    client = FakeClient()
+
+    indexed = elasticSearchFunctions.index_transfer_files(
+        client, transfer_uuid, os.path.join(str(transfer_dir), ''), 'transfers', 'transferfile',
+        printfn=lambda *args, **kwargs: None)
+
+    assert indexed == 2
+    assert len(client.requests) == 1
+    assert sorted((d['relative_path'], d['fileuuid'], d['accessionid']) for d in client.documents) == [
+        ('transfer/objects/a.txt', '8e2b6a52-4bfa-4d2b-9d0f-5d6c8d1f3a11', 'acc'),
+        ('transfer/objects/b.txt', '', 'acc'),
+    ]
+
+
+def scan_hits(count):
+    return [{'_id': str(i), '_source': {'name': 'file-%d' % i}} for i in range(count)]
+
+
+def test_scan_results():
+    client = FakeClient(hits=scan_hits(5))
+
+    hits = elasticSearchFunctions.scan_results(
+        client, {'query': {'match_all': {}}}, index=['aips', 'transfers'], doc_type='aip',
+        source=['uuid', 'name'], size=2)
+
+    assert client.searches == []  # Nothing is fetched until the hits are consumed
+    assert list(hits) == scan_hits(5)
+    assert client.searches == [{'index': 'aips,transfers', 'doc_type': 'aip', 'size': 2,
+                                '_source': 'uuid,name', 'scroll': '1m', 'search_type': 'scan'}]
+
+
+def test_search_all_results_is_not_truncated():
+    count = elasticSearchFunctions.SCROLL_SIZE * 2 + 1
+    client = FakeClient(hits=scan_hits(count))
+
+    results = elasticSearchFunctions.search_all_results(client, {'query': {'match_all': {}}})
+
+    assert results['hits']['total'] == count
+    assert results['hits']['hits'] == scan_hits(count)
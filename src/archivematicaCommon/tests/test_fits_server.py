@@ -0,0 +1,65 @@
+import pytest
+import requests
+
+import fits_server
+
+FITS_XML = '<fits xmlns="http://hul.harvard.edu/ois/xml/ns/fits/fits_output"/>'
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = self.text = content
+
+
+class FakeSession(object):
+
+    def __init__(self, response=None, error=None):
+        self.requests = []
+        self.response = response
+        self.error = error
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append((url, params, timeout))
+        if self.error:
+            raise self.error
+        return self.response
+
+
+@pytest.fixture
+def fits_settings(settings):
+    settings.FITS_SERVER_URL = 'http://fits:8080/fits/'
+    settings.FITS_SERVER_TIMEOUT = 30
+    return settings
+
+
+def test_enabled(settings):
+    settings.FITS_SERVER_URL = ''
+    assert not fits_server.enabled()
+    settings.FITS_SERVER_URL = 'http://fits:8080/fits/'
+    assert fits_server.enabled()
+
+
+def test_examine(fits_settings, monkeypatch):
+    session = FakeSession(response=FakeResponse(200, FITS_XML))
+    monkeypatch.setattr(fits_server, '_session', lambda: session)
+
+    assert fits_server.examine('/var/archivematica/file.pdf') == FITS_XML
+    assert session.requests == [('http://fits:8080/fits/examine', {'file': '/var/archivematica/file.pdf'}, 30)]
+
+
+@pytest.mark.parametrize('session', [
+    FakeSession(response=FakeResponse(500, 'Error')),
+    FakeSession(error=requests.exceptions.ConnectionError('Connection refused')),
+    FakeSession(error=requests.exceptions.Timeout('Timed out')),
+])
+def test_examine_errors(fits_settings, monkeypatch, session):
+    monkeypatch.setattr(fits_server, '_session', lambda: session)
+
+    with pytest.raises(fits_server.FITSServerError):
+        fits_server.examine('/var/archivematica/file.pdf')
+
+
+def test_session_is_kept():
+    assert fits_server._session() is fits_server._session()
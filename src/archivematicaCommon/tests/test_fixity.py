@@ -0,0 +1,45 @@
+import hashlib
+
+import fixity
+
+CONTENTS = b'archivematica' * 100000
+
+
+def make_file(tmpdir, name='file', contents=CONTENTS):
+    path = tmpdir.join(name)
+    path.write(contents, mode='wb')
+    return str(path)
+
+
+def expected(algorithms, contents=CONTENTS):
+    return {algorithm: hashlib.new(algorithm, contents).hexdigest() for algorithm in algorithms}
+
+
+def count_reads(monkeypatch):
+    reads = []
+    read_checksums = fixity._read_checksums
+
+    def _read_checksums(file_, algorithms):
+        reads.append(sorted(algorithms))
+        return read_checksums(file_, algorithms)
+    monkeypatch.setattr(fixity, '_read_checksums', _read_checksums)
+    return reads
+
+
+def test_file_checksums(tmpdir, monkeypatch):
+    reads = count_reads(monkeypatch)
+    path = make_file(tmpdir)
+
+    assert fixity.file_checksums(path) == expected(fixity.ALGORITHMS)
+    assert reads == [sorted(fixity.ALGORITHMS)]
+
+
+def test_checksums_of_files(tmpdir, monkeypatch):
+    reads = count_reads(monkeypatch)
+    paths = [make_file(tmpdir, str(i), CONTENTS + str(i)) for i in range(10)]
+    missing = str(tmpdir.join('missing'))
+
+    results = fixity.checksums_of_files(paths + [missing], ['md5', 'sha256'], threads=3)
+
+    assert results == {path: expected(['md5', 'sha256'], CONTENTS + str(i)) for i, path in enumerate(paths)}
+    assert len(reads) == 10
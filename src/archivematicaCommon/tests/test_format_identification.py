@@ -0,0 +1,77 @@
+import json
+import os
+
+import format_identification
+
+
+def siegfried_output(files):
+    return json.dumps({'siegfried': '1.7.8', 'files': files})
+
+
+def test_parse_siegfried_json():
+    output = siegfried_output([
+        {'filename': 'a.pdf', 'errors': '', 'matches': [{'ns': 'pronom', 'id': 'fmt/276'}]},
+        {'filename': 'b.bin', 'errors': '', 'matches': [{'ns': 'pronom', 'id': 'UNKNOWN'}]},
+        {'filename': 'c.xml', 'errors': '', 'matches': [{'ns': 'pronom', 'id': 'fmt/101'},
+                                                        {'ns': 'pronom', 'id': 'fmt/1474'}]},
+        {'filename': 'd.doc', 'errors': 'empty source', 'matches': []},
+        {'filename': 'e.png', 'errors': '', 'matches': [{'puid': 'fmt/11'}]},
+    ])
+
+    assert format_identification.parse_siegfried_json(output) == {'a.pdf': 'fmt/276', 'e.png': 'fmt/11'}
+
+
+def test_siegfried_identifies_a_batch_in_one_run(tmpdir, monkeypatch):
+    paths = [str(tmpdir.join('file-%d.pdf' % i)) for i in range(5)]
+    calls = tmpdir.join('calls')
+    sf = tmpdir.join('bin', 'sf')
+    sf.write('#!/usr/bin/env python\n'
+             'import json, sys\n'
+             'open(%r, "a").write("run\\n")\n'
+             'print(json.dumps({"files": [{"filename": path, "errors": "", "matches": [{"ns": "pronom", "id": "fmt/276"}]}\n'
+             '                            for path in sys.argv[3:] if not path.endswith("4.pdf")]}))\n' % str(calls),
+             ensure=True)
+    sf.chmod(0o755)
+    monkeypatch.setenv('PATH', str(sf.dirpath()) + os.pathsep + os.environ['PATH'])
+    monkeypatch.setattr(format_identification, 'SIEGFRIED_BATCH_SIZE', 3)
+
+    assert format_identification.supports('Siegfried')
+    assert format_identification.identify('Siegfried', paths) == {path: 'fmt/276' for path in paths[:4]}
+    assert calls.read() == 'run\nrun\n'
+
+
+def test_siegfried_failures_are_left_to_the_fpr_command(tmpdir, monkeypatch):
+    monkeypatch.setenv('PATH', str(tmpdir))
+
+    assert format_identification.identify('Siegfried', [str(tmpdir.join('a.pdf'))]) == {}
+
+
+class FakeFido(object):
+    matches = {
+        'a.pdf': ([('fmt/276', 'sig')], 'signature'),
+        'b.docx': ([('fmt/412', 'sig')], 'container'),
+        'c.txt': ([('x-fmt/111', 'ext')], 'extension'),
+        'd.xml': ([('fmt/101', 'sig'), ('fmt/1474', 'sig')], 'signature'),
+    }
+
+    def get_puid(self, format_):
+        return format_
+
+    def identify_file(self, filename, extension=True):
+        if filename == 'broken':
+            self.handle_matches(filename, [('fmt/1', 'sig')], 0, 'signature')
+            raise IOError('Broken')
+        matches, matchtype = self.matches[filename]
+        self.handle_matches(filename, matches, 0, matchtype)
+
+
+def test_fido(monkeypatch):
+    fido = FakeFido()
+    monkeypatch.setattr(format_identification, '_fido', lambda: fido)
+
+    assert format_identification.supports('Fido')
+    assert not format_identification.supports('File (Linux utility)')
+    assert format_identification.identify('Fido', list(FakeFido.matches) + ['broken']) == {
+        'a.pdf': 'fmt/276',
+        'b.docx': 'fmt/412',
+    }
@@ -0,0 +1,59 @@
+from django.test import TestCase
+
+from fpr import models
+
+import fpr_cache
+
+
+class TestFPRCache(TestCase):
+
+    def setUp(self):
+        fpr_cache.clear()
+        group = models.FormatGroup.objects.create(description='Text')
+        format_ = models.Format.objects.create(description='Plain text', group=group)
+        self.version = models.FormatVersion.objects.create(
+            format=format_, description='Plain text', pronom_id='x-fmt/111')
+        tool = models.FPTool.objects.create(description='cat', version='1')
+        self.command = models.FPCommand.objects.create(
+            tool=tool, description='Copy', command='cat "%inputFile%"',
+            script_type='command', command_usage='normalization')
+        self.rule = models.FPRule.objects.create(
+            purpose='access', command=self.command, format=self.version)
+        self.default_rule = models.FPRule.objects.create(
+            purpose='default_access', command=self.command, format=self.version)
+        id_tool = models.IDTool.objects.create(description='Siegfried', version='1')
+        self.id_command = models.IDCommand.objects.create(
+            tool=id_tool, description='Identify', config='PUID',
+            script='sf "$1"', script_type='bashScript')
+
+    def tearDown(self):
+        fpr_cache.clear()
+
+    def test_lookups(self):
+        assert fpr_cache.format_version_by_puid('x-fmt/111') == self.version
+        assert fpr_cache.id_command(self.id_command.uuid) == self.id_command
+        assert fpr_cache.rule('access', self.version.uuid) == self.rule
+        assert fpr_cache.rules('default_access') == [self.default_rule]
+        assert fpr_cache.rules('preservation', self.version.uuid) == []
+        with self.assertRaises(models.FPRule.DoesNotExist):
+            fpr_cache.rule('preservation', self.version.uuid)
+        with self.assertRaises(models.FormatVersion.DoesNotExist):
+            fpr_cache.format_version_by_puid('fmt/1')
+
+    def test_lookups_are_cached(self):
+        fpr_cache.rule('access', self.version.uuid)
+        with self.assertNumQueries(0):
+            rule = fpr_cache.rule('access', self.version.uuid)
+            assert rule.command.tool.description == 'cat'
+            fpr_cache.id_command(self.id_command.uuid).tool
+
+    def test_changes_are_loaded(self):
+        interval = fpr_cache.CHECK_INTERVAL
+        fpr_cache.CHECK_INTERVAL = 0
+        try:
+            assert fpr_cache.rule('access', self.version.uuid) == self.rule
+            self.rule.enabled = False
+            self.rule.save()
+            assert fpr_cache.rules('access', self.version.uuid) == []
+        finally:
+            fpr_cache.CHECK_INTERVAL = interval
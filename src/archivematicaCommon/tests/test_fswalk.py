@@ -0,0 +1,59 @@
+import os
+import sys
+
+import fswalk
+
+
+def make_tree(tmpdir):
+    tmpdir.join('a', 'b', 'c.txt').write('c', ensure=True)
+    tmpdir.join('a', 'd.txt').write('dd', ensure=True)
+    tmpdir.join('e.txt').write('eee')
+    tmpdir.mkdir('empty')
+    tmpdir.join('link').mksymlinkto(tmpdir.join('a'))
+    return str(tmpdir)
+
+
+def names(entries):
+    return sorted(entry.name for entry in entries)
+
+
+def test_walk_matches_os_walk(tmpdir):
+    top = make_tree(tmpdir)
+
+    walked = [(dirpath, names(dirs), names(files)) for dirpath, dirs, files in fswalk.walk(top)]
+
+    assert sorted(walked) == sorted((dirpath, sorted(dirs), sorted(files))
+                                    for dirpath, dirs, files in os.walk(top))
+    assert [dirpath for dirpath, _, _ in walked].index(os.path.join(top, 'a')) < \
+        [dirpath for dirpath, _, _ in walked].index(os.path.join(top, 'a', 'b'))
+
+
+def test_walk_skips_removed_directories(tmpdir):
+    top = make_tree(tmpdir)
+
+    dirpaths = []
+    for dirpath, dirs, _ in fswalk.walk(top):
+        dirpaths.append(dirpath)
+        dirs[:] = [entry for entry in dirs if entry.name != 'a']
+
+    assert sorted(dirpaths) == [top, os.path.join(top, 'empty')]
+
+
+def test_iter_files_and_tree_size(tmpdir):
+    top = make_tree(tmpdir)
+
+    assert sorted(entry.path for entry in fswalk.iter_files(top)) == [
+        os.path.join(top, 'a', 'b', 'c.txt'), os.path.join(top, 'a', 'd.txt'), os.path.join(top, 'e.txt')]
+    assert fswalk.tree_size(top) == 6
+
+
+def test_walk_deep_tree(tmpdir):
+    depth = sys.getrecursionlimit() + 10
+    deepest = str(tmpdir)
+    for _ in range(depth):
+        deepest = os.path.join(deepest, 'd')
+        os.mkdir(deepest)
+    open(os.path.join(deepest, 'file'), 'w').close()
+
+    assert sum(1 for _ in fswalk.walk(str(tmpdir))) == depth + 1
+    assert [entry.path for entry in fswalk.iter_files(str(tmpdir))] == [os.path.join(deepest, 'file')]
@@ -0,0 +1,97 @@
+import pytest
+
+import storageService as storage_service
+
+SETTINGS = {
+    'dashboard_uuid': 'dashboard-uuid',
+    'storage_service_url': 'http://storage-service:8000',
+}
+PIPELINE = {'uuid': 'dashboard-uuid', 'resource_uri': '/api/v2/pipeline/dashboard-uuid/'}
+
+
+class FakeResponse(object):
+    status_code = 200
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+    """Just enough of the storage service API for pipeline, location and file lookups."""
+
+    def __init__(self, files=()):
+        self.requests = []
+        self.files = {file_['uuid']: file_ for file_ in files}
+
+    def get(self, url, params=None):
+        self.requests.append((url, params))
+        if url.endswith('/pipeline/dashboard-uuid/'):
+            return FakeResponse(PIPELINE)
+        if url.endswith('/location/'):
+            return FakeResponse({'meta': {'next': None, 'limit': 20}, 'objects': [{'uuid': 'location-uuid'}]})
+        if url.endswith('/file/'):
+            files = [self.files[uuid] for uuid in params['uuid__in'].split(',') if uuid in self.files]
+            return FakeResponse({'meta': {'next': None, 'limit': 20}, 'objects': files})
+        raise AssertionError('Unexpected request for {}'.format(url))
+
+
+@pytest.fixture
+def session(request, monkeypatch):
+    session = FakeSession(files=[{'uuid': str(i), 'status': 'UPLOADED'} for i in range(5)])
+    monkeypatch.setattr(storage_service, 'get_setting', lambda name, default=None: SETTINGS.get(name, default))
+    monkeypatch.setattr(storage_service, '_storage_api_session', lambda timeout=None: session)
+    storage_service.clear_cache()
+    request.addfinalizer(storage_service.clear_cache)
+    return session
+
+
+def test_session_is_pooled():
+    session = storage_service._storage_api_session(timeout=12.5)
+
+    assert storage_service._storage_api_session(timeout=12.5) is session
+    assert storage_service._storage_api_session(timeout=13.5) is not session
+    adapter = session.get_adapter('https://storage-service/')
+    assert adapter.timeout == 12.5
+    assert adapter.max_retries.total > 0
+
+
+def test_lookups_are_cached(session, settings):
+    settings.STORAGE_SERVICE_CLIENT_CACHE_TTL = 60
+
+    locations = storage_service.get_location(purpose='BL')
+    locations[0]['uuid'] = 'changed'
+
+    assert storage_service.get_location(purpose='BL') == [{'uuid': 'location-uuid'}]
+    assert len(session.requests) == 2  # The pipeline, and its locations
+
+    storage_service.get_location(purpose='CP')
+    assert len(session.requests) == 3
+
+    storage_service.clear_cache()
+    storage_service.get_location(purpose='BL')
+    assert len(session.requests) == 5
+
+
+def test_lookups_are_not_cached_without_ttl(session, settings):
+    settings.STORAGE_SERVICE_CLIENT_CACHE_TTL = 0
+
+    storage_service.get_location(purpose='BL')
+    storage_service.get_location(purpose='BL')
+
+    assert len(session.requests) == 4
+
+
+def test_get_files_info(session, monkeypatch):
+    monkeypatch.setattr(storage_service, 'FILES_INFO_CHUNK_SIZE', 2)
+
+    files = storage_service.get_files_info(['0', '1', 'missing', '3', '4'])
+
+    assert sorted(files) == ['0', '1', '3', '4']
+    assert files['3'] == {'uuid': '3', 'status': 'UPLOADED'}
+    assert [params['uuid__in'] for _, params in session.requests] == ['0,1', 'missing,3', '4']
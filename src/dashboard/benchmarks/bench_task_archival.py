@@ -0,0 +1,122 @@
+#!/usr/bin/env python2
+"""Benchmark Tasks queries before and after archiving the tasks of old units.
+
+Creates a scratch test database for the configured engine (Django's test
+database, so the real one is never touched), fills it with the jobs and tasks
+of many units, most of them finished long ago, and times the queries the
+dashboard and MCPServer run against the Tasks table before and after
+`archive_tasks` moves the old units' tasks into TaskArchives.
+
+Usage:
+
+    # SQLite (in memory)
+    DJANGO_SETTINGS_MODULE=settings.test \\
+    PYTHONPATH=src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/dashboard/benchmarks/bench_task_archival.py --units 200
+
+    # MySQL (uses the dashboard database settings; creates `test_<name>`)
+    DJANGO_SETTINGS_MODULE=settings.local \\
+    PYTHONPATH=src/archivematicaCommon/lib:src/dashboard/src \\
+        python src/dashboard/benchmarks/bench_task_archival.py --units 200
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import StringIO
+import time
+import uuid
+
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main.models import Job, Task, TaskArchive
+
+
+def populate(units, jobs_per_unit, tasks_per_job, output_bytes, recent_fraction):
+    """Create the units' jobs and tasks; returns an old and a recent job."""
+    output = ('x' * 79 + '\n') * (output_bytes // 80)
+    jobs = {}
+    for unit in range(units):
+        recent = unit < units * recent_fraction
+        created = timezone.now() - datetime.timedelta(days=1 if recent else 365)
+        unit_uuid = str(uuid.uuid4())
+        with transaction.atomic():
+            for _ in range(jobs_per_unit):
+                job = Job.objects.create(jobuuid=str(uuid.uuid4()), sipuuid=unit_uuid, createdtime=created,
+                                         currentstep=Job.STATUS_COMPLETED_SUCCESSFULLY)
+                Task.objects.bulk_create([
+                    Task(taskuuid=str(uuid.uuid4()), job=job, createdtime=created, starttime=created,
+                         endtime=created, fileuuid=str(uuid.uuid4()), filename='file-%d.tif' % i,
+                         execution='bench_v0.0', arguments='"%SIPDirectory%objects/file.tif"',
+                         stdout=output, stderror='', exitcode=0)
+                    for i in range(tasks_per_job)])
+                jobs[recent] = job
+    return jobs[False], jobs[True]
+
+
+def job_tasks(job):
+    """As the dashboard's tasks view reads them."""
+    tasks = list(job.task_set.all().order_by('-exitcode', '-endtime', '-starttime', '-createdtime'))
+    return tasks or TaskArchive.job_tasks(job)
+
+
+def cleanup_unfinished_tasks():
+    """As cleanupOldDbEntriesOnNewRun does when MCPServer starts."""
+    Task.objects.filter(exitcode=None).update(exitcode=-1, stderror='MCP shut down while processing.')
+
+
+def timed(repeat, fn, *args):
+    """Median of `repeat` runs, in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.time()
+        fn(*args)
+        times.append((time.time() - started) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--units', type=int, default=200)
+    parser.add_argument('--jobs-per-unit', type=int, default=20)
+    parser.add_argument('--tasks-per-job', type=int, default=20)
+    parser.add_argument('--output-bytes', type=int, default=4096)
+    parser.add_argument('--recent-fraction', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        old_job, recent_job = populate(args.units, args.jobs_per_unit, args.tasks_per_job,
+                                       args.output_bytes, args.recent_fraction)
+        queries = (
+            ('tasks of a recent job', job_tasks, recent_job),
+            ('tasks of an old job', job_tasks, old_job),
+            ('clean up unfinished tasks', cleanup_unfinished_tasks),
+        )
+
+        print('engine: %s; %d tasks' % (connection.vendor, Task.objects.count()))
+        before = [timed(args.repeat, *query[1:]) for query in queries]
+
+        started = time.time()
+        call_command('archive_tasks', days=90, stdout=StringIO.StringIO())
+        archival = time.time() - started
+
+        print('archived in %.2fs; %d tasks left, %d jobs archived' % (
+            archival, Task.objects.count(), TaskArchive.objects.count()))
+        after = [timed(args.repeat, *query[1:]) for query in queries]
+
+        print('%-28s %12s %12s' % ('query (median)', 'before ms', 'after ms'))
+        for query, query_before, query_after in zip(queries, before, after):
+            print('%-28s %12.2f %12.2f' % (query[0], query_before, query_after))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
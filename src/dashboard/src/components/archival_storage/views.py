@@ -267,12 +267,12 @@ def create_aic(request, *args, **kwargs):
             }
         }
         es_client = elasticSearchFunctions.get_client()
-        results = es_client.search(
+        results = elasticSearchFunctions.scan_results(
+            es_client,
             body=query,
             index='aips',
             doc_type='aip',
-            fields='uuid,name',
-            size=elasticSearchFunctions.MAX_QUERY_SIZE,  # return all records
+            source=['uuid', 'name'],
         )
 
         # Create files in staging directory with AIP information
@@ -295,11 +295,11 @@ def create_aic(request, *args, **kwargs):
         databaseFunctions.createSIP(mcp_destination, UUID=temp_uuid, sip_type='AIC')
 
         # Create files with filename = AIP UUID, and contents = AIP name
-        for aip in results['hits']['hits']:
-            filepath = os.path.join(destination, aip['fields']['uuid'][0])
+        for aip in results:
+            filepath = os.path.join(destination, aip['_source']['uuid'])
             with open(filepath, 'w') as f:
                 os.chmod(filepath, 0o660)
-                f.write(str(aip['fields']['name'][0]))
+                f.write(str(aip['_source']['name']))
 
         return redirect('components.ingest.views.aic_metadata_add', temp_uuid)
     else:
@@ -470,14 +470,15 @@ def list_display(request):
             }
         }
     }
-    deleted_aip_results = es_client.search(
+    deleted_aip_results = elasticSearchFunctions.scan_results(
+        es_client,
         body=query,
         index='aips',
         doc_type='aip',
-        fields='uuid,status'
+        source=['uuid'],
     )
-    for deleted_aip in deleted_aip_results['hits']['hits']:
-        aips_deleted_or_pending_deletion.append(deleted_aip['fields']['uuid'][0])
+    for deleted_aip in deleted_aip_results:
+        aips_deleted_or_pending_deletion.append(deleted_aip['_source']['uuid'])
 
     # Fetch results and paginate
     def es_pager(page, page_size):
@@ -514,16 +515,20 @@ def list_display(request):
         current_page_number
     )
 
+    # check with storage server to see the current status of the AIPs that
+    # were deleted or pending deletion
+    stored_aips = storage_service.get_files_info(
+        aip['uuid'] for aip in page.object_list
+        if aip['uuid'] in aips_deleted_or_pending_deletion)
+
     # process deletion, etc., and format results
     aips = []
     for aip in page.object_list:
         # If an AIP was deleted or is pending deletion, react if status changed
         if aip['uuid'] in aips_deleted_or_pending_deletion:
-            # check with storage server to see current status
-            api_results = storage_service.get_file_info(uuid=aip['uuid'])
             try:
-                aip_status = api_results[0]['status']
-            except IndexError:
+                aip_status = stored_aips[aip['uuid']]['status']
+            except KeyError:
                 # Storage service does not know about this AIP
                 # TODO what should happen here?
                 logger.info("AIP not found in storage service: {}".format(aip))
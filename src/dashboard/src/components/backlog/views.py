@@ -57,20 +57,21 @@ def check_and_remove_deleted_transfers(es_client):
         }
     }
 
-    deletion_pending_results = es_client.search(
+    deletion_pending_results = elasticSearchFunctions.scan_results(
+        es_client,
         body=query,
         index='transfers',
         doc_type='transfer',
-        fields='uuid,status'
+        source=['uuid'],
     )
 
-    for hit in deletion_pending_results['hits']['hits']:
-        transfer_uuid = hit['fields']['uuid'][0]
+    transfer_uuids = [hit['_source']['uuid'] for hit in deletion_pending_results]
+    transfers = storage_service.get_files_info(transfer_uuids)
 
-        api_results = storage_service.get_file_info(uuid=transfer_uuid)
+    for transfer_uuid in transfer_uuids:
         try:
-            status = api_results[0]['status']
-        except IndexError:
+            status = transfers[transfer_uuid]['status']
+        except KeyError:
             logger.info('Transfer not found in storage service: {}'.format(transfer_uuid))
             continue
 
@@ -148,9 +149,9 @@ def search(request):
         else:  # Transfer mode
             # Query to transfers/transferfile, but only fetch & aggregrate transfer UUIDs
             # Based on transfer UUIDs, query to transfers/transfer
-            # ES query will limit to 10 aggregation results by default, add size parameter in terms to override
+            # ES query will limit to 10 aggregation results by default; a size of 0 returns all of them
             # (https://stackoverflow.com/questions/22927098/show-all-elasticsearch-aggregation-results-buckets-and-not-just-10)
-            query['aggs'] = {'transfer_uuid': {'terms': {'field': 'sipuuid', 'size': '10000'}}}
+            query['aggs'] = {'transfer_uuid': {'terms': {'field': 'sipuuid', 'size': 0}}}
             hits = es_client.search(
                 index='transfers',
                 doc_type='transferfile',
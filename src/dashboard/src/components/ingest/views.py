@@ -59,6 +59,10 @@ import storageService as storage_service
 
 logger = logging.getLogger('archivematica.dashboard')
 
+# The transferfile fields transfer_backlog renders
+TRANSFER_BACKLOG_FIELDS = ['fileuuid', 'relative_path', 'size', 'tags', 'bulk_extractor_reports',
+                           'modification_date', 'format']
+
 """ @@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@
       Ingest
     @@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@ """
@@ -618,6 +622,7 @@ def transfer_backlog(request, ui):
             body=query,
             index='transfers',
             doc_type='transferfile',
+            source=TRANSFER_BACKLOG_FIELDS,
         )
     except:
         logger.exception('Error accessing index.')
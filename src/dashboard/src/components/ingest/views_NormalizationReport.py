@@ -27,6 +27,19 @@ from __future__ import print_function
 from components import helpers
 from django.db import connection
 
+from main.models import Derivation, TaskArchive
+
+# The job types whose tasks the report shows, by the prefix of the report's
+# columns for them
+NORMALIZATION_JOB_TYPES = {
+    'preservation': 'Normalize for preservation',
+    'access': 'Normalize for access',
+}
+VALIDATION_JOB_TYPES = {
+    'preservation': 'Validate preservation derivatives',
+    'access': 'Validate access derivatives',
+}
+
 
 def getNormalizationReportQuery(sipUUID, idsRestriction=""):
     if idsRestriction:
@@ -155,6 +168,52 @@ def getNormalizationReportQuery(sipUUID, idsRestriction=""):
 
     cursor.execute(sql, (sipUUID, sipUUID))
     objects = helpers.dictfetchall(cursor)
+    return add_archived_tasks(sipUUID, objects)
+
+
+def add_archived_tasks(sipUUID, objects):
+    """
+    Fill in the report rows `objects` from the tasks of the unit that were
+    archived (see TaskArchive), which the query's joins on Tasks don't see.
+    """
+    job_types = list(NORMALIZATION_JOB_TYPES.values()) + list(VALIDATION_JOB_TYPES.values())
+    archives = TaskArchive.objects.filter(job__sipuuid=sipUUID, job__jobtype__in=job_types).select_related('job')
+    tasks = {}
+    for archive in archives:
+        for task in archive.get_tasks():
+            tasks[(archive.job.jobtype, task.fileuuid)] = task
+    if not tasks:
+        return objects
+
+    # Derivatives are validated, so find their tasks by the original's UUID
+    validations = {}
+    derived_file_uuids = [file_uuid for job_type, file_uuid in tasks if job_type in VALIDATION_JOB_TYPES.values()]
+    for source_uuid, derived_uuid in Derivation.objects.filter(
+            derived_file_id__in=derived_file_uuids).values_list('source_file_id', 'derived_file_id'):
+        for job_type in VALIDATION_JOB_TYPES.values():
+            if (job_type, derived_uuid) in tasks:
+                validations[(job_type, source_uuid)] = tasks[(job_type, derived_uuid)]
+
+    for o in objects:
+        identified = o['fileID'] is not None
+        for prefix, job_type in NORMALIZATION_JOB_TYPES.items():
+            task = tasks.get((job_type, o['fileUUID']))
+            if task is None or o[prefix + '_normalization_task_uuid'] is not None:
+                continue
+            o[prefix + '_normalization_task_uuid'] = task.taskuuid
+            o[prefix + '_task_exitCode'] = task.exitcode
+            o[prefix + '_normalization_attempted'] = int(identified and task.exitcode is not None and task.exitcode < 2)
+            o[prefix + '_normalization_failed'] = int(identified and task.exitcode == 1)
+        for prefix, job_type in VALIDATION_JOB_TYPES.items():
+            task = validations.get((job_type, o['fileUUID']))
+            if task is None or o[prefix + '_derivative_validation_task_uuid'] is not None:
+                continue
+            o[prefix + '_derivative_validation_task_uuid'] = task.taskuuid
+            o[prefix + '_derivative_validation_task_exitCode'] = task.exitcode
+            o[prefix + '_derivative_validation_task_stdOut'] = task.stdout
+
+    objects = list(objects)
+    objects.sort(key=lambda o: o['access_normalization_failed'] + o['preservation_normalization_failed'], reverse=True)
     return objects
 
 
@@ -0,0 +1,53 @@
+"""Archive the tasks of finished units.
+
+Moves the Tasks rows (with their standard output and error) of every job of
+a unit that has had no jobs for the given number of days, and none awaiting
+a decision or executing, into the TaskArchives table: one compressed row per
+job (an empty one for a job without tasks, so it isn't looked at again).  The
+dashboard still shows archived tasks; the Jobs rows are kept, as they're what
+unit statuses are worked out from.
+
+Run it regularly (e.g. from cron) to keep the Tasks table small.
+"""
+
+import datetime
+import time
+
+from django.utils import timezone
+
+from main.management.commands import DashboardCommand
+from main.models import Job, TaskArchive
+
+
+def archivable_jobs(days):
+    """The UUIDs of the unarchived jobs of units that finished `days` ago."""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    unfinished_units = Job.objects.filter(
+        currentstep__in=(Job.STATUS_AWAITING_DECISION, Job.STATUS_EXECUTING_COMMANDS)).values('sipuuid')
+    recent_units = Job.objects.filter(createdtime__gte=cutoff).values('sipuuid')
+    return (Job.objects
+            .filter(createdtime__lt=cutoff, taskarchive__isnull=True)
+            .exclude(sipuuid__in=unfinished_units)
+            .exclude(sipuuid__in=recent_units)
+            .values_list('jobuuid', flat=True))
+
+
+class Command(DashboardCommand):
+    """Archive the tasks of finished units."""
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90,
+                            help='Archive the tasks of units with no jobs for this many days (default: %(default)s).')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of jobs to archive in each transaction (default: %(default)s).')
+
+    def handle(self, *args, **options):
+        started = time.time()
+        job_uuids = list(archivable_jobs(options['days']))
+        task_count = 0
+        for i in range(0, len(job_uuids), options['batch_size']):
+            task_count += TaskArchive.archive(job_uuids[i:i + options['batch_size']])
+        self.success('Archived {} tasks of {} jobs in {:.1f} seconds.'.format(
+            task_count, len(job_uuids), time.time() - started))
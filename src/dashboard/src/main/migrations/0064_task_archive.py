@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0063_update_idtools'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskArchive',
+            fields=[
+                ('job', models.OneToOneField(primary_key=True, db_column=b'jobUUID', serialize=False, to='main.Job')),
+                ('archivedtime', models.DateTimeField(auto_now_add=True, db_column=b'archivedTime')),
+                ('taskuuids', models.TextField(db_column=b'taskUUIDs')),
+                ('tasks', models.BinaryField()),
+            ],
+            options={
+                'db_table': 'TaskArchives',
+            },
+        ),
+    ]
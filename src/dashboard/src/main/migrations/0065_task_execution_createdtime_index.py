@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0064_task_archive'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='task',
+            index_together=set([('execution', 'createdtime')]),
+        ),
+    ]
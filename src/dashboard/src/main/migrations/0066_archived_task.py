@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Migration to look archived tasks up by UUID in an indexed table, rather
+than by searching the space separated ``TaskArchive.taskuuids``.
+"""
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def data_migration_up(apps, schema_editor):
+    TaskArchive = apps.get_model('main', 'TaskArchive')
+    ArchivedTask = apps.get_model('main', 'ArchivedTask')
+
+    for job_uuid, task_uuids in TaskArchive.objects.values_list('job_id', 'taskuuids').iterator():
+        ArchivedTask.objects.bulk_create([
+            ArchivedTask(taskuuid=task_uuid, archive_id=job_uuid) for task_uuid in task_uuids.split()])
+
+
+def data_migration_down(apps, schema_editor):
+    TaskArchive = apps.get_model('main', 'TaskArchive')
+    ArchivedTask = apps.get_model('main', 'ArchivedTask')
+
+    task_uuids = {}
+    for task_uuid, job_uuid in ArchivedTask.objects.values_list('taskuuid', 'archive_id').iterator():
+        task_uuids.setdefault(job_uuid, []).append(task_uuid)
+    for job_uuid, uuids in task_uuids.items():
+        TaskArchive.objects.filter(job_id=job_uuid).update(taskuuids=' '.join(uuids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0065_task_execution_createdtime_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('taskuuid', models.CharField(max_length=36, serialize=False, primary_key=True, db_column=b'taskUUID')),
+                ('archive', models.ForeignKey(db_column=b'jobUUID', to='main.TaskArchive')),
+            ],
+            options={
+                'db_table': 'ArchivedTasks',
+            },
+        ),
+        migrations.RunPython(data_migration_up, data_migration_down),
+        # So that the column can be added back empty, if migrating backwards
+        migrations.AlterField(
+            model_name='taskarchive',
+            name='taskuuids',
+            field=models.TextField(db_column=b'taskUUIDs', blank=True),
+        ),
+        migrations.RemoveField(
+            model_name='taskarchive',
+            name='taskuuids',
+        ),
+    ]
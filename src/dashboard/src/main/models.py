@@ -21,7 +21,9 @@
 
 # stdlib, alphabetical by import source
 import ast
+import json
 import logging
+import zlib
 
 # Core Django, alphabetical by import source
 from django import forms
@@ -29,6 +31,7 @@ from django.contrib.auth.models import User
 from django.db import models, transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils.dateparse import parse_datetime
 from django.utils.translation import ugettext_lazy as _
 from django.utils import six
 
@@ -582,6 +585,106 @@ class Task(models.Model):
 
     class Meta:
         db_table = u'Tasks'
+        # For the MCP Server's look at the recent tasks of a command (see
+        # batching.estimate_task_cost)
+        index_together = (('execution', 'createdtime'),)
+
+
+class TaskArchive(models.Model):
+    """
+    The tasks of a job of a finished unit, moved out of the Tasks table (see
+    the archive_tasks management command) into one compressed row.  Jobs
+    without tasks get an empty row too, to show they've been archived.
+    """
+    job = models.OneToOneField('Job', db_column='jobUUID', to_field='jobuuid', primary_key=True)
+    archivedtime = models.DateTimeField(db_column='archivedTime', auto_now_add=True)
+    # The tasks' field values (see FIELDS), as compressed JSON
+    tasks = models.BinaryField()
+
+    FIELDS = ('taskuuid', 'createdtime', 'fileuuid', 'filename', 'execution', 'arguments',
+              'starttime', 'endtime', 'client', 'stdout', 'stderror', 'exitcode')
+    DATETIME_FIELDS = ('createdtime', 'starttime', 'endtime')
+
+    class Meta:
+        db_table = u'TaskArchives'
+
+    @classmethod
+    def archive(cls, job_uuids):
+        """
+        Move the tasks of the jobs with `job_uuids` into TaskArchives, one row
+        per job.  Returns the number of tasks moved.
+        """
+        with transaction.atomic():
+            archived = set(cls.objects.filter(job_id__in=job_uuids).values_list('job_id', flat=True))
+            tasks_by_job = {job_uuid: [] for job_uuid in job_uuids if job_uuid not in archived}
+            for values in Task.objects.filter(job_id__in=job_uuids).order_by('createdtime').values_list('job_id', *cls.FIELDS).iterator():
+                if values[0] not in archived:
+                    tasks_by_job[values[0]].append(values[1:])
+            cls.objects.bulk_create([
+                cls(job_id=job_uuid, tasks=cls._dump_tasks(tasks))
+                for job_uuid, tasks in tasks_by_job.items()])
+            ArchivedTask.objects.bulk_create([
+                ArchivedTask(taskuuid=values[0], archive_id=job_uuid)
+                for job_uuid, tasks in tasks_by_job.items() for values in tasks])
+            Task.objects.filter(job_id__in=list(tasks_by_job)).delete()
+        return sum(len(tasks) for tasks in tasks_by_job.values())
+
+    @classmethod
+    def job_tasks(cls, job):
+        """The archived tasks of `job` (an empty list if there aren't any)."""
+        try:
+            return cls.objects.get(job=job).get_tasks()
+        except cls.DoesNotExist:
+            return []
+
+    @classmethod
+    def find_task(cls, task_uuid):
+        """The archived task with `task_uuid`, or None."""
+        try:
+            archive = ArchivedTask.objects.select_related('archive').get(taskuuid=task_uuid).archive
+        except ArchivedTask.DoesNotExist:
+            return None
+        for task in archive.get_tasks():
+            if task.taskuuid == task_uuid:
+                return task
+        return None
+
+    def get_tasks(self):
+        """The archived tasks, as (unsaved) Task instances."""
+        return [Task(job_id=self.job_id, **fields) for fields in self._load_tasks(self.tasks)]
+
+    @classmethod
+    def _dump_tasks(cls, tasks):
+        """Compressed JSON of the field values of `tasks`."""
+        rows = []
+        for values in tasks:
+            fields = dict(zip(cls.FIELDS, values))
+            for name in cls.DATETIME_FIELDS:
+                if fields[name] is not None:
+                    fields[name] = fields[name].isoformat()
+            rows.append([fields[name] for name in cls.FIELDS])
+        return zlib.compress(json.dumps(rows))
+
+    @classmethod
+    def _load_tasks(cls, data):
+        """The tasks' fields from `_dump_tasks`, as a list of dicts."""
+        tasks = []
+        for values in json.loads(zlib.decompress(data)):
+            fields = dict(zip(cls.FIELDS, values))
+            for name in cls.DATETIME_FIELDS:
+                if fields[name] is not None:
+                    fields[name] = parse_datetime(fields[name])
+            tasks.append(fields)
+        return tasks
+
+
+class ArchivedTask(models.Model):
+    """ Which TaskArchive holds an archived task. """
+    taskuuid = models.CharField(max_length=36, primary_key=True, db_column='taskUUID')
+    archive = models.ForeignKey('TaskArchive', db_column='jobUUID')
+
+    class Meta:
+        db_table = u'ArchivedTasks'
 
 
 class Agent(models.Model):
@@ -17,6 +17,7 @@
 
 from django.conf import settings as django_settings
 from django.core.urlresolvers import reverse
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
 from django.utils.translation import get_language, ugettext as _
@@ -122,7 +123,12 @@ def forbidden(request):
 
 
 def task(request, uuid):
-    task = models.Task.objects.get(taskuuid=uuid)
+    try:
+        task = models.Task.objects.get(taskuuid=uuid)
+    except models.Task.DoesNotExist:
+        task = models.TaskArchive.find_task(uuid)
+        if task is None:
+            raise Http404
     task.duration = helpers.task_duration_in_seconds(task)
     objects = [task]
     return render(request, 'main/tasks.html', locals())
@@ -132,6 +138,12 @@ def tasks(request, uuid):
     job = models.Job.objects.get(jobuuid=uuid)
     objects = job.task_set.all().order_by('-exitcode', '-endtime', '-starttime', '-createdtime')
 
+    if (len(objects) == 0):
+        # Its tasks may have been archived
+        objects = sorted(models.TaskArchive.job_tasks(job),
+                         key=lambda task: (task.exitcode, task.endtime, task.starttime, task.createdtime),
+                         reverse=True)
+
     if (len(objects) == 0):
         return tasks_subjobs(request, uuid)
 
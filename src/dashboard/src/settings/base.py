@@ -34,12 +34,16 @@ CONFIG_MAPPING = {
     'watch_directory': {'section': 'Dashboard', 'option': 'watch_directory', 'type': 'string'},
     'elasticsearch_server': {'section': 'Dashboard', 'option': 'elasticsearch_server', 'type': 'string'},
     'elasticsearch_timeout': {'section': 'Dashboard', 'option': 'elasticsearch_timeout', 'type': 'float'},
+    'elasticsearch_bulk_chunk_size': {'section': 'Dashboard', 'option': 'elasticsearch_bulk_chunk_size', 'type': 'int'},
     'search_enabled': {'section': 'Dashboard', 'process_function': process_search_enabled},
     'gearman_server': {'section': 'Dashboard', 'option': 'gearman_server', 'type': 'string'},
     'shibboleth_authentication': {'section': 'Dashboard', 'option': 'shibboleth_authentication', 'type': 'boolean'},
     'ldap_authentication': {'section': 'Dashboard', 'option': 'ldap_authentication', 'type': 'boolean'},
     'storage_service_client_timeout': {'section': 'Dashboard', 'option': 'storage_service_client_timeout', 'type': 'float'},
     'storage_service_client_quick_timeout': {'section': 'Dashboard', 'option': 'storage_service_client_quick_timeout', 'type': 'float'},
+    'storage_service_client_pool_size': {'section': 'Dashboard', 'option': 'storage_service_client_pool_size', 'type': 'int'},
+    'storage_service_client_retries': {'section': 'Dashboard', 'option': 'storage_service_client_retries', 'type': 'int'},
+    'storage_service_client_cache_ttl': {'section': 'Dashboard', 'option': 'storage_service_client_cache_ttl', 'type': 'float'},
     'agentarchives_client_timeout': {'section': 'Dashboard', 'option': 'agentarchives_client_timeout', 'type': 'float'},
     'site_url': {'section': 'Dashboard', 'option': 'site_url', 'type': 'string'},
 
@@ -64,12 +68,16 @@ shared_directory = /var/archivematica/sharedDirectory/
 watch_directory = /var/archivematica/sharedDirectory/watchedDirectories/
 elasticsearch_server = 127.0.0.1:9200
 elasticsearch_timeout = 10
+elasticsearch_bulk_chunk_size = 500
 search_enabled = true
 gearman_server = 127.0.0.1:4730
 shibboleth_authentication = False
 ldap_authentication = False
 storage_service_client_timeout = 86400
 storage_service_client_quick_timeout = 5
+storage_service_client_pool_size = 10
+storage_service_client_retries = 3
+storage_service_client_cache_ttl = 60
 agentarchives_client_timeout = 300
 site_url =
 
@@ -443,9 +451,13 @@ SHARED_DIRECTORY = config.get('shared_directory')
 WATCH_DIRECTORY = config.get('watch_directory')
 ELASTICSEARCH_SERVER = config.get('elasticsearch_server')
 ELASTICSEARCH_TIMEOUT = config.get('elasticsearch_timeout')
+ELASTICSEARCH_BULK_CHUNK_SIZE = config.get('elasticsearch_bulk_chunk_size')
 SEARCH_ENABLED = config.get('search_enabled')
 STORAGE_SERVICE_CLIENT_TIMEOUT = config.get('storage_service_client_timeout')
 STORAGE_SERVICE_CLIENT_QUICK_TIMEOUT = config.get('storage_service_client_quick_timeout')
+STORAGE_SERVICE_CLIENT_POOL_SIZE = config.get('storage_service_client_pool_size')
+STORAGE_SERVICE_CLIENT_RETRIES = config.get('storage_service_client_retries')
+STORAGE_SERVICE_CLIENT_CACHE_TTL = config.get('storage_service_client_cache_ttl')
 AGENTARCHIVES_CLIENT_TIMEOUT = config.get('agentarchives_client_timeout')
 
 SITE_URL = config.get('site_url')
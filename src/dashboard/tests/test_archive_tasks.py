@@ -0,0 +1,89 @@
+import datetime
+import json
+import uuid
+import zlib
+
+from django.core.management import call_command
+from django.utils import timezone
+import pytest
+
+from components.ingest.views_NormalizationReport import add_archived_tasks
+from main.management.commands.archive_tasks import archivable_jobs
+from main.models import ArchivedTask, Derivation, File, Job, Task, TaskArchive
+
+
+def create_job(unit_uuid, days_ago, task_count, currentstep=Job.STATUS_COMPLETED_SUCCESSFULLY, jobtype=''):
+    created = timezone.now() - datetime.timedelta(days=days_ago)
+    job = Job.objects.create(
+        jobuuid=str(uuid.uuid4()), sipuuid=unit_uuid, jobtype=jobtype,
+        createdtime=created, currentstep=currentstep)
+    for i in range(task_count):
+        Task.objects.create(
+            taskuuid=str(uuid.uuid4()), job=job, createdtime=created,
+            starttime=created, endtime=created, filename='file-%d' % i,
+            stdout=u'out \xe9 %d' % i, stderror='', exitcode=i % 2)
+    return job
+
+
+def task_values(tasks):
+    return sorted((task.taskuuid, task.job_id, task.filename, task.stdout, task.exitcode, task.endtime)
+                  for task in tasks)
+
+
+@pytest.mark.django_db
+def test_archive_tasks():
+    old_job = create_job('old-unit', days_ago=100, task_count=3)
+    old_tasks = task_values(old_job.task_set.all())
+    taskless_job = create_job('old-unit', days_ago=100, task_count=0)
+    recent_unit_job = create_job('recent-unit', days_ago=100, task_count=1)
+    create_job('recent-unit', days_ago=1, task_count=1)
+    unfinished_unit_job = create_job('unfinished-unit', days_ago=100, task_count=1,
+                                     currentstep=Job.STATUS_AWAITING_DECISION)
+
+    call_command('archive_tasks', days=90)
+
+    assert not Task.objects.filter(job=old_job).exists()
+    assert task_values(TaskArchive.job_tasks(old_job)) == old_tasks
+    # Stored as JSON, not pickled
+    assert len(json.loads(zlib.decompress(TaskArchive.objects.get(job=old_job).tasks))) == 3
+    assert task_values([TaskArchive.find_task(old_tasks[1][0])]) == [old_tasks[1]]
+    assert TaskArchive.find_task('missing') is None
+    assert Task.objects.filter(job=recent_unit_job).count() == 1
+    assert Task.objects.filter(job=unfinished_unit_job).count() == 1
+    assert TaskArchive.job_tasks(taskless_job) == []
+    assert TaskArchive.objects.count() == 2
+    assert ArchivedTask.objects.count() == 3
+
+    # Archiving again doesn't change anything
+    assert list(archivable_jobs(90)) == []
+    call_command('archive_tasks', days=90)
+
+    assert task_values(TaskArchive.job_tasks(old_job)) == old_tasks
+    assert Task.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_normalization_report_shows_archived_tasks():
+    original = File.objects.create(uuid=str(uuid.uuid4()), sip_id=None)
+    derivative = File.objects.create(uuid=str(uuid.uuid4()), sip_id=None)
+    Derivation.objects.create(source_file=original, derived_file=derivative)
+    for job_type, file_, exitcode in (('Normalize for preservation', original, 1),
+                                      ('Validate preservation derivatives', derivative, 0)):
+        job = create_job('old-unit', days_ago=100, task_count=0, jobtype=job_type)
+        Task.objects.create(taskuuid=str(uuid.uuid4()), job=job, createdtime=job.createdtime,
+                            fileuuid=file_.uuid, stdout='validated', exitcode=exitcode)
+    call_command('archive_tasks', days=90)
+    row = {'fileUUID': original.uuid, 'fileID': 'format-version',
+           'preservation_normalization_task_uuid': None, 'access_normalization_task_uuid': None,
+           'preservation_derivative_validation_task_uuid': None, 'access_derivative_validation_task_uuid': None,
+           'preservation_normalization_failed': 0, 'access_normalization_failed': 0}
+
+    rows = add_archived_tasks('old-unit', [dict(row, fileUUID='other'), row])
+
+    assert rows[0]['fileUUID'] == original.uuid
+    assert rows[0]['preservation_task_exitCode'] == 1
+    assert rows[0]['preservation_normalization_attempted'] == 1
+    assert rows[0]['preservation_normalization_failed'] == 1
+    assert rows[0]['preservation_derivative_validation_task_exitCode'] == 0
+    assert rows[0]['preservation_derivative_validation_task_stdOut'] == 'validated'
+    assert rows[0]['access_normalization_task_uuid'] is None